@@ -1,51 +1,274 @@
+import argparse
+import hashlib
+import json
 import os
 import shutil
-import random
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import yaml
 
 # Path to mixed files (images + labels)
 mixed_dir = 'images/cars'
 
-# Output directories
-train_img_dir = 'dataset/train/images'
-train_lbl_dir = 'dataset/train/labels'
-val_img_dir = 'dataset/val/images'
-val_lbl_dir = 'dataset/val/labels'
+# Output directory (train/ and val/ live underneath, as before)
+dataset_dir = 'dataset'
+dataset_yaml = 'license_plate.yaml'
+manifest_name = 'manifest.json'
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+DEFAULT_VAL_RATIO = 0.2
+DEFAULT_SEED = 42
+HASH_CHUNK = 1024 * 1024
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_class_ids(yaml_path):
+    with open(yaml_path) as f:
+        names = yaml.safe_load(f).get('names', {})
+    return set(names.keys()) if isinstance(names, dict) else set(range(len(names)))
+
+
+# Check a YOLO label file; returns (class ids, error or None)
+def validate_label(label_path, class_ids):
+    classes = []
+    with open(label_path) as f:
+        for line_no, line in enumerate(f, 1):
+            parts = line.split()
+            if not parts:
+                continue
+            if len(parts) != 5:
+                return classes, f"line {line_no}: expected 5 fields, got {len(parts)}"
+            try:
+                cls = int(parts[0])
+                cx, cy, w, h = map(float, parts[1:])
+            except ValueError:
+                return classes, f"line {line_no}: non-numeric field"
+            if cls not in class_ids:
+                return classes, f"line {line_no}: class {cls} not in {dataset_yaml}"
+            if not (0 <= cx <= 1 and 0 <= cy <= 1 and 0 < w <= 1 and 0 < h <= 1):
+                return classes, f"line {line_no}: box out of range"
+            if cx - w / 2 < -1e-6 or cx + w / 2 > 1 + 1e-6 or cy - h / 2 < -1e-6 or cy + h / 2 > 1 + 1e-6:
+                return classes, f"line {line_no}: box extends past image"
+            classes.append(cls)
+    return classes, None
+
+
+# Image files in the source folder, with the size and mtime scandir already has
+def scan_sources(src_dir):
+    with os.scandir(src_dir) as entries:
+        for entry in entries:
+            if entry.is_file() and entry.name.lower().endswith(IMAGE_EXTENSIONS):
+                stat = entry.stat()
+                yield entry.name, entry.path, stat.st_size, stat.st_mtime_ns
+
+
+# Hash and validate one image/label pair, reusing the manifest entry when
+# size and mtime are unchanged
+def inspect(item, previous, class_ids):
+    name, path, size, mtime = item
+    label_path = os.path.splitext(path)[0] + '.txt'
+    label_stat = os.stat(label_path) if os.path.exists(label_path) else None
+    label_sig = [label_stat.st_size, label_stat.st_mtime_ns] if label_stat else None
+
+    if previous and previous['size'] == size and previous['mtime'] == mtime \
+            and previous.get('label_sig') == label_sig:
+        return name, dict(previous), False
+
+    record = {
+        'size': size,
+        'mtime': mtime,
+        'sha256': file_sha256(path),
+        'label_sig': label_sig,
+        'classes': [],
+        'error': None,
+    }
+    if label_stat is None:
+        record['error'] = 'missing label'
+    else:
+        record['label_sha256'] = file_sha256(label_path)
+        record['classes'], record['error'] = validate_label(label_path, class_ids)
+    return name, record, True
+
+
+# Deterministic per-image key so assignments stay put as new images arrive
+def split_key(record, seed):
+    return hashlib.sha256(f"{seed}:{record['sha256']}".encode()).hexdigest()
+
+
+def stratum(record):
+    boxes = len(record['classes'])
+    return (min(boxes, 3), tuple(sorted(set(record['classes']))))
+
+
+# Returns {name: fold index}; fold 0 is validation for a plain split. Every
+# image's fold follows from its own key alone, so adding or removing images
+# never moves the others. A stratified split also sends the lowest-keyed
+# image of a stratum to val when none fell under the threshold, so rare
+# strata are still validated on.
+def assign_folds(records, mode, val_ratio, folds, seed):
+    keys = {name: int(split_key(r, seed), 16) for name, r in records.items()}
+    if mode == 'kfold':
+        return {name: key % folds for name, key in keys.items()}
+
+    threshold = int(val_ratio * 2 ** 256)
+    assignment = {name: 0 if key < threshold else 1 for name, key in keys.items()}
+    if mode == 'stratified' and val_ratio > 0:
+        groups = defaultdict(list)
+        for name, record in records.items():
+            groups[stratum(record)].append(name)
+        for names in groups.values():
+            if len(names) > 1 and not any(assignment[name] == 0 for name in names):
+                assignment[min(names, key=keys.get)] = 0
+    return assignment
+
+
+def place(src, dst, link):
+    if os.path.exists(dst):
+        os.remove(dst)
+    if link:
+        try:
+            os.link(src, dst)
+            return
+        except OSError:
+            pass
+    shutil.copy2(src, dst)
+
+
+# Copy or hardlink one image/label pair into a split directory
+def materialize(name, split_dir, link, src_dir):
+    img_src = os.path.join(src_dir, name)
+    lbl_name = os.path.splitext(name)[0] + '.txt'
+    place(img_src, os.path.join(split_dir, 'images', name), link)
+    place(os.path.join(src_dir, lbl_name), os.path.join(split_dir, 'labels', lbl_name), link)
+    return name
+
+
+def remove_pair(name, split_dir):
+    for path in (os.path.join(split_dir, 'images', name),
+                 os.path.join(split_dir, 'labels', os.path.splitext(name)[0] + '.txt')):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+# path is relative to the YAML itself, so the dataset trains from any checkout
+def write_yaml(path, root, class_yaml):
+    with open(class_yaml) as f:
+        names = yaml.safe_load(f).get('names', {})
+    rel_root = os.path.relpath(os.path.abspath(root), os.path.dirname(os.path.abspath(path)))
+    with open(path, 'w') as f:
+        yaml.safe_dump({'path': rel_root.replace(os.sep, '/'), 'train': 'train/images', 'val': 'val/images',
+                        'names': names}, f, sort_keys=False)
+
+
+def build(src_dir, out_dir, mode, val_ratio, folds, seed, link, workers, class_yaml):
+    start = time.time()
+    class_ids = load_class_ids(class_yaml)
+    manifest_path = os.path.join(out_dir, manifest_name)
+    manifest = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+    previous = manifest.get('files', {})
+    settings = {'mode': mode, 'val_ratio': val_ratio, 'folds': folds, 'seed': seed}
+    reassign_all = manifest.get('settings') != settings
+
+    records, changed, invalid = {}, set(), 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for name, record, was_changed in pool.map(
+                lambda item: inspect(item, previous.get(item[0]), class_ids), scan_sources(src_dir)):
+            if record['error']:
+                invalid += 1
+                if was_changed:
+                    print(f"⚠️  Skipping {name}: {record['error']}")
+            record['placed'] = []
+            records[name] = record
+            if was_changed:
+                changed.add(name)
+
+    valid = {name: r for name, r in records.items() if not r['error']}
+    assignment = assign_folds(valid, mode, val_ratio, folds, seed)
+
+    # (split directory, image name) pairs that should exist after this run
+    if mode == 'kfold':
+        targets = {}
+        for name, fold in assignment.items():
+            for k in range(folds):
+                split = 'val' if fold == k else 'train'
+                targets.setdefault(name, []).append(os.path.join(out_dir, 'folds', f'fold_{k}', split))
+    else:
+        targets = {name: [os.path.join(out_dir, 'val' if fold == 0 else 'train')]
+                   for name, fold in assignment.items()}
+
+    for split_dirs in {d for dirs in targets.values() for d in dirs}:
+        os.makedirs(os.path.join(split_dirs, 'images'), exist_ok=True)
+        os.makedirs(os.path.join(split_dirs, 'labels'), exist_ok=True)
 
-# Create output directories if they don't exist
-for d in [train_img_dir, train_lbl_dir, val_img_dir, val_lbl_dir]:
-    os.makedirs(d, exist_ok=True)
+    # Remove files whose image vanished, became invalid, or moved split
+    removed = 0
+    for name, old in previous.items():
+        keep = set(targets.get(name, []))
+        for old_dir in old.get('placed', []):
+            if old_dir not in keep:
+                remove_pair(name, old_dir)
+                removed += 1
 
-# Get all image files (.jpg) in the mixed directory
-image_files = [f for f in os.listdir(mixed_dir) if f.lower().endswith('.jpg')]
-image_files.sort()
+    jobs = []
+    for name, split_dirs in targets.items():
+        old_dirs = set(previous.get(name, {}).get('placed', []))
+        for split_dir in split_dirs:
+            if reassign_all or name in changed or split_dir not in old_dirs:
+                jobs.append((name, split_dir))
+        valid[name]['placed'] = split_dirs
 
-# Shuffle and split 80% train, 20% val
-random.seed(42)
-random.shuffle(image_files)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(lambda job: materialize(job[0], job[1], link, src_dir), jobs))
 
-total = len(image_files)
-split_idx = int(0.8 * total)
-train_images = image_files[:split_idx]
-val_images = image_files[split_idx:]
+    tmp_path = manifest_path + '.tmp'
+    os.makedirs(out_dir, exist_ok=True)
+    with open(tmp_path, 'w') as f:
+        json.dump({'settings': settings, 'files': records}, f)
+    os.replace(tmp_path, manifest_path)
 
-print(f"📊 Total: {total} | Train: {len(train_images)} | Val: {len(val_images)}")
+    if mode == 'kfold':
+        for k in range(folds):
+            fold_dir = os.path.join(out_dir, 'folds', f'fold_{k}')
+            write_yaml(os.path.join(fold_dir, 'data.yaml'), fold_dir, class_yaml)
 
-# Helper to move image and matching label
-def move_files(image_list, img_dst, lbl_dst):
-    for img_file in image_list:
-        img_src = os.path.join(mixed_dir, img_file)
-        lbl_file = os.path.splitext(img_file)[0] + '.txt'
-        lbl_src = os.path.join(mixed_dir, lbl_file)
+    if mode == 'kfold':
+        sizes = [sum(1 for fold in assignment.values() if fold == k) for k in range(folds)]
+        print(f"📊 Total: {len(records)} | Valid: {len(valid)} | Invalid: {invalid} | Fold sizes: {sizes}")
+    else:
+        n_val = sum(1 for fold in assignment.values() if fold == 0)
+        print(f"📊 Total: {len(records)} | Valid: {len(valid)} | Invalid: {invalid} | "
+              f"Train: {len(valid) - n_val} | Val: {n_val}")
+    print(f"✅ {len(jobs)} files placed, {removed} removed, {len(changed)} new/changed "
+          f"in {time.time() - start:.2f}s")
 
-        shutil.copy2(img_src, os.path.join(img_dst, img_file))
 
-        if os.path.exists(lbl_src):
-            shutil.copy2(lbl_src, os.path.join(lbl_dst, lbl_file))
-        else:
-            print(f"⚠️  Missing label for {img_file}, skipping label copy.")
+def main():
+    parser = argparse.ArgumentParser(description="Build the YOLO train/val dataset from labelled images")
+    parser.add_argument('--src', default=mixed_dir, help="folder with images and matching .txt labels")
+    parser.add_argument('--out', default=dataset_dir)
+    parser.add_argument('--mode', choices=['random', 'stratified', 'kfold'], default='stratified')
+    parser.add_argument('--val-ratio', type=float, default=DEFAULT_VAL_RATIO)
+    parser.add_argument('--folds', type=int, default=5, help="number of folds for --mode kfold")
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED)
+    parser.add_argument('--link', action='store_true', help="hardlink instead of copying (same filesystem)")
+    parser.add_argument('--workers', type=int, default=min(32, (os.cpu_count() or 1) * 4))
+    parser.add_argument('--classes', default=dataset_yaml, help="YAML with the class names")
+    args = parser.parse_args()
+    build(args.src, args.out, args.mode, args.val_ratio, args.folds, args.seed, args.link,
+          args.workers, args.classes)
 
-# Move files
-move_files(train_images, train_img_dir, train_lbl_dir)
-move_files(val_images, val_img_dir, val_lbl_dir)
 
-print("✅ Dataset split complete: Check 'dataset/train' and 'dataset/val'.")
\ No newline at end of file
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,352 @@
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import re
+import time
+
+import cv2
+import numpy as np
+
+from capture import FileCapture, ImageDirCapture, IMAGE_EXTENSIONS
+from parking_logger import get_logger
+from plate_decoder import decode_plate
+from plate_recognizer import get_recognizer, DEFAULT_BACKEND, ONNX_MODEL
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+logger = get_logger("batch_alpr")
+
+# Configuration
+MODEL_PATH = 'best.pt'
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mkv', '.mov', '.ts')
+DETECT_BATCH = 16           # frames per detector call
+DETECT_IMGSZ = 640
+DETECT_CONF = 0.25
+FRAME_STRIDE = 3            # lane footage is 30 fps; a plate stays in view for seconds
+OCR_CHUNK = 8               # crops per task sent to an OCR worker
+FLUSH_FRAMES = 2000         # frames between output flushes / checkpoints
+MIN_ROI_WIDTH = 50          # same box filter as the lanes
+MIN_ROI_HEIGHT = 20
+PLATE_PATTERN = r'^[A-Z]{2,3}[0-9]{3}[A-Z]$'
+
+# time_s is seconds into the video, or the file's mtime for image folders
+COLUMNS = ['source', 'frame', 'time_s', 'x1', 'y1', 'x2', 'y2', 'det_conf',
+           'raw_text', 'plate', 'ocr_conf', 'valid']
+
+
+# Every video file and image folder under the given paths, in name order. A
+# folder of stills is one source; a folder of videos is one source per file.
+def find_sources(paths):
+    sources = []
+    for path in paths:
+        if os.path.isfile(path):
+            sources.append(('file', os.path.abspath(path)))
+            continue
+        for dirpath, dirnames, filenames in os.walk(path):
+            dirnames.sort()
+            filenames.sort()
+            if any(name.lower().endswith(IMAGE_EXTENSIONS) for name in filenames):
+                sources.append(('images', os.path.abspath(dirpath)))
+            sources += [('file', os.path.abspath(os.path.join(dirpath, name)))
+                        for name in filenames if name.lower().endswith(VIDEO_EXTENSIONS)]
+    return sources
+
+
+def open_batch_source(kind, path):
+    source = FileCapture(path) if kind == 'file' else ImageDirCapture(path)
+    if not source.open():
+        return None
+    return source
+
+
+# (frame index, time_s, image) from start_frame on, keeping one frame in
+# every stride. Images are copied because capture buffers are reused.
+def iter_frames(source, start_frame, stride):
+    fps = source.cap.get(cv2.CAP_PROP_FPS) if isinstance(source, FileCapture) else 0
+    index = start_frame
+    if index:
+        source.seek(index)
+    while True:
+        frame = source.read()
+        if frame is None:
+            if isinstance(source, ImageDirCapture) and source.position < len(source.paths):
+                index += 1      # unreadable image
+                continue
+            return
+        time_s = index / fps if fps else frame.timestamp
+        yield index, time_s, frame.image.copy()
+        index += 1 + source.skip(stride - 1)
+
+
+# ---------------------------------------------------------------------------
+# OCR worker pool: one recognizer per process
+# ---------------------------------------------------------------------------
+
+_recognizer = None
+
+
+def _init_ocr_worker(backend, model_path, tesseract_cmd):
+    global _recognizer
+    cv2.setNumThreads(1)
+    if tesseract_cmd:
+        import pytesseract
+        pytesseract.pytesseract.tesseract_cmd = tesseract_cmd
+    _recognizer = get_recognizer(backend, model_path=model_path) if backend == 'onnx' else get_recognizer(backend)
+
+
+def _read_crops(crops):
+    results = []
+    for reading in _recognizer.read_batch(crops):
+        decoded = decode_plate(reading)
+        results.append((reading.text, decoded.text if decoded else '',
+                        round(decoded.confidence if decoded else reading.confidence, 4)))
+    return results
+
+
+# ---------------------------------------------------------------------------
+# Output writers. Both only make rows durable on flush(); the checkpoint is
+# written after that, so a resumed job never loses or duplicates rows.
+# ---------------------------------------------------------------------------
+
+# Appends to one CSV, truncating back to the checkpointed size on resume
+class CsvOutput:
+    def __init__(self, path, state):
+        self.path = path
+        self.rows = []
+        offset = state.get('csv_offset')
+        if offset is not None and os.path.exists(path):
+            self.file = open(path, 'r+', newline='')
+            self.file.truncate(offset)
+            self.file.seek(offset)
+        else:
+            self.file = open(path, 'w', newline='')
+            self.file.write(','.join(COLUMNS) + '\n')
+        self.writer = csv.writer(self.file)
+
+    def write(self, rows):
+        self.rows += rows
+
+    def flush(self, state):
+        self.writer.writerows(self.rows)
+        self.rows = []
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        state['csv_offset'] = self.file.tell()
+
+    def close(self):
+        self.file.close()
+
+
+# A directory of Parquet parts; part numbers come from the checkpoint, so a
+# part half-written before a crash is simply overwritten
+class ParquetOutput:
+    def __init__(self, path, state):
+        self.path = path
+        self.rows = []
+        os.makedirs(path, exist_ok=True)
+        if 'parts' not in state:
+            for name in os.listdir(path):
+                if name.startswith('part-') and name.endswith('.parquet'):
+                    os.remove(os.path.join(path, name))
+
+    def write(self, rows):
+        self.rows += rows
+
+    def flush(self, state):
+        part = state.get('parts', 0)
+        if self.rows:
+            table = pa.table({name: [row[i] for row in self.rows] for i, name in enumerate(COLUMNS)})
+            pq.write_table(table, os.path.join(self.path, f"part-{part:05d}.parquet"), compression='zstd')
+            state['parts'] = part + 1
+        self.rows = []
+
+    def close(self):
+        pass
+
+
+def load_checkpoint(path):
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_checkpoint(path, state):
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(state, f, indent=1)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+# ---------------------------------------------------------------------------
+# Batch job
+# ---------------------------------------------------------------------------
+
+class BatchJob:
+    def __init__(self, args):
+        self.args = args
+        self.checkpoint = args.checkpoint or args.out.rstrip('/\\') + '.checkpoint.json'
+        self.settings = {'model': os.path.abspath(args.model), 'imgsz': args.imgsz, 'conf': args.conf,
+                         'stride': args.stride, 'ocr': args.ocr}
+        self.model = None
+        self.pool = None
+        self.output = None
+        self.state = None
+        self.pending = None         # OCR in flight for the previous detector batch
+        self.frames = 0
+        self.crops = 0
+        self.video_seconds = 0.0
+
+    def open(self):
+        state = None if self.args.restart else load_checkpoint(self.checkpoint)
+        if state and state['settings'] != self.settings:
+            raise SystemExit(f"[ERROR] {self.checkpoint} was written with {state['settings']}; "
+                             f"rerun with the same options or --restart")
+        if state:
+            done = sum(s['done'] for s in state['sources'].values())
+            print(f"[RESUME] {done}/{len(state['sources'])} sources done, {state['rows']} rows written")
+        self.state = state or {'settings': self.settings, 'sources': {}, 'rows': 0}
+
+        parquet = self.args.out.endswith('.parquet')
+        if parquet and pq is None:
+            raise SystemExit("[ERROR] Parquet output needs pyarrow (pip install pyarrow); use a .csv path instead")
+        self.output = (ParquetOutput if parquet else CsvOutput)(self.args.out, self.state)
+
+        # OCR workers are spawned, and before YOLO loads: a fork after torch
+        # has started its thread pools can deadlock the child
+        self.pool = multiprocessing.get_context('spawn').Pool(
+            self.args.workers, _init_ocr_worker, (self.args.ocr, self.args.onnx_model, self.args.tesseract_cmd))
+        from ultralytics import YOLO
+        self.model = YOLO(self.args.model)
+
+    def close(self):
+        if self.pool:
+            self.pool.close()
+            self.pool.join()
+        if self.output:
+            self.output.close()
+
+    def run(self, sources):
+        self.open()
+        started = time.perf_counter()
+        try:
+            for kind, path in sources:
+                progress = self.state['sources'].setdefault(path, {'next_frame': 0, 'done': False})
+                if progress['done']:
+                    continue
+                self.process_source(kind, path, progress)
+            self.collect()
+            self.flush()
+        finally:
+            self.close()
+        self.report(time.perf_counter() - started)
+
+    def process_source(self, kind, path, progress):
+        source = open_batch_source(kind, path)
+        if source is None:
+            print(f"[WARNING] Cannot open {path}, skipping")
+            logger.warning(f"Batch source unreadable: {path}", extra={"path": path})
+            return
+        total = source.frame_count()
+        fps = source.cap.get(cv2.CAP_PROP_FPS) if kind == 'file' else 0
+        print(f"[SOURCE] {path}: {total} frames, resuming at {progress['next_frame']}" if progress['next_frame']
+              else f"[SOURCE] {path}: {total} frames")
+        batch, since_flush = [], 0
+        for item in iter_frames(source, progress['next_frame'], self.args.stride):
+            batch.append(item)
+            if len(batch) == self.args.batch:
+                self.detect(path, batch, progress, fps)
+                since_flush += len(batch) * self.args.stride
+                batch = []
+                if since_flush >= FLUSH_FRAMES:
+                    self.collect()
+                    self.flush()
+                    since_flush = 0
+        if batch:
+            self.detect(path, batch, progress, fps)
+        source.release()
+        self.collect()
+        progress['done'] = True
+        progress['next_frame'] = total or progress['next_frame']
+        self.flush()
+
+    # Detect on a batch of frames and hand the crops to the OCR pool; OCR of
+    # this batch overlaps detection of the next one
+    def detect(self, path, batch, progress, fps):
+        results = self.model([image for _, _, image in batch], imgsz=self.args.imgsz, conf=self.args.conf,
+                             verbose=False)
+        boxes, crops = [], []
+        for (index, time_s, image), result in zip(batch, results):
+            for box in result.boxes:
+                x1, y1, x2, y2 = map(int, box.xyxy[0])
+                if (x2 - x1) < MIN_ROI_WIDTH or (y2 - y1) < MIN_ROI_HEIGHT:
+                    continue
+                crops.append(np.ascontiguousarray(image[y1:y2, x1:x2]))
+                boxes.append((path, index, round(time_s, 3), x1, y1, x2, y2, round(float(box.conf[0]), 4)))
+        chunks = [crops[i:i + OCR_CHUNK] for i in range(0, len(crops), OCR_CHUNK)]
+        self.collect()
+        self.pending = (boxes, self.pool.map_async(_read_crops, chunks), progress, batch[-1][0] + 1)
+        self.frames += len(batch)
+        self.crops += len(crops)
+        if fps:
+            self.video_seconds += len(batch) * self.args.stride / fps
+
+    def collect(self):
+        if self.pending is None:
+            return
+        boxes, async_result, progress, next_frame = self.pending
+        self.pending = None
+        readings = [reading for chunk in async_result.get() for reading in chunk]
+        rows = [list(box) + [raw, plate, conf, bool(re.match(PLATE_PATTERN, plate))]
+                for box, (raw, plate, conf) in zip(boxes, readings)]
+        self.output.write(rows)
+        self.state['rows'] += len(rows)
+        progress['next_frame'] = next_frame
+
+    def flush(self):
+        self.output.flush(self.state)
+        save_checkpoint(self.checkpoint, self.state)
+
+    def report(self, elapsed):
+        print(f"[DONE] {self.frames} frames, {self.crops} plate crops in {elapsed:.1f}s "
+              f"({self.frames / max(elapsed, 1e-9):.1f} frames/s)")
+        if self.video_seconds:
+            print(f"[DONE] {self.video_seconds:.0f}s of footage, {self.video_seconds / elapsed:.1f}x real time")
+        logger.info(f"Batch ALPR: {self.frames} frames, {self.crops} crops in {elapsed:.1f}s",
+                    extra={"path": self.args.out, "latency_ms": round(elapsed * 1000)})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batch plate recognition over recorded footage and image folders")
+    parser.add_argument('inputs', nargs='+', help="video files and/or folders of videos or stills")
+    parser.add_argument('--out', default='alpr_results.csv', help="results .csv, or .parquet (a directory of parts)")
+    parser.add_argument('--checkpoint', help="progress file (default: <out>.checkpoint.json)")
+    parser.add_argument('--restart', action='store_true', help="ignore any checkpoint and start over")
+    parser.add_argument('--model', default=MODEL_PATH)
+    parser.add_argument('--imgsz', type=int, default=DETECT_IMGSZ)
+    parser.add_argument('--conf', type=float, default=DETECT_CONF)
+    parser.add_argument('--batch', type=int, default=DETECT_BATCH)
+    parser.add_argument('--stride', type=int, default=FRAME_STRIDE, help="process one frame in every N")
+    parser.add_argument('--workers', type=int, default=max(1, (os.cpu_count() or 2) - 1), help="OCR processes")
+    parser.add_argument('--ocr', default=DEFAULT_BACKEND, choices=['tesseract', 'onnx'])
+    parser.add_argument('--onnx-model', default=ONNX_MODEL)
+    parser.add_argument('--tesseract-cmd', default=os.environ.get('TESSERACT_CMD'))
+    args = parser.parse_args()
+
+    sources = find_sources(args.inputs)
+    if not sources:
+        raise SystemExit("[ERROR] No video files or image folders found")
+    print(f"[INFO] {len(sources)} sources, OCR on {args.workers} workers ({args.ocr})")
+    BatchJob(args).run(sources)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,549 @@
+import argparse
+import os
+import statistics
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from parking_logger import get_logger
+
+logger = get_logger("capture")
+
+# Configuration
+RING_SIZE = 3               # frames a consumer may hold while the next one is decoded
+RECONNECT_BACKOFF = 1.0
+RECONNECT_BACKOFF_MAX = 30.0
+READ_FAILURES_BEFORE_RECONNECT = 5
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+STREAM_PREFIXES = ('rtsp://', 'rtsps://', 'http://', 'https://')
+BUS_PREFIX = 'bus://'
+BUS_STALE_SECONDS = 5.0     # no new frame on a bus for this long: the writer is gone, reattach by name
+
+
+# One decoded frame. Read from a source directly, image is a view into its
+# ring buffer and is overwritten RING_SIZE frames later; copy it to keep it
+# longer. Frames from a LatestFrameReader live in its consumer buffer, which
+# the next read() overwrites.
+class Frame:
+    def __init__(self, image, timestamp, index):
+        self.image = image
+        self.timestamp = timestamp      # wall-clock seconds at the source
+        self.index = index
+
+
+# Fixed pool of frame buffers at the decode resolution, handed out in turn
+class FrameRing:
+    def __init__(self, shape, size=RING_SIZE):
+        self.buffers = [np.empty(shape, dtype=np.uint8) for _ in range(size)]
+        self.next = 0
+
+    @property
+    def shape(self):
+        return self.buffers[0].shape
+
+    def take(self):
+        buf = self.buffers[self.next]
+        self.next = (self.next + 1) % len(self.buffers)
+        return buf
+
+
+# Common open / read / reconnect logic over cv2.VideoCapture. Subclasses say
+# how to open the device and where frame timestamps come from.
+class CaptureSource:
+    kind = None
+    live = True
+    latest_only = False     # read() itself skips to the newest frame, no LatestFrameReader needed
+
+    def __init__(self, source, width=None, height=None, fps=None, hwaccel=True):
+        self.source = source
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.hwaccel = hwaccel
+        self.cap = None
+        self.ring = None
+        self.scratch = None
+        self.frames = 0
+        self.failures = 0
+        self.reconnects = 0
+        self.next_attempt = 0.0
+        self.backoff = RECONNECT_BACKOFF
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.source!r})"
+
+    def _open_capture(self):
+        return cv2.VideoCapture(self.source)
+
+    def open(self):
+        self.cap = self._open_capture()
+        if not self.cap.isOpened():
+            self.cap.release()
+            self.cap = None
+            return False
+        if self.width and self.height:
+            self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.width)
+            self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.height)
+        if self.fps:
+            self.cap.set(cv2.CAP_PROP_FPS, self.fps)
+        self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        self.failures = 0
+        self.backoff = RECONNECT_BACKOFF
+        return True
+
+    def isOpened(self):
+        return self.cap is not None and self.cap.isOpened()
+
+    def release(self):
+        if self.cap is not None:
+            self.cap.release()
+            self.cap = None
+
+    # Decode straight into a ring buffer when the source already delivers the
+    # configured size; otherwise decode into scratch and resize into the ring
+    def _decode(self):
+        if self.ring is not None:
+            buf = self.ring.take()
+            if self.scratch is None:
+                ok, image = self.cap.retrieve(buf)
+                if ok and image.shape == buf.shape:
+                    return image
+                if not ok:
+                    return None
+                self.scratch = image
+            else:
+                ok, self.scratch = self.cap.retrieve(self.scratch)
+                if not ok:
+                    return None
+            return cv2.resize(self.scratch, (buf.shape[1], buf.shape[0]), dst=buf, interpolation=cv2.INTER_AREA)
+
+        ok, image = self.cap.retrieve()
+        if not ok:
+            return None
+        shape = (self.height, self.width, 3) if self.width and self.height else image.shape
+        self.ring = FrameRing(shape)
+        if image.shape != shape:
+            self.scratch = image
+            image = cv2.resize(image, (shape[1], shape[0]), dst=self.ring.take(), interpolation=cv2.INTER_AREA)
+        else:
+            buf = self.ring.take()
+            buf[...] = image
+            image = buf
+        return image
+
+    def _timestamp(self, grabbed_at):
+        return grabbed_at
+
+    # Next frame, or None. Live sources reconnect with backoff after
+    # repeated failures instead of giving up.
+    def read(self):
+        if self.cap is None:
+            if not self.live or time.time() < self.next_attempt:
+                return None
+            if not self.open():
+                self._schedule_reconnect()
+                return None
+            self.reconnects += 1
+            logger.info(f"Reconnected to {self.source}", extra={"path": str(self.source)})
+
+        if not self.cap.grab():
+            return self._failed()
+        grabbed_at = time.time()
+        image = self._decode()
+        if image is None:
+            return self._failed()
+        self.failures = 0
+        self.frames += 1
+        return Frame(image, self._timestamp(grabbed_at), self.frames)
+
+    # Advance past up to count frames without decoding them; returns how many
+    def skip(self, count):
+        skipped = 0
+        while skipped < count and self.cap is not None:
+            if not self.cap.grab():
+                self._failed()
+                break
+            skipped += 1
+        return skipped
+
+    def _failed(self):
+        self.failures += 1
+        if not self.live and not getattr(self, 'loop', False):
+            self.release()      # end of a recording
+        elif self.live and self.failures >= READ_FAILURES_BEFORE_RECONNECT:
+            logger.warning(f"Lost {self.source} after {self.failures} failed reads, reconnecting",
+                           extra={"path": str(self.source)})
+            self.release()
+            self._schedule_reconnect()
+        return None
+
+    def _schedule_reconnect(self):
+        self.next_attempt = time.time() + self.backoff
+        self.backoff = min(self.backoff * 2, RECONNECT_BACKOFF_MAX)
+
+
+class UsbCapture(CaptureSource):
+    kind = 'usb'
+
+
+# IP cameras over RTSP/HTTP via FFmpeg, asking for hardware decoding where
+# the OpenCV build supports it. Timestamps come from the stream's PTS,
+# anchored to the wall clock at the first frame.
+class RtspCapture(CaptureSource):
+    kind = 'rtsp'
+
+    def __init__(self, source, width=None, height=None, fps=None, hwaccel=True):
+        super().__init__(source, width, height, fps, hwaccel)
+        self.pts_origin = None
+
+    def _open_capture(self):
+        os.environ.setdefault('OPENCV_FFMPEG_CAPTURE_OPTIONS', 'rtsp_transport;tcp')
+        params = []
+        if self.hwaccel and hasattr(cv2, 'CAP_PROP_HW_ACCELERATION'):
+            params = [cv2.CAP_PROP_HW_ACCELERATION, cv2.VIDEO_ACCELERATION_ANY]
+        self.pts_origin = None
+        return cv2.VideoCapture(self.source, cv2.CAP_FFMPEG, params)
+
+    def _timestamp(self, grabbed_at):
+        pts = self.cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
+        if pts <= 0:
+            return grabbed_at
+        if self.pts_origin is None:
+            self.pts_origin = grabbed_at - pts
+        return self.pts_origin + pts
+
+
+# Recorded video, played at its own frame rate when realtime is set so a
+# lane sees the same timing as from a camera
+class FileCapture(CaptureSource):
+    kind = 'file'
+    live = False
+
+    def __init__(self, source, width=None, height=None, fps=None, hwaccel=True, realtime=False, loop=False):
+        super().__init__(source, width, height, fps, hwaccel)
+        self.realtime = realtime
+        self.loop = loop
+        self.started = None
+
+    def _timestamp(self, grabbed_at):
+        position = self.cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
+        if self.started is None:
+            self.started = grabbed_at - position
+        if self.realtime:
+            delay = self.started + position - time.time()
+            if delay > 0:
+                time.sleep(delay)
+        return self.started + position
+
+    # Position on a frame number, e.g. to resume a batch job
+    def seek(self, index):
+        self.cap.set(cv2.CAP_PROP_POS_FRAMES, index)
+        self.started = None
+
+    def frame_count(self):
+        return int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT)) if self.cap is not None else 0
+
+    def read(self):
+        frame = super().read()
+        if frame is None and self.loop and self.cap is not None:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            self.started = None
+            frame = super().read()
+        return frame
+
+
+# Directory of still images in name order, e.g. frames dumped from a lane
+class ImageDirCapture(CaptureSource):
+    kind = 'images'
+    live = False
+
+    def __init__(self, source, width=None, height=None, fps=None, hwaccel=True, loop=False):
+        super().__init__(source, width, height, fps, hwaccel)
+        self.loop = loop
+        self.paths = []
+        self.position = 0
+
+    def open(self):
+        self.paths = sorted(os.path.join(self.source, name) for name in os.listdir(self.source)
+                            if name.lower().endswith(IMAGE_EXTENSIONS))
+        self.position = 0
+        return bool(self.paths)
+
+    # Open until the last image has been read, unless looping
+    def isOpened(self):
+        return bool(self.paths) and (self.loop or self.position < len(self.paths))
+
+    def release(self):
+        self.paths = []
+
+    def seek(self, index):
+        self.position = index
+
+    def skip(self, count):
+        skipped = max(0, min(count, len(self.paths) - self.position))
+        self.position += skipped
+        return skipped
+
+    def frame_count(self):
+        return len(self.paths)
+
+    def read(self):
+        if self.position >= len(self.paths):
+            if not self.loop or not self.paths:
+                return None
+            self.position = 0
+        path = self.paths[self.position]
+        self.position += 1
+        image = cv2.imread(path)
+        if image is None:
+            return None
+        # imread allocates a fresh image, so only a configured size goes
+        # through the ring; otherwise each image keeps its own size
+        if self.width and self.height:
+            if self.ring is None:
+                self.ring = FrameRing((self.height, self.width, 3))
+            buf = self.ring.take()
+            if image.shape != buf.shape:
+                image = cv2.resize(image, (buf.shape[1], buf.shape[0]), dst=buf, interpolation=cv2.INTER_AREA)
+            else:
+                buf[...] = image
+                image = buf
+        self.frames += 1
+        return Frame(image, os.path.getmtime(path), self.frames)
+
+
+# Frames published on a shared-memory frame bus by a capture process
+# (frame_bus.py publish), so several processes share one camera. Each read
+# copies the newest frame into the ring, since lanes hold frames for longer
+# than the bus keeps a slot. That is the only copy a lane pays: the bus
+# reader already skips to the newest frame, so lanes read it directly
+# rather than through a LatestFrameReader. A writer that dies without
+# closing the bus leaves its head where it was; after BUS_STALE_SECONDS
+# without a new frame the bus counts as lost and is attached again by name,
+# which picks up the segment a restarted writer created. Every consumer of
+# one bus needs its own reader_id (orchestrator.py assigns them per lane).
+class BusCapture(CaptureSource):
+    kind = 'bus'
+    latest_only = True
+
+    def __init__(self, source, width=None, height=None, fps=None, hwaccel=True, reader_id=0,
+                 stale_after=BUS_STALE_SECONDS):
+        super().__init__(source, width, height, fps, hwaccel)
+        self.bus_name = source[len(BUS_PREFIX):] if source.startswith(BUS_PREFIX) else source
+        self.reader_id = reader_id
+        self.stale_after = stale_after
+        self.bus = None
+        self.reader = None
+        self.head_seen_at = 0.0
+
+    def open(self):
+        from frame_bus import FrameBus
+        try:
+            self.bus = FrameBus.attach(self.bus_name)
+        except (FileNotFoundError, ValueError):
+            return False
+        self.reader = self.bus.reader(self.reader_id)
+        self.ring = FrameRing(self.bus.shape)
+        self.backoff = RECONNECT_BACKOFF
+        self.head_seen_at = time.time()
+        return True
+
+    def isOpened(self):
+        return self.bus is not None and not self.bus.closed() \
+            and time.time() - self.head_seen_at < self.stale_after
+
+    def release(self):
+        if self.bus is not None:
+            self.reader = None
+            self.bus.close()
+            self.bus = None
+
+    def skip(self, count):
+        return 0
+
+    def read(self):
+        if not self.isOpened():
+            if self.bus is not None:
+                logger.warning(f"Frame bus {self.bus_name} closed or silent for {self.stale_after}s, reattaching",
+                               extra={"path": self.source})
+            self.release()
+            if time.time() < self.next_attempt:
+                return None
+            if not self.open():
+                self._schedule_reconnect()
+                return None
+            self.reconnects += 1
+            logger.info(f"Reconnected to frame bus {self.bus_name}", extra={"path": self.source})
+        if not self.reader.wait(1.0):
+            return None
+        self.head_seen_at = time.time()
+        frame = self.reader.read_into(self.ring.take())
+        if frame is None:
+            return None
+        self.frames += 1
+        return Frame(frame.image, frame.timestamp, frame.index)
+
+
+# Keeps a live source drained on its own thread so the consumer always gets
+# the newest frame; a slow lane drops frames instead of falling behind. The
+# decode thread keeps cycling through the source's ring while the consumer
+# works, so each frame handed out is copied into a buffer the consumer owns:
+# one passed to read(), or one the reader allocates once and reuses.
+class LatestFrameReader:
+    def __init__(self, source):
+        self.source = source
+        self.lock = threading.Lock()
+        self.fresh = threading.Condition(self.lock)
+        self.latest = None
+        self.buffer = None
+        self.dropped = 0
+        self.decode_cpu = 0.0
+        self.stopping = threading.Event()
+        self.thread = threading.Thread(target=self._run, name=f"capture-{source.source}", daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def _run(self):
+        while not self.stopping.is_set():
+            cpu = time.thread_time()
+            frame = self.source.read()
+            spent = time.thread_time() - cpu
+            if frame is None:
+                self.stopping.wait(0.01)
+                continue
+            with self.lock:
+                self.decode_cpu += spent
+                if self.latest is not None:
+                    self.dropped += 1
+                self.latest = frame
+                self.fresh.notify_all()
+
+    # Newest frame not yet returned, waiting up to timeout for one, copied
+    # into out (same shape) or the reader's buffer
+    def read(self, timeout=1.0, out=None):
+        with self.lock:
+            if self.latest is None:
+                self.fresh.wait(timeout)
+            frame, self.latest = self.latest, None
+            if frame is None:
+                return None
+            if out is None:
+                if self.buffer is None or self.buffer.shape != frame.image.shape:
+                    self.buffer = np.empty_like(frame.image)
+                out = self.buffer
+            # Copied under the lock: the decode thread has to publish each
+            # frame before decoding the next, so meanwhile it can only be
+            # writing the slot after this one
+            np.copyto(out, frame.image)
+            return Frame(out, frame.timestamp, frame.index)
+
+    def close(self):
+        self.stopping.set()
+        self.thread.join(2)
+        self.source.release()
+
+
+BACKENDS = {
+    'usb': UsbCapture,
+    'rtsp': RtspCapture,
+    'file': FileCapture,
+    'images': ImageDirCapture,
+    'bus': BusCapture,
+}
+
+
+# Pick a backend from the lane's camera setting: an int is a USB index, a
+# URL is an IP camera, bus://NAME a frame bus, a directory is stills,
+# anything else a video file
+def backend_for(source):
+    if isinstance(source, int) or (isinstance(source, str) and source.isdigit()):
+        return 'usb'
+    if source.startswith(BUS_PREFIX):
+        return 'bus'
+    if source.lower().startswith(STREAM_PREFIXES):
+        return 'rtsp'
+    if os.path.isdir(source):
+        return 'images'
+    return 'file'
+
+
+# Open a source from a lane config: camera plus an optional "capture" block
+# ({"backend", "width", "height", "fps", "hwaccel", "realtime", "loop"})
+def open_source(camera, options=None):
+    options = dict(options or {})
+    backend = options.pop('backend', None) or backend_for(camera)
+    if backend == 'usb':
+        camera = int(camera)
+    source = BACKENDS[backend](camera, **options)
+    source.open()
+    return source
+
+
+# ---------------------------------------------------------------------------
+# Decode cost / latency benchmark
+# ---------------------------------------------------------------------------
+
+def bench(camera, options, seconds, work_ms):
+    source = open_source(camera, options)
+    if not source.isOpened():
+        print(f"[ERROR] Cannot open {camera}")
+        return
+    threaded = source.live and not source.latest_only
+    reader = LatestFrameReader(source).start() if threaded else None
+    latencies, processed = [], 0
+    cpu_start, start = time.process_time(), time.time()
+    while time.time() - start < seconds:
+        frame = reader.read() if threaded else source.read()
+        if frame is None:
+            if not source.live:
+                break
+            continue
+        latencies.append((time.time() - frame.timestamp) * 1000)
+        processed += 1
+        if work_ms:
+            time.sleep(work_ms / 1000)   # stand-in for detection + OCR
+    elapsed = time.time() - start
+    cpu = time.process_time() - cpu_start
+    if reader:
+        reader.close()
+        decoded, dropped = source.frames, reader.dropped
+    else:
+        source.release()
+        decoded, dropped = processed, 0
+    latencies.sort()
+    print(f"[BENCH] {type(source).__name__} {camera} at {source.ring.shape[1] if source.ring else '?'}x"
+          f"{source.ring.shape[0] if source.ring else '?'}")
+    print(f"  decoded {decoded} frames ({decoded / elapsed:.1f} fps), processed {processed}, dropped {dropped}, "
+          f"reconnects {source.reconnects}")
+    print(f"  CPU per decoded frame: {cpu / max(decoded, 1) * 1000:.2f} ms "
+          f"({cpu / elapsed:.0%} of one core)")
+    if latencies:
+        print(f"  capture-to-process latency: p50 {statistics.median(latencies):.1f} ms, "
+              f"p95 {latencies[int(len(latencies) * 0.95)]:.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Capture backends: USB, RTSP/IP camera, video file, image directory")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    bench_parser = subparsers.add_parser('bench', help="decode CPU and capture-to-process latency")
+    bench_parser.add_argument('source', help="USB index, rtsp:// URL, bus://NAME, video file or image directory")
+    bench_parser.add_argument('--backend', choices=sorted(BACKENDS))
+    bench_parser.add_argument('--width', type=int)
+    bench_parser.add_argument('--height', type=int)
+    bench_parser.add_argument('--fps', type=float)
+    bench_parser.add_argument('--no-hwaccel', action='store_true')
+    bench_parser.add_argument('--seconds', type=float, default=10)
+    bench_parser.add_argument('--work-ms', type=float, default=0, help="simulated per-frame processing time")
+    args = parser.parse_args()
+
+    options = {'backend': args.backend, 'width': args.width, 'height': args.height, 'fps': args.fps,
+               'hwaccel': not args.no_hwaccel}
+    bench(args.source, options, args.seconds, args.work_ms)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,53 +1,148 @@
-from flask import Flask, render_template, jsonify
+from flask import Flask, Response, render_template, jsonify, request
+import argparse
 import psycopg2
+import sqlite3
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.request
 from datetime import datetime
 
-app = Flask(__name__)
-
-DB_CONFIG = {
-    'host': 'localhost',
-    'user': 'postgres',
-    'password': '1234',
-    'dbname': 'parking_system'
-}
+from local_store import Occupancy
+from logs_feed import LogsFeed, choose_encoding
+from reporting_db import QueryRejected, ReportingDB
 
-def get_db_connection():
-    try:
-        return psycopg2.connect(**DB_CONFIG)
-    except psycopg2.Error as e:
-        print(f"[ERROR] Database connection failed: {e}")
-        return None
+app = Flask(__name__)
+occupancy = None
+# Replica (or guarded primary) connections; the dashboard never competes with
+# the lanes for the primary's pool
+reporting = ReportingDB()
 
 @app.route('/')
 def index():
     return render_template('index.html')
 
+# The newest logs.id comes from the same statement, and so the same
+# snapshot, as the page: a replica that hasn't replayed the last insert yet
+# reports an older id and the feed knows the body is behind
+def build_logs():
+    logs = reporting.query(
+        "WITH newest AS (SELECT COALESCE(MAX(id), 0) AS id FROM logs) "
+        "SELECT newest.id, page.* FROM newest LEFT JOIN LATERAL "
+        "(SELECT * FROM logs ORDER BY event_timestamp DESC LIMIT 100) page ON TRUE"
+    )
+    formatted_logs = [
+        {
+            'id': log[1],
+            'plate_number': log[2],
+            'event_type': log[3],
+            'event_timestamp': log[4].strftime('%Y-%m-%d %H:%M:%S'),
+            'message': log[5]
+        } for log in logs if log[1] is not None
+    ]
+    return logs[0][0] if logs else 0, formatted_logs
+
+# Every tab polls this; the body is cached until a new log row is announced,
+# and a poll that already has it gets a 304
+logs_feed = LogsFeed(build_logs).start()
+
 @app.route('/logs')
 def get_logs():
-    conn = get_db_connection()
-    if not conn:
-        return jsonify({'error': 'Database connection failed'}), 500
-
     try:
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM logs ORDER BY event_timestamp DESC LIMIT 100")
-        logs = cursor.fetchall()
-        formatted_logs = [
-            {
-                'id': log[0],
-                'plate_number': log[1],
-                'event_type': log[2],
-                'event_timestamp': log[3].strftime('%Y-%m-%d %H:%M:%S'),
-                'message': log[4]
-            } for log in logs
-        ]
-        cursor.close()
-        conn.close()
-        return jsonify(formatted_logs)
+        cached = logs_feed.current()
+        if request.if_none_match.contains_weak(cached.etag):
+            response = Response(status=304)
+        else:
+            body, encoding = cached.encode(choose_encoding(request.headers.get('Accept-Encoding')))
+            response = Response(body, mimetype='application/json')
+            if encoding != 'identity':
+                response.headers['Content-Encoding'] = encoding
+        response.set_etag(cached.etag, weak=True)
+        response.headers['Cache-Control'] = 'no-cache'
+        response.headers['Vary'] = 'Accept-Encoding'
+        return response
+    except QueryRejected as e:
+        print(f"[WARNING] Logs query refused: {e}")
+        return jsonify({'error': str(e)}), 503
     except psycopg2.Error as e:
         print(f"[ERROR] Failed to fetch logs: {e}")
-        conn.close()
         return jsonify({'error': str(e)}), 500
 
+# Served from the lanes' local counter, so polling it never touches Postgres
+@app.route('/occupancy')
+def get_occupancy():
+    global occupancy
+    try:
+        if occupancy is None:
+            occupancy = Occupancy()
+        state = occupancy.snapshot()
+    except sqlite3.Error as e:
+        print(f"[ERROR] Failed to read occupancy: {e}")
+        return jsonify({'error': str(e)}), 500
+    return jsonify({
+        'occupied': state['occupied'],
+        'capacity': state['capacity'] or None,
+        'free': state['free'],
+        'full': state['full'],
+        'updated_at': datetime.fromtimestamp(state['updated_at']).strftime('%Y-%m-%d %H:%M:%S')
+    })
+
+# Requests/s and latency for concurrent pollers: without the cache (every
+# poll queries), full bodies from the cache, and conditional polls
+def bench(clients, seconds):
+    from werkzeug.serving import make_server
+
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}/logs"
+
+    def client(stop, timings, conditional, errors):
+        etag = None
+        while not stop.is_set():
+            req = urllib.request.Request(url, headers={'Accept-Encoding': 'gzip, br'})
+            if conditional and etag:
+                req.add_header('If-None-Match', etag)
+            t = time.perf_counter()
+            try:
+                with urllib.request.urlopen(req) as response:
+                    response.read()
+                    etag = response.headers.get('ETag')
+            except urllib.error.HTTPError as e:
+                if e.code != 304:
+                    errors.append(e.code)
+            except OSError:
+                errors.append(None)
+                continue
+            timings.append((time.perf_counter() - t) * 1000)
+
+    for label, caching, conditional in (('no cache', False, False), ('cached', True, False),
+                                        ('cached + If-None-Match', True, True)):
+        logs_feed.caching = caching
+        rebuilds = logs_feed.rebuilds
+        stop, timings, errors = threading.Event(), [], []
+        threads = [threading.Thread(target=client, args=(stop, timings, conditional, errors), daemon=True)
+                   for _ in range(clients)]
+        for thread in threads:
+            thread.start()
+        time.sleep(seconds)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        timings.sort()
+        print(f"[BENCH] {label}: {len(timings) / seconds:.0f} req/s at {clients} clients, "
+              f"p50 {statistics.median(timings):.1f} ms, p99 {timings[int(len(timings) * 0.99)]:.1f} ms, "
+              f"{logs_feed.rebuilds - rebuilds} queries, {len(errors)} errors")
+    logs_feed.caching = True
+    server.shutdown()
+
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Parking dashboard")
+    parser.add_argument('--bench', action='store_true', help="benchmark /logs with concurrent pollers and exit")
+    parser.add_argument('--clients', type=int, default=50)
+    parser.add_argument('--seconds', type=int, default=10)
+    args = parser.parse_args()
+    if args.bench:
+        bench(args.clients, args.seconds)
+    else:
+        app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
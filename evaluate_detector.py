@@ -0,0 +1,222 @@
+import argparse
+import csv
+import itertools
+import multiprocessing
+import os
+import shutil
+import statistics
+import time
+
+import yaml
+
+from arrange_dataset import IMAGE_EXTENSIONS, dataset_yaml
+from parking_logger import get_logger
+from plate_decoder import decode_plate
+from plate_recognizer import get_recognizer, load_labelled_crops
+from train_detector import resolve_data_yaml
+
+logger = get_logger("evaluate_detector")
+
+# Configuration
+WEIGHTS = 'best.pt'
+REPLAY_DIR = 'plates'
+EXPORT_DIR = 'exports'
+CONFS = '0.25,0.4,0.5'
+IMGSZ = '320,480,640'
+RUNTIMES = 'torch,onnx'
+THREADS = '1,2,4'
+MIN_BOXES = '50x20,30x12,0x0'   # the lanes filter boxes smaller than 50x20
+LATENCY_IMAGES = 100
+EXPORT_FORMATS = {'onnx': ('onnx', '.onnx'), 'openvino': ('openvino', '_openvino_model')}
+
+
+def parse_list(text, kind=str):
+    return [kind(item) for item in text.split(',') if item]
+
+
+def parse_box(text):
+    width, height = text.lower().split('x')
+    return int(width), int(height)
+
+
+# Weights for a runtime at a fixed input size. Exports are cached per size
+# under EXPORT_DIR since ultralytics always writes them next to the weights.
+def export_model(weights, runtime, imgsz):
+    if runtime == 'torch':
+        return weights
+    export_format, suffix = EXPORT_FORMATS[runtime]
+    stem = os.path.splitext(os.path.basename(weights))[0]
+    target = os.path.join(EXPORT_DIR, f"{stem}_{imgsz}{suffix}")
+    if os.path.exists(target) and os.path.getmtime(target) >= os.path.getmtime(weights):
+        return target
+    from ultralytics import YOLO
+    exported = YOLO(weights).export(format=export_format, imgsz=imgsz, dynamic=False)
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    if os.path.exists(target):
+        shutil.rmtree(target) if os.path.isdir(target) else os.remove(target)
+    shutil.move(exported, target)
+    return target
+
+
+# Runs in a fresh process per (runtime, imgsz, threads) so the thread limit
+# applies before torch / onnxruntime start their pools, and CPU time is ours
+def _limit_threads(threads):
+    for var in ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS'):
+        os.environ[var] = str(threads)
+    if hasattr(os, 'sched_setaffinity'):
+        cpus = sorted(os.sched_getaffinity(0))
+        os.sched_setaffinity(0, cpus[:threads])
+
+
+def _evaluate(model_path, runtime, imgsz, threads, confs, min_boxes, data_yaml, val_images, replay):
+    import cv2
+    import torch
+    from ultralytics import YOLO
+
+    torch.set_num_threads(threads)
+    cv2.setNumThreads(threads)
+    model = YOLO(model_path, task='detect')
+    low_conf = min(confs)
+
+    # Single-frame latency as a lane sees it, at the lowest threshold so NMS
+    # does the most work
+    images = [img for img in (cv2.imread(p) for p in val_images[:LATENCY_IMAGES]) if img is not None]
+    model(images[0], imgsz=imgsz, conf=low_conf, verbose=False)
+    latencies = []
+    cpu_start, wall_start = time.process_time(), time.perf_counter()
+    for image in images:
+        t = time.perf_counter()
+        model(image, imgsz=imgsz, conf=low_conf, verbose=False)
+        latencies.append((time.perf_counter() - t) * 1000)
+    cpu, wall = time.process_time() - cpu_start, time.perf_counter() - wall_start
+    latencies.sort()
+    latency = {'p50_ms': statistics.median(latencies),
+               'p95_ms': latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+               'cpu_ms': cpu / len(images) * 1000, 'cores': cpu / wall}
+
+    # Replay crops: detect once at the lowest threshold, then each conf / box
+    # filter picks its best surviving box; OCR results are shared between them
+    recognizer = get_recognizer()
+    detections = []
+    for path, plate in replay:
+        image = cv2.imread(path)
+        if image is None:
+            continue
+        result = model(image, imgsz=imgsz, conf=low_conf, verbose=False)[0]
+        boxes = sorted(((float(b.conf[0]), tuple(map(int, b.xyxy[0]))) for b in result.boxes), reverse=True)
+        detections.append((image, plate, boxes))
+    ocr_cache = {}
+
+    def read(i, box):
+        if (i, box) not in ocr_cache:
+            x1, y1, x2, y2 = box
+            decoded = decode_plate(recognizer.read(detections[i][0][y1:y2, x1:x2]))
+            ocr_cache[i, box] = decoded.text if decoded else None
+        return ocr_cache[i, box]
+
+    results = []
+    for conf in confs:
+        metrics = model.val(data=data_yaml, imgsz=imgsz, conf=conf, batch=1, device='cpu',
+                            plots=False, verbose=False)
+        for min_w, min_h in min_boxes:
+            found = correct = 0
+            for i, (_, plate, boxes) in enumerate(detections):
+                box = next((b for c, b in boxes if c >= conf and b[2] - b[0] >= min_w and b[3] - b[1] >= min_h),
+                           None)
+                if box is None:
+                    continue
+                found += 1
+                correct += read(i, box) == plate
+            n = max(len(detections), 1)
+            results.append(dict(runtime=runtime, imgsz=imgsz, threads=threads, conf=conf,
+                                min_box=f"{min_w}x{min_h}", map50=float(metrics.box.map50),
+                                map=float(metrics.box.map), recall=float(metrics.box.mr),
+                                plate_found=found / n, plate_read=correct / n, **latency))
+    return results
+
+
+# Configs no other config beats on accuracy (mAP50 and plate reads) without
+# also being slower at p95
+def pareto_front(rows):
+    def dominates(a, b):
+        better_or_equal = a['map50'] >= b['map50'] and a['plate_read'] >= b['plate_read'] \
+            and a['p95_ms'] <= b['p95_ms']
+        strictly = a['map50'] > b['map50'] or a['plate_read'] > b['plate_read'] or a['p95_ms'] < b['p95_ms']
+        return better_or_equal and strictly
+
+    return [row for row in rows if not any(dominates(other, row) for other in rows if other is not row)]
+
+
+def sweep(args):
+    data_yaml = resolve_data_yaml(args.data)
+    with open(data_yaml) as f:
+        data = yaml.safe_load(f)
+    val_dir = os.path.join(data['path'], data['val'])
+    val_images = sorted(os.path.join(val_dir, name) for name in os.listdir(val_dir)
+                        if name.lower().endswith(IMAGE_EXTENSIONS))
+    replay = load_labelled_crops(args.replay, limit=args.replay_limit) if os.path.isdir(args.replay) else []
+    confs = parse_list(args.conf, float)
+    min_boxes = [parse_box(b) for b in parse_list(args.min_box)]
+    print(f"[EVAL] {len(val_images)} val images, {len(replay)} replay crops")
+
+    rows = []
+    context = multiprocessing.get_context('spawn')
+    try:
+        for runtime, imgsz, threads in itertools.product(parse_list(args.runtime), parse_list(args.imgsz, int),
+                                                         parse_list(args.threads, int)):
+            try:
+                model_path = export_model(args.weights, runtime, imgsz)
+            except Exception as e:
+                print(f"[WARNING] Skipping {runtime} at {imgsz}px: export failed ({e})")
+                continue
+            print(f"[EVAL] {runtime} {imgsz}px {threads} thread(s)")
+            with context.Pool(1, _limit_threads, (threads,)) as pool:
+                rows += pool.apply(_evaluate, (model_path, runtime, imgsz, threads, confs, min_boxes, data_yaml,
+                                               val_images, replay))
+    finally:
+        os.remove(data_yaml)
+
+    if not rows:
+        print("[EVAL] Nothing evaluated")
+        return
+    front = pareto_front(rows)
+    print_table(rows, front)
+    if args.out:
+        with open(args.out, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0]) + ['pareto'])
+            writer.writeheader()
+            for row in rows:
+                writer.writerow(dict(row, pareto=any(row is p for p in front)))
+        print(f"[EVAL] Wrote {args.out}")
+    logger.info(f"Detector sweep: {len(rows)} configs, {len(front)} on the Pareto front")
+
+
+def print_table(rows, front):
+    print(f"\n  {'runtime':<9} {'imgsz':>5} {'thr':>3} {'conf':>5} {'min box':>8} {'mAP50':>6} {'mAP':>6} "
+          f"{'recall':>6} {'found':>6} {'read':>6} {'p50 ms':>7} {'p95 ms':>7} {'cpu ms':>7} {'cores':>5}")
+    for row in sorted(rows, key=lambda r: r['p95_ms']):
+        mark = '*' if any(row is p for p in front) else ' '
+        print(f"{mark} {row['runtime']:<9} {row['imgsz']:>5} {row['threads']:>3} {row['conf']:>5.2f} "
+              f"{row['min_box']:>8} {row['map50']:>6.3f} {row['map']:>6.3f} {row['recall']:>6.3f} "
+              f"{row['plate_found']:>6.1%} {row['plate_read']:>6.1%} {row['p50_ms']:>7.1f} {row['p95_ms']:>7.1f} "
+              f"{row['cpu_ms']:>7.1f} {row['cores']:>5.2f}")
+    print("\n* Pareto-optimal: nothing else is at least as accurate and faster at p95")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep detector settings for accuracy vs latency")
+    parser.add_argument('--weights', default=WEIGHTS)
+    parser.add_argument('--data', default=dataset_yaml)
+    parser.add_argument('--replay', default=REPLAY_DIR, help="saved plate crops named <PLATE>_<timestamp>.jpg")
+    parser.add_argument('--replay-limit', type=int)
+    parser.add_argument('--conf', default=CONFS)
+    parser.add_argument('--imgsz', default=IMGSZ)
+    parser.add_argument('--runtime', default=RUNTIMES, help="torch, onnx, openvino")
+    parser.add_argument('--threads', default=THREADS)
+    parser.add_argument('--min-box', default=MIN_BOXES, help="minimum box WxH the lanes accept")
+    parser.add_argument('--out', help="also write the table as CSV")
+    sweep(parser.parse_args())
+
+
+if __name__ == '__main__':
+    main()
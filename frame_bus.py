@@ -0,0 +1,387 @@
+import argparse
+import inspect
+import multiprocessing
+import statistics
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+from parking_logger import get_logger
+
+logger = get_logger("frame_bus")
+
+# Configuration
+BUS_SLOTS = 4               # frames a reader can hold before the writer laps it
+MAX_READERS = 8
+POLL_INTERVAL = 0.0005      # seconds between head checks while waiting
+READ_RETRIES = 3
+MAGIC = 0x46524D42          # "FRMB"
+
+# Header layout (int64 words): magic, height, width, channels, slots, head
+# sequence, closed flag, reserved. Followed by per-slot sequence words,
+# per-slot timestamps, reader cursors, then the frame slots themselves.
+CTRL_WORDS = 8
+HEAD, CLOSED = 5, 6
+
+
+def _layout(slots):
+    seq_offset = CTRL_WORDS * 8
+    ts_offset = seq_offset + slots * 8
+    cursor_offset = ts_offset + slots * 8
+    data_offset = -(-(cursor_offset + MAX_READERS * 8) // 64) * 64
+    return seq_offset, ts_offset, cursor_offset, data_offset
+
+
+# Before Python 3.13 every attach registers the segment with the resource
+# tracker, which unlinks it when that process exits
+UNTRACKED_ATTACH = 'track' in inspect.signature(shared_memory.SharedMemory).parameters
+
+
+def _attach(name):
+    if UNTRACKED_ATTACH:
+        return shared_memory.SharedMemory(name=name, track=False)
+    shm = shared_memory.SharedMemory(name=name)
+    resource_tracker.unregister(shm._name, 'shared_memory')
+    return shm
+
+
+class BusFrame:
+    def __init__(self, image, timestamp, index, slot):
+        self.image = image
+        self.timestamp = timestamp
+        self.index = index
+        self.slot = slot
+
+
+# A ring of frame slots in one shared-memory segment. One writer publishes;
+# any number of readers in other processes pick up the newest frame without
+# pickling or copying it. Each slot has a sequence word used as a seqlock:
+# odd while the writer is filling it, 2 * frame sequence once published, so
+# a reader can tell whether what it read was overwritten underneath it.
+class FrameBus:
+    def __init__(self, shm, owner):
+        self.shm = shm
+        self.owner = owner
+        self.ctrl = np.ndarray((CTRL_WORDS,), np.int64, shm.buf)
+        if self.ctrl[0] != MAGIC:
+            raise ValueError(f"{shm.name} is not a frame bus")
+        height, width, channels, slots = (int(v) for v in self.ctrl[1:5])
+        self.shape = (height, width, channels)
+        self.slots = slots
+        seq_offset, ts_offset, cursor_offset, data_offset = _layout(slots)
+        self.slot_seq = np.ndarray((slots,), np.int64, shm.buf, seq_offset)
+        self.slot_ts = np.ndarray((slots,), np.float64, shm.buf, ts_offset)
+        self.cursors = np.ndarray((MAX_READERS,), np.int64, shm.buf, cursor_offset)
+        self.frames = np.ndarray((slots,) + self.shape, np.uint8, shm.buf, data_offset)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    @classmethod
+    def create(cls, name, shape, slots=BUS_SLOTS):
+        data_offset = _layout(slots)[3]
+        size = data_offset + slots * int(np.prod(shape))
+        try:
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            # Left behind by a crashed writer
+            stale = _attach(name)
+            stale.close()
+            stale.unlink()
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        ctrl = np.ndarray((CTRL_WORDS,), np.int64, shm.buf)
+        ctrl[:] = 0
+        ctrl[1:5] = (*shape, slots)
+        np.ndarray((slots * 2 + MAX_READERS,), np.int64, shm.buf, _layout(slots)[0])[:] = 0
+        ctrl[0] = MAGIC
+        logger.info(f"Frame bus {name} created: {slots} x {shape[1]}x{shape[0]} ({size / 1e6:.1f} MB)")
+        return cls(shm, owner=True)
+
+    @classmethod
+    def attach(cls, name):
+        return cls(_attach(name), owner=False)
+
+    # Writer side: copy a frame into the next slot and make it the newest
+    def publish(self, image, timestamp=None):
+        seq = int(self.ctrl[HEAD]) + 1
+        slot = seq % self.slots
+        self.slot_seq[slot] = 2 * seq - 1
+        np.copyto(self.frames[slot], image, casting='no')
+        self.slot_ts[slot] = time.time() if timestamp is None else timestamp
+        self.slot_seq[slot] = 2 * seq
+        self.ctrl[HEAD] = seq
+        return seq
+
+    def head(self):
+        return int(self.ctrl[HEAD])
+
+    def closed(self):
+        return bool(self.ctrl[CLOSED])
+
+    def reader(self, reader_id):
+        return BusReader(self, reader_id)
+
+    # Readers holding lag = head - cursor frames behind, -1 for unused ids
+    def lag(self):
+        head = self.head()
+        return [head - int(c) if c else -1 for c in self.cursors]
+
+    def close(self):
+        # Views must go before the segment can be closed
+        self.ctrl = self.slot_seq = self.slot_ts = self.cursors = self.frames = None
+        if self.owner:
+            np.ndarray((CTRL_WORDS,), np.int64, self.shm.buf)[CLOSED] = 1
+        try:
+            self.shm.close()
+        except BufferError:
+            pass    # a caller still holds a frame view; the mapping goes with it
+        if self.owner:
+            if not UNTRACKED_ATTACH:
+                # A reader in a child process shares our tracker and may have
+                # dropped the registration unlink() is about to remove
+                resource_tracker.register(self.shm._name, 'shared_memory')
+            self.shm.unlink()
+
+
+# One consumer's view of a bus. Latest-frame semantics: each call returns the
+# newest frame published since the last one this reader took, skipping (and
+# counting) any it was too slow for. The reader's cursor is published in the
+# bus header so the writer side can see who is lagging.
+class BusReader:
+    def __init__(self, bus, reader_id):
+        if not 0 <= reader_id < MAX_READERS:
+            raise ValueError(f"reader_id must be below {MAX_READERS}")
+        self.bus = bus
+        self.reader_id = reader_id
+        self.cursor = 0
+        self.received = 0
+        self.dropped = 0
+        self.torn = 0
+
+    # Newest unseen frame as a zero-copy view, or None. The view stays valid
+    # until the writer laps it (slots - 1 further frames); check valid()
+    # after using it if that may have happened.
+    def latest(self):
+        bus = self.bus
+        for _ in range(READ_RETRIES):
+            head = bus.head()
+            if head == self.cursor:
+                return None
+            slot = head % bus.slots
+            if bus.slot_seq[slot] != 2 * head:
+                continue    # writer already lapped into this slot
+            frame = BusFrame(bus.frames[slot], float(bus.slot_ts[slot]), head, slot)
+            self._advance(head)
+            return frame
+        self.torn += 1
+        return None
+
+    def valid(self, frame):
+        return self.bus.slot_seq[frame.slot] == 2 * frame.index
+
+    # Newest unseen frame copied into dst (e.g. a capture ring buffer);
+    # returns a BusFrame over dst or None
+    def read_into(self, dst):
+        for _ in range(READ_RETRIES):
+            frame = self.latest()
+            if frame is None:
+                return None
+            np.copyto(dst, frame.image)
+            if self.valid(frame):
+                return BusFrame(dst, frame.timestamp, frame.index, frame.slot)
+            self.torn += 1
+        return None
+
+    def wait(self, timeout=1.0):
+        deadline = time.perf_counter() + timeout
+        while self.bus.head() == self.cursor:
+            if self.bus.closed() or time.perf_counter() >= deadline:
+                return False
+            time.sleep(POLL_INTERVAL)
+        return True
+
+    def _advance(self, head):
+        if self.cursor:
+            self.dropped += head - self.cursor - 1
+        self.received += 1
+        self.cursor = head
+        self.bus.cursors[self.reader_id] = head
+
+
+# Capture process: decode a camera with the usual backends and publish every
+# frame on the bus for the lane, detector and preview processes to share
+def publish_source(camera, options, name, slots=BUS_SLOTS):
+    from capture import open_source
+
+    source = open_source(camera, options)
+    frame = None
+    while frame is None:
+        frame = source.read()
+        if frame is None and not source.live:
+            raise SystemExit(f"[ERROR] Cannot read from {camera}")
+    bus = FrameBus.create(name, frame.image.shape, slots)
+    print(f"[BUS] Publishing {camera} on {name}")
+    last_report, published = time.time(), 0
+    try:
+        while frame is not None or source.live:
+            if frame is not None:
+                bus.publish(frame.image, frame.timestamp)
+                published += 1
+            if time.time() - last_report >= 10:
+                print(f"[BUS] {published / (time.time() - last_report):.1f} fps, reader lag {bus.lag()}")
+                last_report, published = time.time(), 0
+            frame = source.read()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        source.release()
+        bus.close()
+
+
+# ---------------------------------------------------------------------------
+# Throughput benchmark: shared-memory bus vs pickling through Queues
+# ---------------------------------------------------------------------------
+
+def _synthetic_frames(shape, count=4):
+    rng = np.random.default_rng(0)
+    return [rng.integers(0, 256, shape, dtype=np.uint8) for _ in range(count)]
+
+
+def _bench_writer(transport, target, shape, fps, seconds, ready, results):
+    frames = _synthetic_frames(shape)
+    ready.wait()
+    interval = 1.0 / fps if fps else 0
+    start = next_at = time.perf_counter()
+    cpu = time.process_time()
+    sent = 0
+    if transport == 'bus':
+        bus = FrameBus.attach(target)
+    while time.perf_counter() - start < seconds:
+        image = frames[sent % len(frames)]
+        if transport == 'bus':
+            bus.publish(image)
+        else:
+            stamp = time.time()
+            for queue in target:
+                if queue.empty():   # latest-frame: never queue behind a slow reader
+                    queue.put((stamp, image))
+        sent += 1
+        if interval:
+            next_at += interval
+            time.sleep(max(0.0, next_at - time.perf_counter()))
+    elapsed = time.perf_counter() - start
+    results.put(('writer', sent / elapsed, (time.process_time() - cpu) / max(sent, 1) * 1000))
+    if transport == 'bus':
+        bus.close()
+    else:
+        for queue in target:
+            queue.cancel_join_thread()  # readers have stopped; don't block on unread frames
+
+
+def _bench_reader(transport, target, reader_id, seconds, work_ms, ready, results):
+    latencies, received, torn = [], 0, 0
+    if transport == 'bus':
+        bus = FrameBus.attach(target)
+        reader = bus.reader(reader_id)
+    ready.wait()
+    cpu = time.process_time()
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        if transport == 'bus':
+            if not reader.wait(0.1):
+                continue
+            frame = reader.latest()
+            if frame is None:
+                continue
+            stamp, image = frame.timestamp, frame.image
+        else:
+            try:
+                stamp, image = target.get(timeout=0.1)
+            except Exception:
+                continue
+        latencies.append((time.time() - stamp) * 1000)
+        int(image[::64, ::64].sum())    # touch the pixels
+        if work_ms:
+            time.sleep(work_ms / 1000)
+        if transport == 'bus' and not reader.valid(frame):
+            torn += 1
+        received += 1
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    dropped = reader.dropped if transport == 'bus' else None
+    results.put(('reader', reader_id, received / elapsed, statistics.median(latencies) if latencies else 0,
+                 latencies[int(len(latencies) * 0.95)] if latencies else 0, dropped, torn,
+                 (time.process_time() - cpu) / max(received, 1) * 1000))
+    if transport == 'bus':
+        bus.close()
+
+
+def bench(shape, fps, readers, seconds, work_ms, transports):
+    ctx = multiprocessing.get_context('spawn')
+    for transport in transports:
+        bus, target = None, None
+        if transport == 'bus':
+            bus = FrameBus.create(f"bench_bus_{int(time.time())}", shape)
+            target = bus.name
+            reader_targets = [target] * readers
+        else:
+            reader_targets = [ctx.Queue(maxsize=1) for _ in range(readers)]
+            target = reader_targets
+        ready, results = ctx.Event(), ctx.Queue()
+        procs = [ctx.Process(target=_bench_reader, args=(transport, reader_targets[i], i, seconds, work_ms,
+                                                          ready, results)) for i in range(readers)]
+        procs.append(ctx.Process(target=_bench_writer, args=(transport, target, shape, fps, seconds, ready, results)))
+        for proc in procs:
+            proc.start()
+        time.sleep(1.0)     # let every process import and attach
+        ready.set()
+        rows = [results.get(timeout=seconds + 30) for _ in procs]
+        for proc in procs:
+            proc.join()
+        if bus:
+            bus.close()
+
+        writer = next(r for r in rows if r[0] == 'writer')
+        print(f"[BENCH] {transport}: {shape[1]}x{shape[0]} target {fps or 'max'} fps, {readers} readers"
+              f"{f', {work_ms:g} ms work per frame' if work_ms else ''}")
+        print(f"  writer: {writer[1]:.1f} fps, {writer[2]:.2f} ms CPU per frame")
+        for r in sorted(r for r in rows if r[0] == 'reader'):
+            dropped = f", dropped {r[5]}" if r[5] is not None else ""
+            print(f"  reader {r[1]}: {r[2]:.1f} fps, latency p50 {r[3]:.2f} ms p95 {r[4]:.2f} ms, "
+                  f"{r[7]:.2f} ms CPU per frame{dropped}, torn {r[6]}")
+
+
+def parse_size(text):
+    width, height = text.lower().split('x')
+    return int(height), int(width), 3
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Shared-memory frame bus between capture and lane processes")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    publish_parser = subparsers.add_parser('publish', help="capture a camera and publish it on a bus")
+    publish_parser.add_argument('source', help="USB index, rtsp:// URL, video file or image directory")
+    publish_parser.add_argument('--name', required=True, help="bus name; lanes read it as camera 'bus://NAME'")
+    publish_parser.add_argument('--slots', type=int, default=BUS_SLOTS)
+    publish_parser.add_argument('--width', type=int)
+    publish_parser.add_argument('--height', type=int)
+    bench_parser = subparsers.add_parser('bench', help="bus vs multiprocessing.Queue throughput")
+    bench_parser.add_argument('--size', default='1920x1080')
+    bench_parser.add_argument('--fps', type=float, default=30, help="0 publishes as fast as possible")
+    bench_parser.add_argument('--readers', type=int, default=3)
+    bench_parser.add_argument('--seconds', type=float, default=10)
+    bench_parser.add_argument('--work-ms', type=float, default=0, help="simulated per-frame reader work")
+    bench_parser.add_argument('--transports', default='bus,queue')
+    args = parser.parse_args()
+
+    if args.command == 'publish':
+        publish_source(args.source, {'width': args.width, 'height': args.height}, args.name, args.slots)
+    else:
+        bench(parse_size(args.size), args.fps, args.readers, args.seconds, args.work_ms,
+              args.transports.split(','))
+
+
+if __name__ == '__main__':
+    main()
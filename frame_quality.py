@@ -0,0 +1,78 @@
+import math
+
+import cv2
+
+# Configuration
+SHARPNESS_HEIGHT = 48       # crops are scaled to this height before measuring blur
+SHARPNESS_REF = 400.0       # Laplacian variance treated as "fully sharp"
+SIZE_REF = 40               # box height (px) at which characters are comfortably legible
+PLATE_ASPECT = 4.5          # width / height of a Rwandan plate
+ASPECT_TOLERANCE = 0.35     # spread of the aspect score, in log-ratio units
+MIN_QUALITY = 0.15          # crops below this never reach OCR
+WEIGHTS = {'sharpness': 0.4, 'size': 0.2, 'aspect': 0.2, 'confidence': 0.2}
+SELECT_WINDOW = 0.6         # seconds of crops pooled before picking the best
+SELECT_TOP_K = 2
+
+
+class CropScore:
+    def __init__(self, sharpness, size, aspect, confidence):
+        self.sharpness = sharpness
+        self.size = size
+        self.aspect = aspect
+        self.confidence = confidence
+        # Weighted geometric mean: one bad component sinks the crop
+        self.score = math.exp(sum(w * math.log(max(getattr(self, k), 1e-6)) for k, w in WEIGHTS.items()))
+
+    def __repr__(self):
+        return (f"CropScore({self.score:.2f}: sharp {self.sharpness:.2f}, size {self.size:.2f}, "
+                f"aspect {self.aspect:.2f}, conf {self.confidence:.2f})")
+
+
+# Cheap enough to run on every detection: one resize and one Laplacian on a
+# crop a few dozen pixels high
+def score_crop(crop, confidence=1.0):
+    height, width = crop.shape[:2]
+    gray = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY) if crop.ndim == 3 else crop
+    scaled = cv2.resize(gray, (max(1, round(width * SHARPNESS_HEIGHT / height)), SHARPNESS_HEIGHT),
+                        interpolation=cv2.INTER_AREA)
+    sharpness = min(1.0, float(cv2.Laplacian(scaled, cv2.CV_64F).var()) / SHARPNESS_REF)
+    size = min(1.0, height / SIZE_REF)
+    aspect = math.exp(-math.log((width / height) / PLATE_ASPECT) ** 2 / (2 * ASPECT_TOLERANCE ** 2))
+    return CropScore(sharpness, size, aspect, float(confidence))
+
+
+# Pools crops for SELECT_WINDOW seconds and releases only the best top_k of
+# them, best first. A window opens with the first crop offered and closes on
+# the first offer or poll after it has run its length.
+class CropSelector:
+    def __init__(self, window=SELECT_WINDOW, top_k=SELECT_TOP_K, min_quality=MIN_QUALITY):
+        self.window = window
+        self.top_k = top_k
+        self.min_quality = min_quality
+        self.pending = []
+        self.opened_at = None
+        self.offered = 0
+        self.selected = 0
+
+    # Returns the crops to OCR now (possibly none). item is whatever the
+    # caller needs back, e.g. (crop, frame, box).
+    def offer(self, score, item, now):
+        released = self.poll(now)
+        self.offered += 1
+        if score.score < self.min_quality:
+            return released
+        if self.opened_at is None:
+            self.opened_at = now
+        self.pending.append((score.score, self.offered, item))
+        return released
+
+    def poll(self, now):
+        if self.opened_at is None or now - self.opened_at < self.window:
+            return []
+        return self.flush()
+
+    def flush(self):
+        best = sorted(self.pending, key=lambda p: (-p[0], p[1]))[:self.top_k]
+        self.pending, self.opened_at = [], None
+        self.selected += len(best)
+        return [item for _, _, item in best]
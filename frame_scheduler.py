@@ -0,0 +1,109 @@
+import time
+
+from parking_logger import get_logger
+
+logger = get_logger("frame_scheduler")
+
+# Configuration
+LATENCY_BUDGET_MS = 400     # frame capture -> detection + OCR done, per lane
+EWMA_ALPHA = 0.2
+LOW_WATER = 0.6             # step back up once comfortably under budget
+HYSTERESIS_FRAMES = 5       # consecutive frames over/under before changing level
+IDLE_RESTORE_SECONDS = 10   # with nothing to process, step back up one level per this long
+
+# Degradation ladder, mildest first: process 1 of every `stride` frames,
+# detect at `imgsz`, send at most `top_k` crops per window to OCR
+LEVELS = [
+    {'stride': 1, 'imgsz': 640, 'top_k': 2},
+    {'stride': 2, 'imgsz': 640, 'top_k': 2},
+    {'stride': 2, 'imgsz': 480, 'top_k': 1},
+    {'stride': 3, 'imgsz': 384, 'top_k': 1},
+    {'stride': 4, 'imgsz': 320, 'top_k': 1},
+]
+
+
+# Keeps a lane's end-to-end latency (frame age when picked up + detection
+# and OCR time) near its budget by moving along LEVELS
+class AdaptiveScheduler:
+    def __init__(self, name, budget_ms=LATENCY_BUDGET_MS, levels=LEVELS):
+        self.name = name
+        self.budget_ms = budget_ms
+        self.levels = levels
+        self.level = 0
+        self.work_ms = None         # EWMA of detection + OCR time per processed frame
+        self.latency_ms = None      # EWMA of frame age + work
+        self.over = 0
+        self.under = 0
+        self.seen = 0
+        self.processed = 0
+        self.skipped = 0
+        self.changes = 0
+        self.active_at = time.time()    # last processed frame or level change
+
+    @property
+    def settings(self):
+        return self.levels[self.level]
+
+    # Whether to spend detection on this frame at the current level
+    def should_process(self):
+        self.seen += 1
+        if self.seen % self.settings['stride']:
+            self.skipped += 1
+            return False
+        return True
+
+    # Feed back one processed frame: how old it was when picked up and how
+    # long detection + OCR took on it
+    def record(self, frame_age_ms, work_ms):
+        self.processed += 1
+        self.active_at = time.time()
+        self.work_ms = work_ms if self.work_ms is None else EWMA_ALPHA * work_ms + (1 - EWMA_ALPHA) * self.work_ms
+        latency = frame_age_ms + work_ms
+        self.latency_ms = latency if self.latency_ms is None else \
+            EWMA_ALPHA * latency + (1 - EWMA_ALPHA) * self.latency_ms
+
+        if self.latency_ms > self.budget_ms:
+            self.over, self.under = self.over + 1, 0
+        elif self.latency_ms < self.budget_ms * LOW_WATER:
+            self.over, self.under = 0, self.under + 1
+        else:
+            self.over = self.under = 0
+
+        if self.over >= HYSTERESIS_FRAMES and self.level < len(self.levels) - 1:
+            self._set_level(self.level + 1)
+        elif self.under >= HYSTERESIS_FRAMES and self.level > 0:
+            self._set_level(self.level - 1)
+
+    # A frame with nothing to detect on (no car in front of the sensor).
+    # Levels only recover inside record(), so a lane that degraded under one
+    # burst would stay degraded until the next car; while idle it steps
+    # back up one level every IDLE_RESTORE_SECONDS and forgets the latency
+    # measured under the old load.
+    def idle(self, now=None):
+        now = time.time() if now is None else now
+        if self.level > 0 and now - self.active_at >= IDLE_RESTORE_SECONDS:
+            self.latency_ms = None
+            self._set_level(self.level - 1, "idle")
+
+    def _set_level(self, level, reason=None):
+        direction = "Degrading" if level > self.level else "Restoring"
+        self.level = level
+        self.over = self.under = 0
+        self.changes += 1
+        self.active_at = time.time()
+        if reason is None:
+            reason = f"latency {self.latency_ms:.0f} ms, budget {self.budget_ms} ms"
+        logger.info(f"{direction} lane {self.name} to level {level} {self.settings} ({reason})",
+                    extra={"lane": self.name, "latency_ms": round(self.latency_ms or 0)})
+
+    def snapshot(self):
+        return {
+            'level': self.level,
+            'settings': dict(self.settings),
+            'budget_ms': self.budget_ms,
+            'latency_ms': round(self.latency_ms, 1) if self.latency_ms is not None else None,
+            'work_ms': round(self.work_ms, 1) if self.work_ms is not None else None,
+            'processed': self.processed,
+            'skipped': self.skipped,
+            'level_changes': self.changes,
+        }
@@ -18,6 +18,16 @@ unsigned long lastDistanceTime = 0;
 bool blinkState = false;
 unsigned long lastBlinkTime = 0;
 const unsigned long blinkInterval = 250;
+// State reporting for the host-side gate mirror
+int servoAngle = 0;
+bool redOn = false;
+bool blinking = false;
+bool blinkStopped = true;
+char pendingDone = 0;              // command whose actuation is still settling
+unsigned long doneAt = 0;
+unsigned long lastStateTime = 0;
+const unsigned long servoSettleMs = 600;   // time for a full 0-180 sweep
+const unsigned long stateInterval = 1000;  // heartbeat when nothing changes
 
 void setup() {
   Serial.begin(9600);
@@ -46,13 +56,23 @@ void loop() {
     handleBlinking();  // Blink blue LED and beep buzzer
   } else {
     stopBlinking();    // Ensure they are off
-    // Distance reading (every 50ms)
-    unsigned long currentTime = millis();
-    if (currentTime - lastDistanceTime >= 50) {
-      float distance = getDistance();
-      Serial.println(distance, 2);  // Print with 2 decimals
-      lastDistanceTime = currentTime;
-    }
+  }
+  unsigned long currentTime = millis();
+  // Distance reading (every 50ms)
+  if (currentTime - lastDistanceTime >= 50) {
+    float distance = getDistance();
+    Serial.println(distance, 2);  // Print with 2 decimals
+    lastDistanceTime = currentTime;
+  }
+  // Report a command as done once the servo has had time to get there
+  if (pendingDone && currentTime >= doneAt) {
+    Serial.print("[DONE] ");
+    Serial.println(pendingDone);
+    pendingDone = 0;
+    reportState();
+  }
+  if (currentTime - lastStateTime >= stateInterval) {
+    reportState();
   }
 }
 
@@ -74,6 +94,17 @@ void startupBlink() {
   Serial.println("[STARTUP] Test complete");
 }
 
+// One line with everything the host mirrors: servo angle, LEDs, buzzer mode
+void reportState() {
+  Serial.print("[STATE] servo=");
+  Serial.print(servoAngle);
+  Serial.print(" red=");
+  Serial.print(redOn ? 1 : 0);
+  Serial.print(" blink=");
+  Serial.println(blinking ? 1 : 0);
+  lastStateTime = millis();
+}
+
 float getDistance() {
   digitalWrite(trigPin, LOW);
   delayMicroseconds(2);
@@ -88,21 +119,32 @@ float getDistance() {
 
 void handleSerialCommands() {
   if (Serial.available()) {
-    command = Serial.read();
-    Serial.print("[CMD] Received: ");
+    char received = Serial.read();
+    if (received != '0' && received != '1' && received != '2') {
+      return;  // Ignore line endings and noise
+    }
+    command = received;
+    // Acknowledge receipt straight away; [DONE] follows once actuated
+    Serial.print("[ACK] ");
     Serial.println(command);
     if (command == '1') {
       gateServo.write(180);  // Open
-      Serial.println("[SERVO] Gate opened (180°)");
+      servoAngle = 180;
+      blinking = true;
+      blinkStopped = false;
+      pendingDone = '1';
+      doneAt = millis() + servoSettleMs;
     }
     else if (command == '0') {
       gateServo.write(0);    // Close
-      Serial.println("[SERVO] Gate closed (0°)");
+      servoAngle = 0;
+      pendingDone = '0';
+      doneAt = millis() + servoSettleMs;
     }
     else if (command == '2') {
-      Serial.println("[BUZZER] Activating red LED and buzzer");
       blinkRedAndBuzzer(3);
-      Serial.println("[BUZZER] Sequence complete");
+      Serial.println("[DONE] 2");
+      reportState();
     }
   }
 }
@@ -110,14 +152,14 @@ void handleSerialCommands() {
 void blinkRedAndBuzzer(int times) {
   for (int i = 0; i < times; i++) {
     digitalWrite(redLED, HIGH);
+    redOn = true;
     tone(buzzer, 1000); // 1000Hz for passive buzzer
     // For active buzzer, uncomment: digitalWrite(buzzer, HIGH);
-    Serial.println("[BUZZER] ON");
     delay(250);
     digitalWrite(redLED, LOW);
+    redOn = false;
     noTone(buzzer); // Stop tone for passive buzzer
     // For active buzzer, uncomment: digitalWrite(buzzer, LOW);
-    Serial.println("[BUZZER] OFF");
     delay(250);
   }
 }
@@ -130,19 +172,24 @@ void handleBlinking() {
     if (blinkState) {
       tone(buzzer, 1000); // 1000Hz for passive buzzer
       // For active buzzer, uncomment: digitalWrite(buzzer, HIGH);
-      Serial.println("[BUZZER] ON (blink)");
     } else {
       noTone(buzzer); // Stop tone for passive buzzer
       // For active buzzer, uncomment: digitalWrite(buzzer, LOW);
-      Serial.println("[BUZZER] OFF (blink)");
     }
     lastBlinkTime = currentMillis;
   }
 }
 
+// Called every loop while the gate is closed; only act (and report) once
 void stopBlinking() {
+  if (blinkStopped) {
+    return;
+  }
   digitalWrite(blueLED, LOW);
   noTone(buzzer); // Stop tone for passive buzzer
   // For active buzzer, uncomment: digitalWrite(buzzer, LOW);
-  Serial.println("[BUZZER] Stopped");
+  blinking = false;
+  blinkState = false;
+  blinkStopped = true;
+  reportState();
 }
\ No newline at end of file
@@ -0,0 +1,319 @@
+import argparse
+import bisect
+import threading
+import time
+from collections import deque
+
+import serial
+
+from parking_logger import get_logger
+
+logger = get_logger("gate_mirror")
+
+# Configuration
+SERIAL_BAUD = 9600
+READ_TIMEOUT = 0.1          # reader wakes at least this often to check for lost commands
+ACK_TIMEOUT = 0.5           # resend a command not acknowledged within this
+MAX_RETRIES = 3
+BUZZER_SEQUENCE = 1.5       # seconds the sketch's buzzer sequence blocks its loop
+DONE_TIMEOUT = BUZZER_SEQUENCE + ACK_TIMEOUT    # an acked command whose [DONE] is this late was lost
+DISTANCE_STALE = 1.0        # seconds after which the last distance reading is ignored
+READY_MARKER = "[INIT]"
+COMMANDS = {'1': 'open', '0': 'close', '2': 'buzzer'}
+LATENCY_BUCKETS_MS = [5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000]
+
+
+# Fixed-bucket latency histogram; percentiles are read off bucket edges
+class LatencyHistogram:
+    def __init__(self, buckets=LATENCY_BUCKETS_MS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, ms):
+        self.counts[bisect.bisect_left(self.buckets, ms)] += 1
+        self.count += 1
+        self.total += ms
+        self.max = max(self.max, ms)
+
+    def percentile(self, p):
+        if not self.count:
+            return None
+        target = p / 100 * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                return self.buckets[i] if i < len(self.buckets) else self.max
+        return self.max
+
+    def summary(self):
+        if not self.count:
+            return "no samples"
+        return (f"n={self.count} mean={self.total / self.count:.0f}ms p50<={self.percentile(50):.0f}ms "
+                f"p95<={self.percentile(95):.0f}ms max={self.max:.0f}ms")
+
+    def to_dict(self):
+        labels = [f"le_{b}" for b in self.buckets] + ["inf"]
+        return {'count': self.count, 'sum_ms': round(self.total, 1), 'max_ms': round(self.max, 1),
+                'buckets': dict(zip(labels, self.counts))}
+
+
+# One command in flight; acked/done are set by the reader thread
+class GateCommand:
+    def __init__(self, code):
+        self.code = code
+        self.sent_at = time.perf_counter()
+        self.last_sent = self.sent_at
+        self.retries = 0
+        self.done_by = None         # set on ack: when [DONE] is given up on
+        self.acked = threading.Event()
+        self.done = threading.Event()
+        self.failed = False
+
+    def wait_ack(self, timeout):
+        return self.acked.wait(timeout)
+
+    def wait_done(self, timeout):
+        return self.done.wait(timeout)
+
+
+# Host-side model of the gate: consumes the sketch's telemetry on a reader
+# thread, matches [ACK]/[DONE] lines to the commands that caused them and
+# re-sends commands the board never acknowledged
+class GateMirror:
+    def __init__(self, ser, name='gate'):
+        self.ser = ser
+        self.name = name
+        self.write_lock = threading.Lock()
+        self.state_lock = threading.Lock()
+        self.pending = deque()
+        self.awaiting_done = deque()
+        self.ready = threading.Event()
+        self.stopping = threading.Event()
+        self.thread = None
+        self.servo = None
+        self.red = None
+        self.blink = None
+        self.distance_cm = None
+        self.distance_at = 0.0
+        self.last_line_at = 0.0
+        self.resends = 0
+        self.lost = 0
+        self.ack_latency = {code: LatencyHistogram() for code in COMMANDS}
+        self.done_latency = {code: LatencyHistogram() for code in COMMANDS}
+
+    @property
+    def is_open(self):
+        return self.ser is not None and self.ser.is_open
+
+    def start(self):
+        self.ser.timeout = READ_TIMEOUT
+        self.thread = threading.Thread(target=self._read_loop, name=f"gate-{self.name}", daemon=True)
+        self.thread.start()
+        return self
+
+    def close(self):
+        self.stopping.set()
+        if self.thread:
+            self.thread.join(2)
+        for code, name in COMMANDS.items():
+            if self.ack_latency[code].count:
+                logger.info(f"{self.name} {name}: ack {self.ack_latency[code].summary()}, "
+                            f"done {self.done_latency[code].summary()}", extra={"lane": self.name})
+
+    # Wait for setup() to report in, or for telemetry from a board that
+    # did not reset when the port was opened
+    def wait_ready(self, timeout):
+        return self.ready.wait(timeout)
+
+    def send(self, code):
+        command = GateCommand(code)
+        with self.state_lock:
+            self.pending.append(command)
+        self._write(code)
+        return command
+
+    def _write(self, code):
+        with self.write_lock:
+            self.ser.write(code.encode())
+            self.ser.flush()
+
+    # Latest distance in cm, or None when telemetry has gone quiet
+    def distance(self):
+        with self.state_lock:
+            if self.distance_cm is None or time.perf_counter() - self.distance_at > DISTANCE_STALE:
+                return None
+            return self.distance_cm
+
+    def snapshot(self):
+        with self.state_lock:
+            return {
+                'servo': self.servo, 'red': self.red, 'blink': self.blink,
+                'distance_cm': self.distance_cm, 'pending': [c.code for c in self.pending],
+                'resends': self.resends, 'lost': self.lost,
+                'ack_latency': {COMMANDS[c]: h.to_dict() for c, h in self.ack_latency.items()},
+                'done_latency': {COMMANDS[c]: h.to_dict() for c, h in self.done_latency.items()},
+            }
+
+    def _read_loop(self):
+        while not self.stopping.is_set():
+            try:
+                line = self.ser.readline().decode(errors='ignore').strip()
+            except (serial.SerialException, OSError) as e:
+                logger.error(f"Gate telemetry read failed: {e}", extra={"lane": self.name})
+                break
+            if line:
+                self._handle_line(line)
+            self._resend_lost()
+
+    def _handle_line(self, line):
+        now = time.perf_counter()
+        with self.state_lock:
+            self.last_line_at = now
+        if line.startswith("[ACK] "):
+            self._match(self.pending, line[6:7], now, self.ack_latency, acked=True)
+        elif line.startswith("[DONE] "):
+            self._match(self.awaiting_done, line[7:8], now, self.done_latency, acked=False)
+        elif line.startswith("[STATE] "):
+            fields = dict(part.split('=', 1) for part in line[8:].split() if '=' in part)
+            with self.state_lock:
+                self.servo = int(fields.get('servo', self.servo or 0))
+                self.red = fields.get('red') == '1'
+                self.blink = fields.get('blink') == '1'
+            self.ready.set()
+        elif line.startswith(READY_MARKER):
+            self.ready.set()
+        elif not line.startswith('['):
+            # Bare number: distance telemetry every 50 ms, too chatty to log
+            try:
+                distance = float(line)
+            except ValueError:
+                return
+            with self.state_lock:
+                self.distance_cm = distance
+                self.distance_at = now
+            self.ready.set()
+            return
+        logger.debug(f"Gate: {line}", extra={"lane": self.name})
+
+    # Oldest outstanding command with this code gets the reply
+    def _match(self, queue, code, now, histograms, acked):
+        with self.state_lock:
+            command = next((c for c in queue if c.code == code), None)
+            if command is None:
+                return
+            queue.remove(command)
+            if acked:
+                command.done_by = now + DONE_TIMEOUT
+                self.awaiting_done.append(command)
+        histograms[code].observe((now - command.sent_at) * 1000)
+        (command.acked if acked else command.done).set()
+
+    def _resend_lost(self):
+        now = time.perf_counter()
+        resend, given_up, unfinished = [], [], []
+        with self.state_lock:
+            # A [DONE] line can be lost like any other; past its deadline
+            # the command stops counting as running
+            for command in [c for c in self.awaiting_done if now >= c.done_by]:
+                self.awaiting_done.remove(command)
+                command.failed = True
+                self.lost += 1
+                unfinished.append(command)
+            # The buzzer sequence blocks the sketch's loop, so silence then
+            # is expected and a resend would only queue a duplicate
+            busy = any(c.code == '2' for c in self.awaiting_done)
+            for command in list(self.pending):
+                if busy:
+                    command.last_sent = now
+                    continue
+                if now - command.last_sent < ACK_TIMEOUT:
+                    continue
+                if command.retries >= MAX_RETRIES:
+                    self.pending.remove(command)
+                    command.failed = True
+                    self.lost += 1
+                    given_up.append(command)
+                else:
+                    command.retries += 1
+                    command.last_sent = now
+                    self.resends += 1
+                    resend.append(command)
+        for command in resend:
+            logger.warning(f"No ack for '{command.code}' ({COMMANDS[command.code]}), resending "
+                           f"(attempt {command.retries + 1})", extra={"lane": self.name})
+            try:
+                self._write(command.code)
+            except serial.SerialException as e:
+                logger.error(f"Resend failed: {e}", extra={"lane": self.name})
+        for command in given_up:
+            logger.error(f"Gate never acknowledged '{command.code}' ({COMMANDS[command.code]})",
+                         extra={"lane": self.name})
+            command.acked.set()
+            command.done.set()
+        for command in unfinished:
+            logger.warning(f"Gate never reported '{command.code}' ({COMMANDS[command.code]}) done "
+                           f"within {DONE_TIMEOUT}s of its ack", extra={"lane": self.name})
+            command.done.set()
+
+
+# Cycle the gate and print the latency histograms
+def bench(port, cycles, hold):
+    ser = serial.Serial(port, SERIAL_BAUD, timeout=READ_TIMEOUT)
+    mirror = GateMirror(ser, port).start()
+    if not mirror.wait_ready(6):
+        print(f"[WARNING] No telemetry from {port}")
+    for i in range(cycles):
+        for code in ('1', '0'):
+            command = mirror.send(code)
+            command.wait_done(ACK_TIMEOUT * (MAX_RETRIES + 1) + 2)
+            if command.failed:
+                print(f"[ERROR] Cycle {i + 1}: '{code}' lost after {MAX_RETRIES} resends")
+            time.sleep(hold)
+    state = mirror.snapshot()
+    mirror.close()
+    ser.close()
+    print(f"[BENCH] {cycles} open/close cycles on {port}, {state['resends']} resends, {state['lost']} lost")
+    for code, name in COMMANDS.items():
+        if mirror.ack_latency[code].count:
+            print(f"  {name:<7} ack  {mirror.ack_latency[code].summary()}")
+            print(f"  {name:<7} done {mirror.done_latency[code].summary()}")
+
+
+def monitor(port):
+    ser = serial.Serial(port, SERIAL_BAUD, timeout=READ_TIMEOUT)
+    mirror = GateMirror(ser, port).start()
+    try:
+        while True:
+            state = mirror.snapshot()
+            print(f"[GATE] servo={state['servo']} red={state['red']} blink={state['blink']} "
+                  f"distance={mirror.distance()} pending={state['pending']}")
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        mirror.close()
+        ser.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gate state mirror: live state and actuation latency")
+    parser.add_argument('port')
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.add_parser('monitor', help="print the mirrored gate state every second (default)")
+    bench_parser = subparsers.add_parser('bench', help="cycle the gate and report ack/actuation latency")
+    bench_parser.add_argument('--cycles', type=int, default=20)
+    bench_parser.add_argument('--hold', type=float, default=1.0, help="seconds between commands")
+    args = parser.parse_args()
+
+    if args.command == 'bench':
+        bench(args.port, args.cycles, args.hold)
+    else:
+        monitor(args.port)
+
+
+if __name__ == '__main__':
+    main()
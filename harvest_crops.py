@@ -0,0 +1,293 @@
+import argparse
+import csv
+import hashlib
+import json
+import os
+import re
+import shutil
+import time
+from collections import Counter
+from datetime import datetime
+from multiprocessing import Pool
+
+import cv2
+import psycopg2
+
+from parking_logger import get_logger
+from plate_store import STORE_DIR, PHASH_MAX_DISTANCE, perceptual_hash, hamming_distance, crop_quality
+
+logger = get_logger("harvest_crops")
+
+# Configuration
+DB_CONFIG = {
+    'host': 'localhost',
+    'user': 'postgres',
+    'password': '1234',
+    'dbname': 'parking_system'
+}
+CORPUS_DIR = 'corpus'
+FEATURE_CACHE = 'features.json'
+SESSION_GAP = 90            # seconds without a read before a lane pass is considered over
+MIN_AGREEMENT = 0.6         # share of a pass's reads that must agree with the label
+MIN_PASS_READS = 2          # single-read passes always go to review
+MIN_QUALITY = 50.0          # crops blurrier than this are never used for training
+VAL_RATIO = 0.2             # share of plates held out for YOLO validation
+YOLO_CLASS = 0              # license_plate in license_plate.yaml
+
+# Legacy flat names (RAF687D_20250602_114329.jpg) and evidence-store names
+# (RAF687D_20250602_114329_3fa2c41b9e07.jpg); frames carry a _frame suffix
+CROP_NAME = re.compile(r'^(?P<plate>[A-Z]{2,3}[0-9]{3}[A-Z])_(?P<ts>\d{8}_\d{6})(?:_[0-9a-f]{12})?\.jpg$')
+
+
+# Walk the store lazily so a day's worth of crops never sits in one list
+def iter_crops(root, since=None, until=None):
+    for dirpath, _, filenames in os.walk(root):
+        for filename in filenames:
+            match = CROP_NAME.match(filename)
+            if not match:
+                continue
+            taken = datetime.strptime(match['ts'], '%Y%m%d_%H%M%S')
+            if (since and taken < since) or (until and taken >= until):
+                continue
+            yield os.path.join(dirpath, filename), match['plate'], taken
+
+
+# Worker: decode once, compute hash/quality/size
+def describe_crop(path):
+    img = cv2.imread(path)
+    if img is None or img.size == 0:
+        return path, None
+    return path, {
+        'phash': perceptual_hash(img),
+        'quality': crop_quality(img),
+        'height': img.shape[0],
+        'width': img.shape[1],
+        'mtime': os.path.getmtime(path),
+    }
+
+
+def load_cache(path):
+    if os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)
+    return {}
+
+
+# What the evidence store recorded for each crop: its parking session, the
+# plate the lane voted for and how much of the vote agreed, frame and box
+def load_image_records(conn):
+    cursor = conn.cursor()
+    cursor.execute("SELECT path, parking_log_id, plate_number, agreement, frame_path, box FROM plate_images")
+    records = {os.path.normpath(path): {'session': session, 'plate': plate, 'agreement': agreement,
+                                        'frame_path': frame_path, 'box': box}
+               for path, session, plate, agreement, frame_path, box in cursor.fetchall()}
+    cursor.close()
+    return records
+
+
+# Group reads (of any plate) into lane passes separated by SESSION_GAP; the
+# fallback for crops with no recorded parking session
+def group_passes(samples):
+    samples.sort(key=lambda s: s['taken'])
+    passes, current = [], []
+    for sample in samples:
+        if current and (sample['taken'] - current[-1]['taken']).total_seconds() > SESSION_GAP:
+            passes.append(current)
+            current = []
+        current.append(sample)
+    if current:
+        passes.append(current)
+    return passes
+
+
+# Keep the sharpest crop from each group of near-identical crops
+def dedupe(samples):
+    kept = []
+    for sample in sorted(samples, key=lambda s: -s['quality']):
+        duplicate = next((k for k in kept if hamming_distance(k['phash'], sample['phash']) <= PHASH_MAX_DISTANCE), None)
+        if duplicate:
+            duplicate['duplicates'] += 1
+        else:
+            sample['duplicates'] = 0
+            kept.append(sample)
+    return kept
+
+
+def next_version_dir(corpus_dir):
+    os.makedirs(corpus_dir, exist_ok=True)
+    versions = [int(d[1:]) for d in os.listdir(corpus_dir) if re.fullmatch(r'v\d{4}', d)]
+    return os.path.join(corpus_dir, f"v{max(versions, default=0) + 1:04d}")
+
+
+def link_or_copy(src, dst):
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+# Held-out split by plate, so crops of one car never land on both sides and
+# a plate keeps its split from one corpus version to the next
+def split_for(plate, val_ratio=VAL_RATIO):
+    return 'val' if int(hashlib.sha256(plate.encode()).hexdigest()[:8], 16) < val_ratio * 0x100000000 else 'train'
+
+
+def write_yolo_sample(sample, frame_path, box, out_dir, split, name):
+    frame = cv2.imread(frame_path)
+    if frame is None:
+        return False
+    h, w = frame.shape[:2]
+    x1, y1, x2, y2 = box
+    link_or_copy(frame_path, os.path.join(out_dir, 'images', split, name + '.jpg'))
+    with open(os.path.join(out_dir, 'labels', split, name + '.txt'), 'w') as f:
+        f.write(f"{YOLO_CLASS} {(x1 + x2) / 2 / w:.6f} {(y1 + y2) / 2 / h:.6f} {(x2 - x1) / w:.6f} {(y2 - y1) / h:.6f}\n")
+    return True
+
+
+def harvest(root, corpus_dir, since, until, workers, use_db):
+    start = time.time()
+    cache_path = os.path.join(corpus_dir, FEATURE_CACHE)
+    cache = load_cache(cache_path)
+
+    samples, to_describe = [], []
+    for path, plate, taken in iter_crops(root, since, until):
+        cached = cache.get(path)
+        if cached and cached['mtime'] == os.path.getmtime(path):
+            samples.append(dict(cached, path=path, plate=plate, taken=taken))
+        else:
+            to_describe.append((path, plate, taken))
+
+    meta = {path: (plate, taken) for path, plate, taken in to_describe}
+    with Pool(workers) as pool:
+        for path, features in pool.imap_unordered(describe_crop, meta, chunksize=32):
+            if features is None:
+                continue
+            cache[path] = features
+            plate, taken = meta[path]
+            samples.append(dict(features, path=path, plate=plate, taken=taken))
+    described = len(to_describe)
+
+    records = {}
+    if use_db:
+        conn = psycopg2.connect(**DB_CONFIG)
+        try:
+            records = load_image_records(conn)
+        finally:
+            conn.close()
+
+    version_dir = next_version_dir(corpus_dir)
+    for sub in ('ocr/images', 'yolo/images/train', 'yolo/images/val', 'yolo/labels/train', 'yolo/labels/val'):
+        os.makedirs(os.path.join(version_dir, sub), exist_ok=True)
+
+    # Crops the evidence store filed under a parking session are labelled
+    # with that session's voted plate and judged by the lane's own vote;
+    # anything else falls back to time-gap passes
+    sessions, loose = {}, []
+    for sample in samples:
+        record = records.get(os.path.normpath(sample['path']))
+        if record and record['session'] is not None:
+            sample['plate'] = record['plate']
+            sessions.setdefault(record['session'], []).append((sample, record['agreement']))
+        else:
+            loose.append(sample)
+    groups = []
+    for entries in sessions.values():
+        agreement = entries[0][1]
+        groups.append(([sample for sample, _ in entries], agreement, True))
+    for lane_pass in group_passes(loose):
+        votes = Counter(s['plate'] for s in lane_pass)
+        for plate, count in votes.items():
+            groups.append(([s for s in lane_pass if s['plate'] == plate], count / len(lane_pass),
+                           len(lane_pass) >= MIN_PASS_READS))
+
+    accepted, review, duplicates, yolo_count = [], [], 0, 0
+    for group, agreement, voted in groups:
+        kept = dedupe(group)
+        duplicates += len(group) - len(kept)
+        for sample in kept:
+            reason = None
+            if not voted:
+                reason = 'single read'
+            elif agreement is not None and agreement < MIN_AGREEMENT:
+                reason = f'agreement {agreement:.2f}'
+            elif sample['quality'] < MIN_QUALITY:
+                reason = f"quality {sample['quality']:.0f}"
+            # rows stored before the lane recorded its vote passed that vote
+            sample['agreement'] = 1.0 if agreement is None else agreement
+            (review if reason else accepted).append((sample, reason))
+
+    with open(os.path.join(version_dir, 'ocr', 'labels.tsv'), 'w', newline='') as f:
+        writer = csv.writer(f, delimiter='\t')
+        for index, (sample, _) in enumerate(accepted):
+            name = f"{index:07d}_{sample['plate']}"
+            link_or_copy(sample['path'], os.path.join(version_dir, 'ocr', 'images', name + '.jpg'))
+            writer.writerow([f"images/{name}.jpg", sample['plate'], f"{sample['agreement']:.2f}"])
+            record = records.get(os.path.normpath(sample['path']))
+            if record and record['frame_path'] and record['box'] and \
+                    write_yolo_sample(sample, record['frame_path'], record['box'], os.path.join(version_dir, 'yolo'),
+                                      split_for(sample['plate']), name):
+                yolo_count += 1
+
+    with open(os.path.join(version_dir, 'review.csv'), 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['path', 'plate', 'reason', 'agreement', 'quality'])
+        for sample, reason in review:
+            writer.writerow([sample['path'], sample['plate'], reason, f"{sample['agreement']:.2f}", f"{sample['quality']:.0f}"])
+
+    with open(os.path.join(version_dir, 'data.yaml'), 'w') as f:
+        f.write(f"path: {os.path.abspath(os.path.join(version_dir, 'yolo'))}\ntrain: images/train\nval: images/val\n\n"
+                "names:\n  0: license_plate\n")
+
+    elapsed = time.time() - start
+    summary = {
+        'version': os.path.basename(version_dir),
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'source': root,
+        'since': since.isoformat() if since else None,
+        'until': until.isoformat() if until else None,
+        'crops_seen': len(samples),
+        'crops_decoded': described,
+        'duplicates_dropped': duplicates,
+        'ocr_samples': len(accepted),
+        'yolo_samples': yolo_count,
+        'review_samples': len(review),
+        'seconds': round(elapsed, 2),
+    }
+    with open(os.path.join(version_dir, 'manifest.json'), 'w') as f:
+        json.dump(summary, f, indent=2)
+    tmp_path = cache_path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(cache, f)
+    os.replace(tmp_path, cache_path)
+
+    print(f"[HARVEST] {summary['version']}: {len(samples)} crops ({described} decoded), "
+          f"{duplicates} duplicates dropped, {len(accepted)} OCR / {yolo_count} YOLO samples, "
+          f"{len(review)} for review in {elapsed:.1f}s ({len(samples) / max(elapsed, 1e-6):.0f} crops/s)")
+    logger.info(f"Harvested {summary['version']}", extra={"path": version_dir})
+    return summary
+
+
+def parse_day(value):
+    return datetime.strptime(value, '%Y-%m-%d')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Turn saved lane crops into a versioned training corpus")
+    parser.add_argument('--src', default=STORE_DIR)
+    parser.add_argument('--out', default=CORPUS_DIR)
+    parser.add_argument('--since', type=datetime.fromisoformat, help="only crops taken at or after this time")
+    parser.add_argument('--until', type=datetime.fromisoformat, help="only crops taken before this time")
+    parser.add_argument('--day', type=parse_day, help="shortcut for one day, e.g. 2025-06-02 (nightly job)")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--db', action='store_true', help="read frames/boxes from plate_images for YOLO samples")
+    args = parser.parse_args()
+
+    since, until = args.since, args.until
+    if args.day:
+        since = args.day
+        until = datetime.fromordinal(args.day.toordinal() + 1)
+    harvest(args.src, args.out, since, until, args.workers, args.db)
+
+
+if __name__ == '__main__':
+    main()
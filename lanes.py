@@ -0,0 +1,817 @@
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import psycopg2
+import serial
+import serial.tools.list_ports
+from colorama import Fore, Style
+
+from capture import LatestFrameReader, open_source
+from frame_quality import CropSelector, SELECT_TOP_K, SELECT_WINDOW, score_crop
+from frame_scheduler import AdaptiveScheduler, LATENCY_BUDGET_MS
+from gate_mirror import GateMirror
+from parking_logger import get_logger
+from partitions import SESSION_WINDOW, active_window_start, fetch_session
+from plate_decoder import decode_plate
+from plate_store import PlateSession
+from recent_plates import DUPLICATE_LOG_WINDOW, ENTRY_COOLDOWN, RecentPlates
+
+logger = get_logger("lanes")
+
+# Configuration
+PLATE_PATTERN = r'^[A-Z]{2,3}[0-9]{3}[A-Z]$'
+GATE_OPEN_SECONDS = 15
+DETECTION_DISTANCE = 50
+MIN_ROI_WIDTH = 50
+MIN_ROI_HEIGHT = 20
+VOTE_READINGS = 3
+VOTE_MIN_AGREEMENT = 2
+SERIAL_BAUD = 9600
+BUZZER_TIMEOUT = 3          # the sketch's buzzer sequence takes 1.5 s
+GATE_ACK_TIMEOUT = 3        # covers the mirror's resends
+ARDUINO_PORT_HINTS = ("Arduino", "COM5", "USB-SERIAL")
+
+
+# Custom exception
+class CriticalError(Exception):
+    pass
+
+
+# Log event
+def log_event(plate, event_type, message, conn):
+    try:
+        if not conn or conn.closed:
+            raise CriticalError("Database connection is closed")
+        if len(message) > 255:
+            message = message[:252] + "..."
+        cursor = conn.cursor()
+        cursor.execute(
+            "INSERT INTO logs (plate_number, event_type, event_timestamp, message) VALUES (%s, %s, %s, %s)",
+            (plate or "UNKNOWN", event_type, datetime.now(), message)
+        )
+        conn.commit()
+        cursor.close()
+        logger.info(f"Logged event: {event_type} for {plate or 'UNKNOWN'} - {message}",
+                    extra={"plate": plate, "event": event_type})
+    except psycopg2.Error as e:
+        if conn:
+            conn.rollback()
+        raise CriticalError(f"Failed to log event for {plate or 'UNKNOWN'}: {e}")
+
+
+# Validate plate format
+def is_valid_plate(plate):
+    try:
+        if not plate or not isinstance(plate, str):
+            return False
+        return bool(re.match(PLATE_PATTERN, plate))
+    except Exception as e:
+        raise CriticalError(f"Plate validation error: {e}")
+
+
+# Run a COUNT(*)/EXISTS style query for one plate over its session window
+def _plate_query(conn, plate, sql, what):
+    try:
+        if not is_valid_plate(plate):
+            raise CriticalError(f"Invalid plate format: {plate}")
+        cursor = conn.cursor()
+        row = fetch_session(cursor, sql, (plate,))
+        cursor.close()
+        return row
+    except psycopg2.Error as e:
+        conn.rollback()
+        raise CriticalError(f"Failed to check {what} for {plate}: {e}")
+
+
+# Check active entry
+def has_active_entry(plate, conn):
+    row = _plate_query(conn, plate, "SELECT COUNT(*) FROM parking_logs WHERE plate_number = %s AND (payment_status = FALSE OR (payment_status = TRUE AND exited = FALSE)) AND entry_timestamp >= %s", "active entry")
+    return row[0] > 0
+
+
+# Check unpaid record
+def has_unpaid_record(plate, conn):
+    row = _plate_query(conn, plate, "SELECT COUNT(*) FROM parking_logs WHERE plate_number = %s AND payment_status = FALSE AND entry_timestamp >= %s", "unpaid record")
+    return row[0] > 0
+
+
+# Check payment status
+def is_payment_complete(plate, conn):
+    row = _plate_query(conn, plate, "SELECT payment_status FROM parking_logs WHERE plate_number = %s AND payment_status = TRUE AND exited = FALSE AND entry_timestamp >= %s", "payment status")
+    return row is not None
+
+
+# Check valid record
+def has_valid_record(plate, conn):
+    row = _plate_query(conn, plate, "SELECT COUNT(*) FROM parking_logs WHERE plate_number = %s AND (payment_status = FALSE OR payment_status = TRUE) AND entry_timestamp >= %s", "record")
+    return row[0] > 0
+
+
+# Update exit timestamp
+def update_exit_timestamp(plate, conn):
+    try:
+        if not is_valid_plate(plate):
+            raise CriticalError(f"Invalid plate format: {plate}")
+        cursor = conn.cursor()
+        result = fetch_session(
+            cursor,
+            "SELECT id, entry_timestamp, exited FROM parking_logs WHERE plate_number = %s AND payment_status = TRUE AND exited = FALSE AND entry_timestamp >= %s",
+            (plate,)
+        )
+        if not result:
+            print(f"{Fore.RED}[INFO] No valid paid and non-exited record for {plate}{Style.RESET_ALL}")
+            log_event(plate, "Exit", f"No paid and non-exited record for {plate}", conn)
+            cursor.close()
+            return False
+
+        entry_id, entry_timestamp, exited = result
+        if exited:
+            print(f"{Fore.RED}[INFO] Exit already recorded for {plate} (ID: {entry_id}){Style.RESET_ALL}")
+            log_event(plate, "Exit", f"Exit already recorded for {plate} (ID: {entry_id})", conn)
+            cursor.close()
+            return False
+
+        cursor.execute(
+            "UPDATE parking_logs SET exit_timestamp = %s, exited = TRUE WHERE id = %s AND entry_timestamp = %s",
+            (datetime.now(), entry_id, entry_timestamp)
+        )
+        conn.commit()
+        log_event(plate, "Exit", f"Vehicle {plate} exited (ID: {entry_id})", conn)
+        cursor.close()
+        print(f"{Fore.GREEN}[INFO] Updated exit timestamp for {plate} (ID: {entry_id}){Style.RESET_ALL}")
+        logger.info(f"Updated exit timestamp for {plate} (ID: {entry_id})", extra={"plate": plate})
+        return True
+    except psycopg2.Error as e:
+        conn.rollback()
+        raise CriticalError(f"Failed to update exit timestamp for {plate}: {e}")
+
+
+# Free-listed plates (season tickets) leave without paying: close their
+# open session whatever its payment status. Unpaid rows are marked paid at
+# 0 so has_active_entry lets the plate in again next time.
+def close_free_session(plate, conn):
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            "UPDATE parking_logs SET exited = TRUE, exit_timestamp = %s, "
+            "amount = CASE WHEN payment_status THEN amount ELSE 0 END, payment_status = TRUE "
+            f"WHERE plate_number = %s AND exited = FALSE AND entry_timestamp >= {SESSION_WINDOW} RETURNING id",
+            (datetime.now(), plate, active_window_start(), plate)
+        )
+        closed = [row[0] for row in cursor.fetchall()]
+        conn.commit()
+        cursor.close()
+    except psycopg2.Error as e:
+        conn.rollback()
+        raise CriticalError(f"Failed to close free session for {plate}: {e}")
+    if not closed:
+        return False
+    log_event(plate, "Exit", f"Vehicle {plate} exited free (ID: {', '.join(map(str, closed))})", conn)
+    return True
+
+
+# Detect Arduino port; an explicit port in the lane config wins
+def detect_arduino_port(configured=None):
+    if configured and configured != "auto":
+        return configured
+    try:
+        ports = list(serial.tools.list_ports.comports())
+        print(f"[DEBUG] Available ports: {[port.device + ' (' + port.description + ')' for port in ports]}")
+        logger.debug(f"Available ports: {[port.device + ' (' + port.description + ')' for port in ports]}")
+        for port in ports:
+            if any(hint in port.description for hint in ARDUINO_PORT_HINTS):
+                print(f"{Fore.GREEN}[INFO] Selected Arduino port: {port.device} ({port.description}){Style.RESET_ALL}")
+                return port.device
+        raise CriticalError("COM5 not found for gate control")
+    except CriticalError:
+        raise
+    except Exception as e:
+        raise CriticalError(f"Arduino port detection failed: {e}")
+
+
+# Trigger buzzer and wait for the gate to report the sequence finished
+def trigger_buzzer(gate):
+    try:
+        if gate and gate.is_open:
+            command = gate.send('2')
+            print(f"{Fore.RED}[BUZZER] Buzzer activated{Style.RESET_ALL}")
+            logger.info("Buzzer activated")
+            if not command.wait_done(BUZZER_TIMEOUT) or command.failed:
+                print(f"{Fore.RED}[WARNING] Gate did not confirm buzzer sequence{Style.RESET_ALL}")
+                logger.warning("Gate did not confirm buzzer sequence")
+            print(f"{Fore.RED}[BUZZER] Buzzer deactivated{Style.RESET_ALL}")
+            logger.info("Buzzer deactivated")
+    except serial.SerialException as e:
+        print(f"{Fore.RED}[ERROR] Failed to trigger buzzer: {e}{Style.RESET_ALL}")
+        logger.error(f"Failed to trigger buzzer: {e}")
+
+
+# Resources every lane in the process shares: one detector (inference is
+# serialised behind a lock), one OCR backend, one connection pool. The pool
+# exists up front; the models arrive later via set_models() so lanes can open
+# their cameras and serial ports while torch is still loading.
+class SharedResources:
+    def __init__(self, pool, evidence_store=None, model=None, recognizer=None, exit_auth=None, plate_index=None,
+                 plate_lists=None, occupancy=None):
+        self.pool = pool
+        self.evidence_store = evidence_store
+        self.exit_auth = exit_auth
+        self.plate_index = plate_index
+        self.plate_lists = plate_lists
+        self.occupancy = occupancy
+        self.model_lock = threading.Lock()
+        self.models_ready = threading.Event()
+        self.model = None
+        self.recognizer = None
+        if model is not None:
+            self.set_models(model, recognizer)
+
+    def set_models(self, model, recognizer):
+        self.model = model
+        self.recognizer = recognizer
+        self.models_ready.set()
+
+    def detect(self, frame, imgsz=None):
+        with self.model_lock:
+            if imgsz:
+                return self.model(frame, imgsz=imgsz, verbose=False)
+            return self.model(frame, verbose=False)
+
+
+# One camera + gate. Subclasses decide what a voted plate means.
+class Lane:
+    direction = None
+    window_title = 'Webcam Feed'
+    serial_timeout = 1
+    serial_settle = 2
+    keeps_frames = False
+
+    def __init__(self, config, shared):
+        self.config = config
+        self.shared = shared
+        self.name = config['name']
+        self.roi = config.get('roi')
+        self.logger = get_logger(f"lane.{self.name}")
+        self.stop_event = threading.Event()
+        self.conn = None
+        self.arduino = None
+        self.gate = None
+        self.cap = None
+        self.reader = None
+        self.frame_timestamp = None
+        self.finished = False           # a recorded source played to its end; nothing to restart
+        self.plate_buffer = []
+        self.vote_agreement = None      # share of the buffer behind the last voted plate
+        self.preview = {}
+        self.created = time.perf_counter()
+        self.timings = {}
+        self.first_frame = threading.Event()
+        # Only the sharpest crops of each short window go to OCR; top_k 0 reads every crop
+        self.select_top_k = config.get('select_top_k', SELECT_TOP_K)
+        self.selector = CropSelector(config.get('select_window', SELECT_WINDOW), self.select_top_k) \
+            if self.select_top_k else None
+        # Trades frame rate, detection resolution and OCR candidates for
+        # bounded decision latency when the box is overloaded
+        self.scheduler = AdaptiveScheduler(self.name, config.get('latency_budget_ms', LATENCY_BUDGET_MS))
+        self.ocr_seconds = 0.0
+
+    def echo(self, color, tag, message):
+        print(f"{color}[{self.name}] [{tag}] {message}{Style.RESET_ALL}")
+
+    def stop(self):
+        self.stop_event.set()
+
+    # Acquire DB connection, serial port and camera side by side; failures
+    # propagate to the supervisor, which retries with backoff
+    def open(self):
+        with ThreadPoolExecutor(max_workers=3, thread_name_prefix=f"open-{self.name}") as executor:
+            futures = {step: executor.submit(self._timed, step, getattr(self, f"_open_{step}"))
+                       for step in ('db', 'serial', 'camera')}
+        errors = [f.exception() for f in futures.values() if f.exception()]
+        if errors:
+            if self.conn and not self.conn.closed:
+                log_event(None, "Error", f"Lane {self.name}: {errors[0]}", self.conn)
+            if self.arduino and self.cap is not None and not self.cap.isOpened():
+                trigger_buzzer(self.gate)
+            raise errors[0]
+
+    def _timed(self, step, func):
+        start = time.perf_counter()
+        func()
+        self.timings[step] = time.perf_counter() - start
+
+    def _open_db(self):
+        try:
+            self.conn = self.shared.pool.getconn()
+        except psycopg2.Error as e:
+            raise CriticalError(f"Database connection failed: {e}")
+        self.echo(Fore.GREEN, "INFO", "Database connected")
+
+    def _open_serial(self):
+        try:
+            arduino_port = detect_arduino_port(self.config.get('serial_port', 'auto'))
+            self.echo(Fore.GREEN, "CONNECTED", f"Arduino on {arduino_port}")
+            self.logger.info(f"Connected to Arduino on {arduino_port}", extra={"lane": self.name, "port": arduino_port})
+            self.arduino = serial.Serial(arduino_port, SERIAL_BAUD,
+                                         timeout=self.config.get('serial_timeout', self.serial_timeout))
+        except (CriticalError, serial.SerialException) as e:
+            raise CriticalError(f"Failed to connect to Arduino: {e}")
+        self.gate = GateMirror(self.arduino, self.name).start()
+        settle = self.config.get('serial_settle', self.serial_settle)
+        if not self.gate.wait_ready(settle):
+            self.echo(Fore.RED, "WARNING", f"No ready line from Arduino within {settle}s, continuing")
+            self.logger.warning(f"No ready line from Arduino within {settle}s", extra={"lane": self.name})
+
+    def _open_camera(self):
+        camera = self.config.get('camera', 0)
+        try:
+            self.cap = open_source(camera, self.config.get('capture'))
+        except (TypeError, ValueError, OSError) as e:
+            raise CriticalError(f"Cannot open camera {camera}: {e}")
+        if not self.cap.isOpened():
+            raise CriticalError(f"Cannot open camera {camera}")
+        # Live sources are drained on their own thread so the lane always
+        # works on the newest frame instead of a backlog; a frame bus
+        # already hands out only its newest frame
+        if self.cap.live and not self.cap.latest_only:
+            self.reader = LatestFrameReader(self.cap).start()
+
+    def close(self):
+        if self.reader:
+            self.reader.close()
+            self.reader = None
+        if self.cap:
+            self.cap.release()
+            self.cap = None
+        self.reader = None
+        self.frame_timestamp = None
+        if self.gate:
+            self.gate.close()
+            self.gate = None
+        if self.arduino and self.arduino.is_open:
+            try:
+                self.arduino.close()
+                self.echo(Fore.GREEN, "CLEANUP", "Serial port closed")
+                self.logger.info("Serial port closed", extra={"lane": self.name})
+            except serial.SerialException as e:
+                self.echo(Fore.RED, "ERROR", f"Failed to close Arduino connection: {e}")
+        if self.conn:
+            if self.conn.closed:
+                self.shared.pool.putconn(self.conn, close=True)
+            else:
+                self.conn.rollback()
+                self.shared.pool.putconn(self.conn)
+            self.conn = None
+
+    def run(self):
+        try:
+            self.open()
+            self.echo(Fore.GREEN, "SYSTEM", f"{self.direction.capitalize()} lane ready")
+            self.logger.info(f"{self.direction.capitalize()} lane started", extra={"lane": self.name})
+            while not self.shared.models_ready.wait(0.5):
+                if self.stop_event.is_set():
+                    return
+            while not self.stop_event.is_set():
+                try:
+                    self.step()
+                    if not self.first_frame.is_set() and not self.finished:
+                        self.report_startup()
+                except CriticalError as e:
+                    self.echo(Fore.RED, "ERROR", str(e))
+                    log_event(None, "Error", str(e), self.conn)
+                    trigger_buzzer(self.gate)
+                except psycopg2.InterfaceError:
+                    raise
+                except Exception as e:
+                    self.echo(Fore.RED, "ERROR", f"Unexpected error: {type(e).__name__}: {str(e)}")
+                    log_event(None, "Error", f"Unexpected error: {type(e).__name__}: {str(e)}", self.conn)
+                    trigger_buzzer(self.gate)
+        finally:
+            self.close()
+
+    # Time from lane creation until it could act on a car, with what each
+    # open step took so a regression is easy to pin down
+    def report_startup(self):
+        self.first_frame.set()
+        elapsed = time.perf_counter() - self.created
+        steps = ", ".join(f"{step} {seconds:.2f}s" for step, seconds in sorted(self.timings.items()))
+        self.echo(Fore.GREEN, "STARTUP", f"Ready for first decision in {elapsed:.2f}s ({steps})")
+        self.logger.info(f"Ready for first decision in {elapsed:.2f}s ({steps})",
+                         extra={"lane": self.name, "latency_ms": round(elapsed * 1000)})
+
+    # Current frame, or None once a recorded source has run out; that ends
+    # the lane cleanly rather than as a capture failure
+    def read_frame(self):
+        frame = self.reader.read() if self.reader else self.cap.read()
+        if frame is None and not self.cap.live and not self.cap.isOpened():
+            self.echo(Fore.GREEN, "INFO", "End of recorded source, stopping lane")
+            self.logger.info("End of recorded source", extra={"lane": self.name})
+            self.finished = True
+            self.stop()
+            return None
+        if frame is None or frame.image.size == 0:
+            raise CriticalError("Failed to capture valid frame")
+        # A recording's timestamps say when it was filmed (or when an image
+        # file was written), not how long the frame waited, so its age is
+        # measured from when the lane got it
+        self.frame_timestamp = frame.timestamp if self.cap.live else time.time()
+        return frame.image
+
+    # Region of interest from the lane config, plus its offset in the frame
+    def crop_roi(self, frame):
+        if not self.roi:
+            return frame, 0, 0
+        x1, y1, x2, y2 = self.roi
+        return frame[y1:y2, x1:x2], x1, y1
+
+    def step(self):
+        frame = self.read_frame()
+        if frame is None:
+            return
+        now = time.time()
+        distance = self.gate.distance()
+        if distance is None:
+            # No telemetry (older sketch or sensor unplugged): don't gate on it
+            distance = 0
+        else:
+            print(f"[{self.name}] [SENSOR] Distance: {distance} cm")
+        annotated_frame = frame
+
+        selected = []
+        started = None
+        settings = self.scheduler.settings
+        if self.selector is not None:
+            self.selector.top_k = min(settings['top_k'], self.select_top_k)
+        if distance <= DETECTION_DISTANCE and self.scheduler.should_process():
+            started = time.time()
+            region, off_x, off_y = self.crop_roi(frame)
+            results = self.shared.detect(region, settings['imgsz'])
+            for result in results:
+                for box in result.boxes:
+                    x1, y1, x2, y2 = map(int, box.xyxy[0])
+                    x1, x2, y1, y2 = x1 + off_x, x2 + off_x, y1 + off_y, y2 + off_y
+                    if x2 <= x1 or y2 <= y1 or (x2 - x1) < MIN_ROI_WIDTH or (y2 - y1) < MIN_ROI_HEIGHT:
+                        self.echo(Fore.RED, "WARNING", "Invalid ROI, skipping")
+                        continue
+
+                    plate_img = frame[y1:y2, x1:x2]
+                    if plate_img.size == 0:
+                        raise CriticalError("Empty plate image")
+                    if self.selector is None:
+                        selected.append((plate_img, frame, (x1, y1, x2, y2)))
+                        continue
+                    # Capture buffers are reused, so anything held across frames is copied
+                    score = score_crop(plate_img, float(box.conf[0]))
+                    held_frame = frame.copy() if self.keeps_frames else None
+                    selected += self.selector.offer(score, (plate_img.copy(), held_frame, (x1, y1, x2, y2)), now)
+            if results:
+                annotated_frame = results[0].plot()
+            detect_seconds = time.time() - started
+        elif distance > DETECTION_DISTANCE:
+            self.scheduler.idle(now)
+        if self.selector is not None:
+            selected += self.selector.poll(now)
+
+        self.ocr_seconds = 0.0
+        for plate_img, plate_frame, plate_box in selected:
+            self.read_crop(plate_img, plate_frame, plate_box)
+        if started is not None:
+            # Gate cycles inside handle_plate are not load, so only detection
+            # and OCR count as work
+            self.scheduler.record(max(0.0, started - self.frame_timestamp) * 1000,
+                                  (detect_seconds + self.ocr_seconds) * 1000)
+        self.preview[self.window_title] = annotated_frame
+
+    def read_crop(self, plate_img, frame, box):
+        ocr_start = time.perf_counter()
+        reading = self.shared.recognizer.read(plate_img)
+        self.ocr_seconds += time.perf_counter() - ocr_start
+        self.preview['Plate'] = plate_img
+        self.preview['Processed'] = reading.processed
+
+        decoded = decode_plate(reading)
+        if not decoded:
+            return
+        plate_candidate = decoded.text
+        if decoded.substitutions or decoded.skipped:
+            self.logger.debug(f"Decoded {reading.text!r} as {plate_candidate} ({decoded.confidence:.2f})",
+                              extra={"plate": plate_candidate, "lane": self.name})
+        if is_valid_plate(plate_candidate):
+            self.echo(Fore.GREEN, "VALID", f"Plate Detected: {plate_candidate}")
+            self.logger.debug(f"Valid plate detected: {plate_candidate}",
+                              extra={"plate": plate_candidate, "lane": self.name})
+            self.handle_plate(plate_candidate, plate_img, frame, box)
+
+    # Majority of the last readings, or None while still collecting
+    def voted_plate(self):
+        if len(self.plate_buffer) < VOTE_READINGS:
+            return None
+        plate, count = Counter(self.plate_buffer).most_common(1)[0]
+        if count < VOTE_MIN_AGREEMENT:
+            self.echo(Fore.RED, "SKIPPED", "Not enough consistent readings")
+            return None
+        self.vote_agreement = count / len(self.plate_buffer)
+        return plate
+
+    # Send a gate command and wait until the sketch has acknowledged it
+    def command_gate(self, code, action, plate):
+        command = self.gate.send(code)
+        self.echo(Fore.GREEN, "GATE", f"{action} gate (sent '{code}')")
+        if not command.wait_ack(GATE_ACK_TIMEOUT) or command.failed:
+            raise CriticalError(f"Gate did not acknowledge '{code}' ({action.lower()})")
+        latency_ms = round((time.perf_counter() - command.sent_at) * 1000)
+        self.logger.info(f"{action} gate (sent '{code}', acked in {latency_ms} ms)",
+                         extra={"plate": plate, "lane": self.name, "latency_ms": latency_ms})
+
+    def cycle_gate(self, plate):
+        try:
+            self.command_gate('1', "Opening", plate)
+            self.stop_event.wait(GATE_OPEN_SECONDS)
+            self.command_gate('0', "Closing", plate)
+        except serial.SerialException as e:
+            raise CriticalError(f"Arduino communication failed: {e}")
+
+    # Whitelist / blacklist / season-ticket entry for a plate, if any
+    def listed(self, plate):
+        if self.shared.plate_lists is None:
+            return None
+        return self.shared.plate_lists.lookup(plate)
+
+    # A deny-listed plate keeps the gate shut once the vote confirms the read
+    def deny_listed(self, plate, match, event_type):
+        self.plate_buffer.append(plate)
+        if self.voted_plate() != plate:
+            return
+        self.plate_buffer.clear()
+        self.echo(Fore.RED, "DENIED", f"{plate} is on deny list {match.list_name}")
+        log_event(plate, event_type, f"Denied {plate}: on list {match.list_name}", self.conn)
+        trigger_buzzer(self.gate)
+
+    def alert_listed(self, plate, match, event_type):
+        self.echo(Fore.RED, "ALERT", f"{plate} is on alert list {match.list_name}")
+        self.logger.warning(f"Alert-listed plate {plate} ({match.list_name}) at {self.direction}",
+                            extra={"plate": plate, "lane": self.name})
+        log_event(plate, event_type, f"ALERT: {plate} on list {match.list_name}", self.conn)
+
+    # Lot occupancy lives in the local store; if it breaks, lanes admit as
+    # they did before there was a capacity
+    def take_space(self, plate):
+        if not self.shared.occupancy:
+            return True
+        try:
+            return self.shared.occupancy.admit()
+        except sqlite3.Error as e:
+            self.logger.warning(f"Occupancy update failed: {e}", extra={"plate": plate, "lane": self.name})
+            return True
+
+    # An exit is about to close its session in the database
+    def begin_exit(self, plate):
+        if not self.shared.occupancy:
+            return
+        try:
+            self.shared.occupancy.begin()
+        except sqlite3.Error as e:
+            self.logger.warning(f"Occupancy update failed: {e}", extra={"plate": plate, "lane": self.name})
+
+    # The database side of take_space()/begin_exit() is done; freed gives the
+    # space back
+    def settle_space(self, plate, freed=False):
+        if not self.shared.occupancy:
+            return
+        try:
+            self.shared.occupancy.settle(freed)
+        except sqlite3.Error as e:
+            self.logger.warning(f"Occupancy update failed: {e}", extra={"plate": plate, "lane": self.name})
+
+    def handle_plate(self, plate_candidate, plate_img, frame, box):
+        raise NotImplementedError
+
+
+class EntryLane(Lane):
+    direction = 'entry'
+    window_title = 'Webcam Feed'
+    keeps_frames = True     # full frame goes to the evidence store
+
+    def __init__(self, config, shared):
+        super().__init__(config, shared)
+        self.plate_session = PlateSession()
+        self.recent = RecentPlates(config.get('entry_cooldown', ENTRY_COOLDOWN),
+                                   config.get('duplicate_log_window', DUPLICATE_LOG_WINDOW))
+
+    def step(self):
+        super().step()
+        self.log_duplicates(self.recent.due())
+
+    def close(self):
+        if self.conn and not self.conn.closed:
+            self.log_duplicates(self.recent.drain())
+        super().close()
+
+    # One counted row per plate and window instead of one per read
+    def log_duplicates(self, closed):
+        for plate, count, reason in closed:
+            log_event(plate, "Entry", f"{count} duplicate entry attempt(s) for {plate} ({reason})", self.conn)
+
+    def handle_plate(self, plate_candidate, plate_img, frame, box):
+        conn = self.conn
+        match = self.listed(plate_candidate)
+        if match and match.policy == 'deny':
+            self.deny_listed(plate_candidate, match, "Entry")
+            return
+        # Admitted a moment ago: no need to ask the database again
+        if self.recent.seen(plate_candidate):
+            self.echo(Fore.RED, "SKIPPED", f"{plate_candidate} entered within cooldown period")
+            self.recent.duplicate(plate_candidate, "within cooldown")
+            return
+        if has_active_entry(plate_candidate, conn):
+            self.echo(Fore.RED, "DENIED", f"Plate {plate_candidate} has active entry")
+            self.recent.duplicate(plate_candidate, "active entry")
+            trigger_buzzer(self.gate)
+            return
+
+        self.plate_buffer.append(plate_candidate)
+        self.plate_session.offer(plate_candidate, plate_img, frame, box)
+
+        plate = self.voted_plate()
+        if not plate:
+            return
+
+        if not self.recent.seen(plate):
+            if not self.take_space(plate):
+                self.echo(Fore.RED, "LOT FULL", f"No free space for {plate}")
+                self.recent.duplicate(plate, "lot full")
+                trigger_buzzer(self.gate)
+                self.plate_buffer.clear()
+                self.plate_session.clear()
+                return
+            try:
+                cursor = conn.cursor()
+                cursor.execute(
+                    "INSERT INTO parking_logs (plate_number, payment_status, entry_timestamp, exited) VALUES (%s, %s, %s, %s) RETURNING id",
+                    (plate, False, datetime.now(), False)
+                )
+                entry_id = cursor.fetchone()[0]
+                conn.commit()
+                cursor.close()
+            except psycopg2.Error:
+                self.settle_space(plate, freed=True)
+                raise
+            self.settle_space(plate)
+            evidence_store = self.shared.evidence_store
+            if evidence_store and evidence_store.submit(entry_id, plate, self.plate_session.pop(plate),
+                                                        self.vote_agreement):
+                self.echo(Fore.GREEN, "IMAGE QUEUED", f"Best crop for {plate} (ID: {entry_id})")
+            log_event(plate, "Entry", f"Vehicle {plate} entered", conn)
+            match = self.listed(plate)
+            if match and match.policy == 'alert':
+                self.alert_listed(plate, match, "Entry")
+            if self.shared.plate_index is not None:
+                self.shared.plate_index.add(plate)
+            self.echo(Fore.GREEN, "SAVED", f"{plate} logged to database")
+
+            self.recent.admit(plate)
+            self.cycle_gate(plate)
+        else:
+            self.echo(Fore.RED, "SKIPPED", "Duplicate within cooldown period")
+            self.recent.duplicate(plate, "within cooldown")
+        self.plate_buffer.clear()
+        self.plate_session.clear()
+
+
+class ExitLane(Lane):
+    direction = 'exit'
+    window_title = 'Exit Webcam Feed'
+    serial_timeout = 3
+    serial_settle = 5
+
+    # Exit authorisation published by the payment path, if any; a broken
+    # local store only costs the fast path
+    def preauthorized(self, plate):
+        if not self.shared.exit_auth:
+            return None
+        try:
+            return self.shared.exit_auth.lookup(plate)
+        except sqlite3.Error as e:
+            self.logger.warning(f"Exit authorisation lookup failed: {e}", extra={"plate": plate, "lane": self.name})
+            return None
+
+    # Voted plate -> open/deny, logged so the local and database paths can be compared
+    def log_decision(self, plate, started, source, granted):
+        latency_ms = round((time.perf_counter() - started) * 1000, 2)
+        self.echo(Fore.GREEN if granted else Fore.RED, "DECISION",
+                  f"{'Open' if granted else 'Deny'} for {plate} in {latency_ms} ms ({source})")
+        self.logger.info(f"Exit decision for {plate}: {'open' if granted else 'deny'} in {latency_ms} ms ({source})",
+                         extra={"plate": plate, "lane": self.name, "latency_ms": latency_ms})
+
+    # Close the session with close(plate, conn) as one in-flight step of the
+    # occupancy counter; True when a session was closed
+    def close_session(self, plate, close):
+        self.begin_exit(plate)
+        closed = False
+        try:
+            closed = close(plate, self.conn)
+        finally:
+            self.settle_space(plate, freed=closed)
+        return closed
+
+    # Only once the session is closed: if the update found nothing or
+    # failed, the authorisation and the index entry still describe a car
+    # that is inside and may try the gate again
+    def forget_session(self, plate):
+        if self.shared.exit_auth:
+            self.shared.exit_auth.revoke(plate)
+        if self.shared.plate_index is not None:
+            self.shared.plate_index.remove(plate)
+
+    def record_exit(self, plate):
+        if self.close_session(plate, update_exit_timestamp):
+            self.forget_session(plate)
+            self.echo(Fore.GREEN, "EXIT", f"Exit recorded for {plate}")
+            log_event(plate, "Exit", "Gate closed and exit recorded", self.conn)
+
+    def record_free_exit(self, plate):
+        if self.close_session(plate, close_free_session):
+            self.forget_session(plate)
+            self.echo(Fore.GREEN, "EXIT", f"Free exit recorded for {plate}")
+
+    # A read one or two confusable characters off an open session resolves
+    # to that session when the match is unique, instead of a buzzer cycle
+    def resolve_plate(self, plate_candidate):
+        index = self.shared.plate_index
+        if index is None or plate_candidate in index:
+            return plate_candidate
+        match = index.resolve(plate_candidate)
+        if match and is_valid_plate(match):
+            self.echo(Fore.GREEN, "MATCHED", f"Read {plate_candidate} resolved to open session {match}")
+            self.logger.info(f"Read {plate_candidate} resolved to open session {match}",
+                             extra={"plate": match, "lane": self.name})
+            return match
+        return plate_candidate
+
+    def handle_plate(self, plate_candidate, plate_img, frame, box):
+        conn = self.conn
+        plate_candidate = self.resolve_plate(plate_candidate)
+        match = self.listed(plate_candidate)
+        if match and match.policy == 'deny':
+            self.deny_listed(plate_candidate, match, "Unauthorized Exit Attempt")
+            return
+        free = match is not None and match.policy == 'free'
+        if not free and not self.preauthorized(plate_candidate) and not has_valid_record(plate_candidate, conn):
+            self.echo(Fore.RED, "DENIED", f"No active entry or paid record for {plate_candidate}")
+            log_event(plate_candidate, "Unauthorized Exit Attempt", f"No record for {plate_candidate}", conn)
+            trigger_buzzer(self.gate)
+            return
+
+        self.plate_buffer.append(plate_candidate)
+        plate = self.voted_plate()
+        if not plate:
+            return
+        self.plate_buffer.clear()
+
+        started = time.perf_counter()
+        match = self.listed(plate)
+        if match and match.policy == 'alert':
+            self.alert_listed(plate, match, "Exit")
+        if match and match.policy == 'free':
+            self.log_decision(plate, started, f"list {match.list_name}", True)
+            self.echo(Fore.GREEN, "GRANTED", f"{plate} exits free on list {match.list_name}")
+            self.cycle_gate(plate)
+            self.record_free_exit(plate)
+            return
+
+        authorization = self.preauthorized(plate)
+        if authorization:
+            self.log_decision(plate, started, "pre-authorised", True)
+            self.echo(Fore.GREEN, "GRANTED", f"Paid exit authorised for {plate} (ID: {authorization.parking_log_id})")
+            self.cycle_gate(plate)
+            self.record_exit(plate)
+            return
+
+        if has_unpaid_record(plate, conn):
+            self.log_decision(plate, started, "database", False)
+            self.echo(Fore.RED, "DENIED", f"Unpaid record found for {plate}")
+            log_event(plate, "Unauthorized Exit Attempt", f"Unpaid record for {plate}", conn)
+            trigger_buzzer(self.gate)
+            return
+
+        if is_payment_complete(plate, conn):
+            self.log_decision(plate, started, "database", True)
+            self.echo(Fore.GREEN, "GRANTED", f"Payment complete for {plate}")
+            self.cycle_gate(plate)
+            self.record_exit(plate)
+        else:
+            self.log_decision(plate, started, "database", False)
+            self.echo(Fore.RED, "DENIED", f"No paid and non-exited record for {plate}")
+            log_event(plate, "Unauthorized Exit Attempt", f"No paid and non-exited record for {plate}", conn)
+            trigger_buzzer(self.gate)
+
+
+LANE_TYPES = {
+    'entry': EntryLane,
+    'exit': ExitLane,
+}
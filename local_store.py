@@ -0,0 +1,319 @@
+import argparse
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+from parking_logger import get_logger
+
+logger = get_logger("local_store")
+
+# Configuration
+LOCAL_STORE = os.environ.get('PARKING_LOCAL_STORE', 'parking_local.db')
+EXIT_GRACE_MINUTES = int(os.environ.get('PARKING_EXIT_GRACE_MINUTES', '15'))
+PARKING_CAPACITY = int(os.environ.get('PARKING_CAPACITY', '0'))    # 0: no limit
+BUSY_TIMEOUT = 5            # seconds a writer waits on a locked database
+PENDING_TIMEOUT = 60        # an entry/exit still in flight after this long died with its lane
+
+_exit_authorizations = None
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS exit_authorization (
+    plate_number TEXT PRIMARY KEY,
+    parking_log_id INTEGER NOT NULL,
+    entry_timestamp TEXT NOT NULL,
+    paid_at REAL NOT NULL,
+    authorized_until REAL NOT NULL
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS occupancy (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    occupied INTEGER NOT NULL,
+    capacity INTEGER NOT NULL,
+    version INTEGER NOT NULL,
+    updated_at REAL NOT NULL,
+    reconciled_at REAL,
+    pending INTEGER NOT NULL DEFAULT 0,
+    pending_at REAL
+);
+"""
+
+
+# Open the site-local SQLite file in WAL mode so the payment process can
+# write while lanes read without blocking each other
+def connect(path=LOCAL_STORE):
+    conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT, isolation_level=None, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+class ExitAuthorization:
+    def __init__(self, plate, parking_log_id, entry_timestamp, paid_at, authorized_until):
+        self.plate = plate
+        self.parking_log_id = parking_log_id
+        self.entry_timestamp = entry_timestamp
+        self.paid_at = paid_at
+        self.authorized_until = authorized_until
+
+    def __repr__(self):
+        return f"ExitAuthorization({self.plate!r}, id={self.parking_log_id}, until={self.authorized_until:.0f})"
+
+
+# One SQLite connection per thread; the file is shared between processes
+# on the site machine
+class LocalTable:
+    def __init__(self, path=LOCAL_STORE):
+        self.path = path
+        self.local = threading.local()
+        self._conn()
+
+    def _conn(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = self.local.conn = connect(self.path)
+        return conn
+
+    def close(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self.local.conn = None
+
+
+# "Plate X may leave until T", written by the payment path and checked by
+# the exit lane with a single primary-key lookup
+class ExitAuthorizations(LocalTable):
+    def __init__(self, path=LOCAL_STORE, grace_minutes=EXIT_GRACE_MINUTES):
+        self.grace_seconds = grace_minutes * 60
+        super().__init__(path)
+
+    def authorize(self, plate, parking_log_id, entry_timestamp, paid_at=None):
+        paid_at = paid_at or time.time()
+        self._conn().execute(
+            "INSERT OR REPLACE INTO exit_authorization VALUES (?, ?, ?, ?, ?)",
+            (plate, parking_log_id, entry_timestamp.isoformat(), paid_at, paid_at + self.grace_seconds)
+        )
+        logger.info(f"Exit authorised for {plate} (ID: {parking_log_id}) for {self.grace_seconds // 60} min",
+                    extra={"plate": plate, "event": "Payment"})
+
+    # Unexpired authorisation for a plate, or None
+    def lookup(self, plate, now=None):
+        row = self._conn().execute(
+            "SELECT parking_log_id, entry_timestamp, paid_at, authorized_until FROM exit_authorization "
+            "WHERE plate_number = ?", (plate,)
+        ).fetchone()
+        if not row or row[3] < (now or time.time()):
+            return None
+        return ExitAuthorization(plate, row[0], datetime.fromisoformat(row[1]), row[2], row[3])
+
+    def revoke(self, plate):
+        self._conn().execute("DELETE FROM exit_authorization WHERE plate_number = ?", (plate,))
+
+    def purge_expired(self, now=None):
+        cursor = self._conn().execute("DELETE FROM exit_authorization WHERE authorized_until < ?",
+                                      (now or time.time(),))
+        return cursor.rowcount
+
+
+# For the payment scripts: let the exit lane open for this plate without
+# asking Postgres. The payment is already committed, so a failure here only
+# costs the exit lane its fast path. One store per process, so each payment
+# doesn't open (and leak) another SQLite connection.
+def publish_exit_authorization(plate, entry_id, entry_time):
+    global _exit_authorizations
+    try:
+        if _exit_authorizations is None:
+            _exit_authorizations = ExitAuthorizations()
+        _exit_authorizations.authorize(plate, entry_id, entry_time)
+    except Exception as e:
+        print(f"[WARNING] Could not publish exit authorisation for {plate}: {e}")
+        logger.warning(f"Could not publish exit authorisation: {e}", extra={"plate": plate})
+
+
+# Cars in the lot, kept as a single row every lane process updates on entry
+# and exit, so admission and the dashboard never count parking_logs. Each
+# change is one conditional UPDATE, which SQLite serialises across
+# processes; a full lot is simply an UPDATE that matches nothing. The
+# orchestrator periodically overwrites the count with the database's. An
+# entry or exit is in flight (pending) from the moment the counter moves until
+# its parking_logs change has committed; a reconcile is skipped while any is,
+# or when a lane moved the counter while the database was being counted.
+class Occupancy(LocalTable):
+    def __init__(self, path=LOCAL_STORE, capacity=None):
+        super().__init__(path)
+        conn = self._conn()
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(occupancy)")}
+        if 'pending' not in columns:
+            conn.execute("ALTER TABLE occupancy ADD COLUMN pending INTEGER NOT NULL DEFAULT 0")
+            conn.execute("ALTER TABLE occupancy ADD COLUMN pending_at REAL")
+        conn.execute(
+            "INSERT OR IGNORE INTO occupancy (id, occupied, capacity, version, updated_at) VALUES (1, 0, ?, 0, ?)",
+            (PARKING_CAPACITY if capacity is None else capacity, time.time())
+        )
+        if capacity is not None:
+            self.set_capacity(capacity)
+
+    # Take a space for an entry about to be inserted; False when the lot is
+    # full. The entry is pending until settle().
+    def admit(self, now=None):
+        now = now or time.time()
+        cursor = self._conn().execute(
+            "UPDATE occupancy SET occupied = occupied + 1, pending = pending + 1, pending_at = ?, "
+            "version = version + 1, updated_at = ? WHERE id = 1 AND (capacity <= 0 OR occupied < capacity)",
+            (now, now)
+        )
+        return cursor.rowcount == 1
+
+    # An exit is about to close its session; pending until settle()
+    def begin(self, now=None):
+        now = now or time.time()
+        self._conn().execute(
+            "UPDATE occupancy SET pending = pending + 1, pending_at = ?, version = version + 1, updated_at = ? "
+            "WHERE id = 1", (now, now)
+        )
+
+    # The database change behind admit()/begin() committed or failed; freed
+    # gives a space back (an exit that closed its session, or an entry whose
+    # insert failed)
+    def settle(self, freed=False, now=None):
+        self._conn().execute(
+            "UPDATE occupancy SET occupied = MAX(occupied - ?, 0), pending = MAX(pending - 1, 0), "
+            "version = version + 1, updated_at = ? WHERE id = 1", (int(freed), now or time.time())
+        )
+
+    def set_capacity(self, capacity):
+        self._conn().execute("UPDATE occupancy SET capacity = ? WHERE id = 1", (capacity,))
+
+    def snapshot(self):
+        occupied, capacity, version, updated_at, reconciled_at, pending, pending_at = self._conn().execute(
+            "SELECT occupied, capacity, version, updated_at, reconciled_at, pending, pending_at "
+            "FROM occupancy WHERE id = 1"
+        ).fetchone()
+        return {'occupied': occupied, 'capacity': capacity,
+                'free': max(capacity - occupied, 0) if capacity > 0 else None,
+                'full': 0 < capacity <= occupied, 'version': version,
+                'updated_at': updated_at, 'reconciled_at': reconciled_at,
+                'pending': pending, 'pending_at': pending_at}
+
+    # Replace the counter with count_open(), the open sessions in the
+    # database. Returns the drift corrected, or None when an entry or exit
+    # was in flight or a lane moved the counter meanwhile, since the count
+    # may not match the counter. Work still pending after PENDING_TIMEOUT
+    # belonged to a lane that died and no longer holds the reconcile off.
+    def reconcile(self, count_open, now=None):
+        now = now or time.time()
+        before = self.snapshot()
+        if before['pending'] and now - (before['pending_at'] or 0) < PENDING_TIMEOUT:
+            return None
+        count = count_open()
+        cursor = self._conn().execute(
+            "UPDATE occupancy SET occupied = ?, pending = 0, updated_at = ?, reconciled_at = ? "
+            "WHERE id = 1 AND version = ?",
+            (count, now, now, before['version'])
+        )
+        if cursor.rowcount != 1:
+            return None
+        drift = count - before['occupied']
+        if drift:
+            logger.warning(f"Occupancy drifted by {drift:+d}, reset to {count}")
+        return drift
+
+
+# ---------------------------------------------------------------------------
+# Lookup benchmark: local store vs the exit lane's Postgres checks
+# ---------------------------------------------------------------------------
+
+def bench(plates, lookups, db):
+    import random
+    import statistics
+    import tempfile
+
+    auths = ExitAuthorizations(os.path.join(tempfile.mkdtemp(), 'bench.db'))
+    names = [f"RA{chr(65 + i % 26)}{i % 1000:03d}{chr(65 + (i // 1000) % 26)}" for i in range(plates)]
+    start = time.perf_counter()
+    conn = auths._conn()
+    now = time.time()
+    conn.execute("BEGIN")
+    conn.executemany("INSERT OR REPLACE INTO exit_authorization VALUES (?, ?, ?, ?, ?)",
+                     [(plate, i, datetime.now().isoformat(), now, now + auths.grace_seconds)
+                      for i, plate in enumerate(names)])
+    conn.execute("COMMIT")
+    print(f"[BENCH] Wrote {plates} authorisations in {time.perf_counter() - start:.2f}s")
+
+    sample = [random.choice(names) for _ in range(lookups)]
+    timings = []
+    for plate in sample:
+        t = time.perf_counter()
+        auths.lookup(plate)
+        timings.append((time.perf_counter() - t) * 1e6)
+    timings.sort()
+    print(f"[BENCH] local lookup: p50 {statistics.median(timings):.1f} us, "
+          f"p99 {timings[int(len(timings) * 0.99)]:.1f} us")
+
+    if db:
+        import psycopg2
+        from lanes import has_valid_record, has_unpaid_record, is_payment_complete
+        from orchestrator import DB_CONFIG
+
+        pg = psycopg2.connect(**DB_CONFIG)
+        timings = []
+        for plate in sample[:min(lookups, 1000)]:
+            t = time.perf_counter()
+            has_valid_record(plate, pg)
+            has_unpaid_record(plate, pg)
+            is_payment_complete(plate, pg)
+            timings.append((time.perf_counter() - t) * 1e6)
+        pg.close()
+        timings.sort()
+        print(f"[BENCH] postgres checks: p50 {statistics.median(timings):.1f} us, "
+              f"p99 {timings[int(len(timings) * 0.99)]:.1f} us")
+    auths.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Site-local exit authorisation and occupancy store")
+    parser.add_argument('--path', default=LOCAL_STORE)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    show = subparsers.add_parser('show', help="list unexpired exit authorisations")
+    show.add_argument('--plate')
+    subparsers.add_parser('purge', help="delete expired authorisations")
+    occupancy = subparsers.add_parser('occupancy', help="show the lot counter, or set its capacity")
+    occupancy.add_argument('--capacity', type=int, help="spaces in the lot, 0 for no limit")
+    bench_parser = subparsers.add_parser('bench', help="time lookups in a scratch store (and the Postgres path with --db)")
+    bench_parser.add_argument('--plates', type=int, default=10000)
+    bench_parser.add_argument('--lookups', type=int, default=100000)
+    bench_parser.add_argument('--db', action='store_true')
+    args = parser.parse_args()
+
+    if args.command == 'bench':
+        bench(args.plates, args.lookups, args.db)
+        return
+    if args.command == 'occupancy':
+        counter = Occupancy(args.path, args.capacity)
+        state = counter.snapshot()
+        capacity = state['capacity'] or 'unlimited'
+        print(f"{state['occupied']} / {capacity} occupied"
+              f"{' (FULL)' if state['full'] else ''}, updated "
+              f"{datetime.fromtimestamp(state['updated_at']):%Y-%m-%d %H:%M:%S}")
+        counter.close()
+        return
+    auths = ExitAuthorizations(args.path)
+    if args.command == 'purge':
+        print(f"[INFO] Purged {auths.purge_expired()} expired authorisations")
+    else:
+        sql = "SELECT plate_number, parking_log_id, datetime(authorized_until, 'unixepoch', 'localtime') " \
+              "FROM exit_authorization WHERE authorized_until >= ?"
+        params = [time.time()]
+        if args.plate:
+            sql += " AND plate_number = ?"
+            params.append(args.plate.upper())
+        for plate, entry_id, until in auths._conn().execute(sql + " ORDER BY authorized_until", params):
+            print(f"{plate}  ID {entry_id}  until {until}")
+    auths.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,167 @@
+import gzip
+import json
+import select
+import threading
+import time
+
+import psycopg2
+
+from parking_logger import get_logger
+from partitions import LOGS_NOTIFY_CHANNEL
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = get_logger("logs_feed")
+
+# Configuration
+DB_CONFIG = {
+    'host': 'localhost',
+    'user': 'postgres',
+    'password': '1234',
+    'dbname': 'parking_system'
+}
+CACHE_TTL = 2.0             # seconds a body is trusted while no notification listener is connected
+LAG_RECHECK = 0.25          # while the database is behind the last announced insert, rebuild at most this often
+MIN_COMPRESS_BYTES = 1024
+GZIP_LEVEL = 5
+BROTLI_QUALITY = 5
+RECONNECT_BACKOFF = 5
+
+
+def dumps(payload):
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload, separators=(',', ':')).encode()
+
+
+# Encodings we can produce, best first, that the client accepts
+def choose_encoding(accept_encoding):
+    accepted = {part.split(';')[0].strip().lower() for part in (accept_encoding or '').split(',')
+                if not part.strip().endswith(';q=0')}
+    if brotli is not None and 'br' in accepted:
+        return 'br'
+    if 'gzip' in accepted:
+        return 'gzip'
+    return 'identity'
+
+
+# One serialised response, compressed per encoding the first time a client
+# asks for it and shared by everyone after
+class CachedBody:
+    def __init__(self, latest_id, body):
+        self.latest_id = latest_id
+        self.etag = f"logs-{latest_id}"
+        self.built_at = time.time()
+        self.encoded = {'identity': body}
+        self.lock = threading.Lock()
+
+    def encode(self, encoding):
+        body = self.encoded['identity']
+        if len(body) < MIN_COMPRESS_BYTES:
+            return body, 'identity'
+        encoded = self.encoded.get(encoding)
+        if encoded is None:
+            with self.lock:
+                encoded = self.encoded.get(encoding)
+                if encoded is None:
+                    if encoding == 'br':
+                        encoded = brotli.compress(body, quality=BROTLI_QUALITY)
+                    elif encoding == 'gzip':
+                        encoded = gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+                    else:
+                        encoded = body
+                    self.encoded[encoding] = encoded
+        return encoded, encoding
+
+
+# The dashboard's /logs body, rebuilt only when Postgres says a log row was
+# added. A LISTEN on the primary tracks the newest logs.id; a cached body is
+# current once it was built from a snapshot that includes that id, so a poll
+# with a matching ETag is answered without a query. A replica that has not
+# replayed the insert yet yields a body that is still behind; that body is
+# served for LAG_RECHECK seconds and then rebuilt, until the replica catches
+# up. Concurrent misses wait for one rebuild instead of each running the
+# query. Without a listener, bodies are reused for CACHE_TTL seconds.
+class LogsFeed:
+    def __init__(self, build, connect=None, ttl=CACHE_TTL):
+        self.build = build          # () -> (newest logs.id the query could see, payload)
+        self.connect = connect or (lambda: psycopg2.connect(**DB_CONFIG))
+        self.ttl = ttl
+        self.caching = True
+        self.cached = None
+        self.latest_id = 0
+        self.build_lock = threading.Lock()
+        self.listening = threading.Event()
+        self.stopping = threading.Event()
+        self.thread = None
+        self.hits = 0
+        self.rebuilds = 0
+
+    def start(self):
+        self.thread = threading.Thread(target=self._listen, name="logs-feed", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopping.set()
+        if self.thread:
+            self.thread.join(timeout=RECONNECT_BACKOFF + 2)
+
+    def fresh(self, cached):
+        if not self.caching or cached is None:
+            return False
+        if self.listening.is_set():
+            return cached.latest_id >= self.latest_id or time.time() - cached.built_at < LAG_RECHECK
+        return time.time() - cached.built_at < self.ttl
+
+    def current(self):
+        cached = self.cached
+        if self.fresh(cached):
+            self.hits += 1
+            return cached
+        with self.build_lock:
+            cached = self.cached
+            if self.fresh(cached):
+                self.hits += 1
+                return cached
+            latest_id, payload = self.build()
+            cached = self.cached = CachedBody(latest_id, dumps(payload))
+            self.rebuilds += 1
+            return cached
+
+    def _listen(self):
+        while not self.stopping.is_set():
+            conn = None
+            try:
+                conn = self.connect()
+                conn.set_session(autocommit=True)
+                conn.cursor().execute(f"LISTEN {LOGS_NOTIFY_CHANNEL}")
+                # Anything inserted while we were not listening is unaccounted for
+                self.cached = None
+                self.listening.set()
+                while not self.stopping.is_set():
+                    if select.select([conn], [], [], 1.0)[0] == []:
+                        continue
+                    conn.poll()
+                    if not conn.notifies:
+                        continue
+                    ids = [int(n.payload) for n in conn.notifies if n.payload.isdigit()]
+                    conn.notifies.clear()
+                    if ids:
+                        self.latest_id = max(self.latest_id, max(ids))
+            except psycopg2.Error as e:
+                self.listening.clear()
+                logger.warning(f"Logs listener: {e}; reconnecting in {RECONNECT_BACKOFF}s")
+                self.stopping.wait(RECONNECT_BACKOFF)
+            finally:
+                self.listening.clear()
+                if conn is not None:
+                    conn.close()
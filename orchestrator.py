@@ -0,0 +1,622 @@
+import argparse
+import json
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+import psycopg2
+import psycopg2.pool
+from colorama import init, Fore, Style
+
+from capture import BUS_PREFIX
+from frame_bus import MAX_READERS
+from lanes import LANE_TYPES, CriticalError, SharedResources, log_event
+from local_store import ExitAuthorizations, Occupancy
+from plate_index import PlateIndex
+from parking_logger import get_logger
+from partitions import initialize_partitioned_tables
+from plate_lists import PlateLists, initialize_plate_lists
+from plate_recognizer import get_recognizer, DEFAULT_BACKEND
+from plate_store import EvidenceStore
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# Initialize colorama
+init()
+logger = get_logger("orchestrator")
+PROCESS_START = time.time()
+
+# Configuration
+LANES_CONFIG = 'lanes.json'
+MODEL_PATH = 'best.pt'
+TESSERACT_CMD = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
+RELOAD_INTERVAL = 2         # seconds between lanes.json mtime checks
+RESTART_BACKOFF = 2         # first restart delay after a lane crash
+RESTART_BACKOFF_MAX = 60
+STOP_TIMEOUT = 20           # a lane may be mid gate cycle when asked to stop
+STATS_INTERVAL = 300        # seconds between gate latency summaries in the log
+INDEX_REFRESH_INTERVAL = 60  # resync open sessions written by other processes
+OCCUPANCY_RECONCILE_INTERVAL = 60   # reset the lot counter from the database
+POOL_MIN_CONNECTIONS = 2
+POOL_MAX_CONNECTIONS = 16
+WARMUP_FRAME = (480, 640, 3)
+WARMUP_PLATE = (40, 160, 3)
+DB_CONFIG = {
+    'host': 'localhost',
+    'user': 'postgres',
+    'password': '1234',
+    'dbname': 'parking_system'
+}
+
+
+# Database connection
+def get_db_connection():
+    try:
+        conn = psycopg2.connect(**DB_CONFIG)
+        conn.set_session(autocommit=False)
+        return conn
+    except psycopg2.Error as e:
+        raise CriticalError(f"Database connection failed: {e}")
+
+
+# Initialize database
+def initialize_db():
+    try:
+        conn = get_db_connection()
+        initialize_partitioned_tables(conn)
+        initialize_plate_lists(conn)
+        conn.close()
+        print(f"{Fore.GREEN}[INIT] Database initialized{Style.RESET_ALL}")
+        logger.info("Database initialized")
+    except psycopg2.Error as e:
+        print(f"{Fore.RED}[ERROR] Database initialization failed: {e}{Style.RESET_ALL}")
+        raise CriticalError(f"Database initialization failed: {e}")
+
+
+# Cars inside the lot according to the database: sessions of any age that
+# have not exited, as tracked in open_sessions
+def count_open_sessions(conn):
+    cursor = conn.cursor()
+    cursor.execute("SELECT COUNT(*) FROM open_sessions")
+    count = cursor.fetchone()[0]
+    cursor.close()
+    conn.commit()
+    return count
+
+
+# When this process started, so the startup time includes interpreter
+# start-up and imports; without psutil, when this module finished importing
+def process_started_at():
+    if psutil is not None:
+        try:
+            return psutil.Process().create_time()
+        except psutil.Error:
+            pass
+    return PROCESS_START
+
+
+# {name: lane config}; raises ValueError on anything the lanes can't run
+def load_lane_config(path=LANES_CONFIG):
+    with open(path) as f:
+        data = json.load(f)
+    lanes = {}
+    for lane in data.get('lanes', []):
+        name = lane.get('name')
+        if not name:
+            raise ValueError("Every lane needs a name")
+        if name in lanes:
+            raise ValueError(f"Duplicate lane name: {name}")
+        if lane.get('direction') not in LANE_TYPES:
+            raise ValueError(f"Lane {name}: direction must be one of {sorted(LANE_TYPES)}")
+        roi = lane.get('roi')
+        if roi is not None and (len(roi) != 4 or roi[2] <= roi[0] or roi[3] <= roi[1]):
+            raise ValueError(f"Lane {name}: roi must be [x1, y1, x2, y2]")
+        lanes[name] = lane
+    assign_bus_readers(lanes)
+    return lanes
+
+
+# Lanes on the same frame bus each need their own cursor on it. Lanes that
+# don't set capture.reader_id get the lowest id no other lane of that bus
+# uses, in config order, so every process reading this config agrees.
+def assign_bus_readers(lanes):
+    taken = {}
+    for name, lane in lanes.items():
+        reader_id = (lane.get('capture') or {}).get('reader_id')
+        if reader_id is None or not str(lane.get('camera', '')).startswith(BUS_PREFIX):
+            continue
+        if not 0 <= reader_id < MAX_READERS or reader_id in taken.setdefault(lane['camera'], set()):
+            raise ValueError(f"Lane {name}: reader_id {reader_id} is out of range or used by another lane")
+        taken[lane['camera']].add(reader_id)
+    for name, lane in lanes.items():
+        camera = lane.get('camera')
+        if not str(camera).startswith(BUS_PREFIX) or (lane.get('capture') or {}).get('reader_id') is not None:
+            continue
+        free = [i for i in range(MAX_READERS) if i not in taken.setdefault(camera, set())]
+        if not free:
+            raise ValueError(f"Lane {name}: more than {MAX_READERS} lanes read {camera}")
+        lane['capture'] = dict(lane.get('capture') or {}, reader_id=free[0])
+        taken[camera].add(free[0])
+
+
+# Detector and OCR are loaded once per process and shared by every lane.
+# ultralytics pulls in torch, so it is imported here rather than at module
+# level, and one throwaway inference pays the allocation/first-call cost
+# before a real car does.
+def load_models(warm_up=True):
+    start = time.perf_counter()
+    if DEFAULT_BACKEND == 'tesseract':
+        import pytesseract
+        pytesseract.pytesseract.tesseract_cmd = TESSERACT_CMD
+        if not os.path.isfile(TESSERACT_CMD):
+            raise CriticalError("Tesseract executable not found")
+    try:
+        from ultralytics import YOLO
+        model = YOLO(MODEL_PATH)
+    except FileNotFoundError as e:
+        raise CriticalError(f"YOLO model file not found: {e}")
+    try:
+        recognizer = get_recognizer()
+    except (RuntimeError, FileNotFoundError, ValueError) as e:
+        raise CriticalError(f"OCR backend unavailable: {e}")
+    loaded = time.perf_counter()
+    print(f"{Fore.GREEN}[INIT] OCR backend: {recognizer.name}{Style.RESET_ALL}")
+
+    if warm_up:
+        model(np.zeros(WARMUP_FRAME, dtype=np.uint8), verbose=False)
+        recognizer.read(np.full(WARMUP_PLATE, 255, dtype=np.uint8))
+    print(f"{Fore.GREEN}[INIT] Models loaded in {loaded - start:.2f}s, "
+          f"warm-up {time.perf_counter() - loaded:.2f}s{Style.RESET_ALL}")
+    logger.info(f"Models loaded in {loaded - start:.2f}s, warm-up {time.perf_counter() - loaded:.2f}s")
+    return model, recognizer
+
+
+def open_database():
+    initialize_db()
+    try:
+        pool = psycopg2.pool.ThreadedConnectionPool(POOL_MIN_CONNECTIONS, POOL_MAX_CONNECTIONS, **DB_CONFIG)
+    except psycopg2.Error as e:
+        raise CriticalError(f"Database connection failed: {e}")
+
+    evidence_store = None
+    try:
+        evidence_store = EvidenceStore(get_db_connection).start()
+    except (CriticalError, psycopg2.Error) as e:
+        print(f"{Fore.RED}[WARNING] Evidence store unavailable, plate images will not be saved: {e}{Style.RESET_ALL}")
+        logger.warning(f"Evidence store unavailable: {e}")
+    return pool, evidence_store
+
+
+def open_exit_authorizations():
+    try:
+        return ExitAuthorizations()
+    except sqlite3.Error as e:
+        print(f"{Fore.RED}[WARNING] Exit pre-authorisation unavailable, exits will query the database: {e}{Style.RESET_ALL}")
+        logger.warning(f"Exit pre-authorisation unavailable: {e}")
+        return None
+
+
+def open_occupancy():
+    try:
+        occupancy = Occupancy()
+        state = occupancy.snapshot()
+    except sqlite3.Error as e:
+        print(f"{Fore.RED}[WARNING] Occupancy counter unavailable, entries ignore capacity: {e}{Style.RESET_ALL}")
+        logger.warning(f"Occupancy counter unavailable: {e}")
+        return None
+    print(f"{Fore.GREEN}[INIT] Lot occupancy {state['occupied']} / {state['capacity'] or 'unlimited'}{Style.RESET_ALL}")
+    return occupancy
+
+
+def open_plate_lists():
+    try:
+        plate_lists = PlateLists().start()
+    except psycopg2.Error as e:
+        print(f"{Fore.RED}[WARNING] Plate lists unavailable, decisions use sessions only: {e}{Style.RESET_ALL}")
+        logger.warning(f"Plate lists unavailable: {e}")
+        return None
+    print(f"{Fore.GREEN}[INIT] {len(plate_lists)} listed plates loaded{Style.RESET_ALL}")
+    return plate_lists
+
+
+# Model loading runs in the background while the database is prepared and
+# the lanes open their cameras and serial ports; then wait for the models
+def start_site(lanes, config_path=LANES_CONFIG):
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix="models") as executor:
+        models = executor.submit(load_models)
+        try:
+            pool, evidence_store = open_database()
+        except CriticalError as e:
+            print(f"{Fore.RED}[ERROR] {e}{Style.RESET_ALL}")
+            logger.error(str(e))
+            return None
+        shared = SharedResources(pool, evidence_store, exit_auth=open_exit_authorizations(), plate_index=PlateIndex(),
+                                 plate_lists=open_plate_lists(), occupancy=open_occupancy())
+        orchestrator = Orchestrator(shared, config_path)
+        orchestrator.apply(lanes)
+        try:
+            shared.set_models(*models.result())
+        except CriticalError as e:
+            print(f"{Fore.RED}[ERROR] {e}{Style.RESET_ALL}")
+            logger.error(str(e))
+            orchestrator.close()
+            return None
+        except Exception as e:
+            # anything else from torch/ultralytics or the OCR backend: the
+            # lanes are already running and must be stopped, not left orphaned
+            print(f"{Fore.RED}[ERROR] Model loading failed: {e}{Style.RESET_ALL}")
+            logger.error(f"Model loading failed: {e}")
+            orchestrator.close()
+            return None
+    return orchestrator
+
+
+# Runs one lane in its own thread and restarts it with exponential backoff
+# when it dies; a clean stop() or a recorded source played to its end ends
+# the thread
+class LaneSupervisor(threading.Thread):
+    def __init__(self, config, shared):
+        super().__init__(name=f"lane-{config['name']}", daemon=True)
+        self.config = config
+        self.shared = shared
+        self.lane = None
+        self.restarts = 0
+        self.stopping = threading.Event()
+
+    def run(self):
+        backoff = RESTART_BACKOFF
+        name = self.config['name']
+        while not self.stopping.is_set():
+            self.lane = LANE_TYPES[self.config['direction']](self.config, self.shared)
+            if self.stopping.is_set():
+                break
+            started = time.time()
+            try:
+                self.lane.run()
+            except Exception as e:
+                print(f"{Fore.RED}[{name}] [ERROR] Lane stopped: {type(e).__name__}: {e}{Style.RESET_ALL}")
+                logger.error(f"Lane {name} stopped: {type(e).__name__}: {e}", extra={"lane": name})
+            if self.stopping.is_set():
+                break
+            if self.lane.finished:
+                print(f"{Fore.GREEN}[{name}] [DONE] Recorded source finished, not restarting{Style.RESET_ALL}")
+                logger.info(f"Lane {name} finished its recorded source", extra={"lane": name})
+                break
+            if time.time() - started > RESTART_BACKOFF_MAX:
+                backoff = RESTART_BACKOFF
+            self.restarts += 1
+            print(f"{Fore.RED}[{name}] [RESTART] Restarting in {backoff}s (restart #{self.restarts}){Style.RESET_ALL}")
+            logger.warning(f"Restarting lane {name} in {backoff}s", extra={"lane": name})
+            self.stopping.wait(backoff)
+            backoff = min(backoff * 2, RESTART_BACKOFF_MAX)
+
+    def stop(self):
+        self.stopping.set()
+        if self.lane:
+            self.lane.stop()
+
+
+class Orchestrator:
+    def __init__(self, shared, config_path=LANES_CONFIG):
+        self.shared = shared
+        self.config_path = config_path
+        self.supervisors = {}
+        self.draining = {}          # name -> stopped supervisor whose thread has not exited yet
+        self.wanted = {}            # the lane configs last applied
+        self.config_mtime = None
+        self.windows = set()
+        self.startup_reported = False
+
+    def start_lane(self, config):
+        supervisor = LaneSupervisor(config, self.shared)
+        self.supervisors[config['name']] = supervisor
+        supervisor.start()
+        print(f"{Fore.GREEN}[LANES] Started {config['direction']} lane {config['name']}{Style.RESET_ALL}")
+        logger.info(f"Started {config['direction']} lane {config['name']}", extra={"lane": config['name']})
+
+    # A lane still inside a gate cycle or a blocking read after STOP_TIMEOUT
+    # keeps its camera and serial port, so it is parked in draining and its
+    # replacement waits until the thread has really exited
+    def stop_lane(self, name):
+        supervisor = self.supervisors.pop(name)
+        supervisor.stop()
+        supervisor.join(STOP_TIMEOUT)
+        for window in [w for w in self.windows if w.startswith(f"{name}: ")]:
+            cv2.destroyWindow(window)
+            self.windows.discard(window)
+        if supervisor.is_alive():
+            self.draining[name] = supervisor
+            print(f"{Fore.RED}[LANES] Lane {name} has not stopped after {STOP_TIMEOUT}s, "
+                  f"holding its restart{Style.RESET_ALL}")
+            logger.warning(f"Lane {name} has not stopped after {STOP_TIMEOUT}s", extra={"lane": name})
+            return False
+        print(f"{Fore.GREEN}[LANES] Stopped lane {name}{Style.RESET_ALL}")
+        logger.info(f"Stopped lane {name}", extra={"lane": name})
+        return True
+
+    # Start new lanes, stop removed ones and restart only the ones whose
+    # config changed; untouched lanes keep running
+    def apply(self, lanes):
+        self.wanted = lanes
+        for name in list(self.supervisors):
+            if name not in lanes or lanes[name] != self.supervisors[name].config:
+                self.stop_lane(name)
+        self.start_wanted()
+
+    # Start every wanted lane that isn't running, once any old thread of
+    # the same name is gone
+    def start_wanted(self):
+        for name in [n for n, supervisor in self.draining.items() if not supervisor.is_alive()]:
+            del self.draining[name]
+            print(f"{Fore.GREEN}[LANES] Stopped lane {name}{Style.RESET_ALL}")
+            logger.info(f"Stopped lane {name}", extra={"lane": name})
+        for name, config in self.wanted.items():
+            if name not in self.supervisors and name not in self.draining:
+                self.start_lane(config)
+
+    def reload_if_changed(self):
+        try:
+            mtime = os.path.getmtime(self.config_path)
+        except OSError:
+            return
+        if mtime == self.config_mtime:
+            return
+        self.config_mtime = mtime
+        try:
+            lanes = load_lane_config(self.config_path)
+        except (ValueError, OSError) as e:
+            print(f"{Fore.RED}[WARNING] Ignoring invalid {self.config_path}: {e}{Style.RESET_ALL}")
+            logger.warning(f"Ignoring invalid {self.config_path}: {e}", extra={"path": self.config_path})
+            return
+        self.apply(lanes)
+
+    # HighGUI is not thread safe, so the lanes only publish frames and the
+    # main thread draws them
+    def show_previews(self):
+        for name, supervisor in self.supervisors.items():
+            lane = supervisor.lane
+            if not lane or not supervisor.config.get('preview', True):
+                continue
+            for title, image in list(lane.preview.items()):
+                if image is not None:
+                    cv2.imshow(f"{name}: {title}", image)
+                    self.windows.add(f"{name}: {title}")
+
+    # Process start until every lane configured at startup has handled a frame
+    def report_startup(self):
+        lanes = [s.lane for s in self.supervisors.values()]
+        if self.startup_reported or not lanes or not all(lane and lane.first_frame.is_set() for lane in lanes):
+            return
+        self.startup_reported = True
+        elapsed = time.time() - process_started_at()
+        print(f"{Fore.GREEN}[STARTUP] Time to first decision: {elapsed:.2f}s for {len(lanes)} lane(s){Style.RESET_ALL}")
+        logger.info(f"Time to first decision: {elapsed:.2f}s for {len(lanes)} lane(s)",
+                    extra={"latency_ms": round(elapsed * 1000)})
+
+    # Mirrored gate state and actuation latency histograms per lane
+    def gate_status(self):
+        return {name: s.lane.gate.snapshot() for name, s in self.supervisors.items() if s.lane and s.lane.gate}
+
+    def log_gate_stats(self):
+        for name, state in self.gate_status().items():
+            logger.info(f"Gate {name}: servo={state['servo']} resends={state['resends']} lost={state['lost']} "
+                        f"ack={json.dumps(state['ack_latency'])}", extra={"lane": name})
+
+    # Degradation level each lane's scheduler settled on, with the latency it
+    # is holding against its budget
+    def lane_status(self):
+        return {name: s.lane.scheduler.snapshot() for name, s in self.supervisors.items() if s.lane}
+
+    def log_lane_stats(self):
+        for name, state in self.lane_status().items():
+            latency = state['latency_ms']
+            logger.info(f"Lane {name}: level={state['level']} latency={latency} ms budget={state['budget_ms']} ms "
+                        f"processed={state['processed']} skipped={state['skipped']} "
+                        f"changes={state['level_changes']}",
+                        extra={"lane": name, "latency_ms": round(latency) if latency is not None else None})
+
+    # Lanes keep the index current for their own entries and exits; this
+    # picks up sessions changed elsewhere (payments, manual fixes)
+    def refresh_plate_index(self):
+        index = self.shared.plate_index
+        if index is None:
+            return
+        conn = None
+        try:
+            conn = self.shared.pool.getconn()
+            if index.refresh(conn):
+                logger.debug(f"Open-session index refreshed: {len(index)} plates")
+        except psycopg2.Error as e:
+            logger.warning(f"Open-session index refresh failed: {e}")
+        finally:
+            if conn:
+                self.shared.pool.putconn(conn)
+
+    # Lanes count their own entries and exits; this corrects for anything
+    # they missed (crashes mid-entry, exits recorded by hand)
+    def reconcile_occupancy(self):
+        occupancy = self.shared.occupancy
+        if occupancy is None:
+            return
+        conn = None
+        try:
+            conn = self.shared.pool.getconn()
+            occupancy.reconcile(lambda: count_open_sessions(conn))
+        except (psycopg2.Error, sqlite3.Error) as e:
+            if conn:
+                conn.rollback()
+            logger.warning(f"Occupancy reconcile failed: {e}")
+        finally:
+            if conn:
+                self.shared.pool.putconn(conn)
+
+    def run(self, reload=True):
+        last_check = last_stats = time.time()
+        last_index = last_occupancy = 0
+        try:
+            while True:
+                if time.time() - last_index >= INDEX_REFRESH_INTERVAL:
+                    self.refresh_plate_index()
+                    last_index = time.time()
+                if time.time() - last_occupancy >= OCCUPANCY_RECONCILE_INTERVAL:
+                    self.reconcile_occupancy()
+                    last_occupancy = time.time()
+                if reload and time.time() - last_check >= RELOAD_INTERVAL:
+                    self.reload_if_changed()
+                    last_check = time.time()
+                if self.draining:
+                    self.start_wanted()
+                if time.time() - last_stats >= STATS_INTERVAL:
+                    self.log_gate_stats()
+                    self.log_lane_stats()
+                    last_stats = time.time()
+                self.report_startup()
+                self.show_previews()
+                if cv2.waitKey(30) & 0xFF == ord('q'):
+                    print(f"{Fore.RED}[EXIT] Program terminated by user{Style.RESET_ALL}")
+                    self.log_shutdown()
+                    break
+        except KeyboardInterrupt:
+            print(f"{Fore.RED}[EXIT] Program terminated by user{Style.RESET_ALL}")
+            self.log_shutdown()
+        finally:
+            self.close()
+
+    def log_shutdown(self):
+        conn = None
+        try:
+            conn = self.shared.pool.getconn()
+            log_event(None, "Error", "Program terminated by user", conn)
+        except (CriticalError, psycopg2.Error) as e:
+            logger.error(f"Failed to log shutdown: {e}")
+        finally:
+            if conn:
+                self.shared.pool.putconn(conn)
+
+    def close(self):
+        for supervisor in self.supervisors.values():
+            supervisor.stop()
+        for name in list(self.supervisors):
+            self.stop_lane(name)
+        for name, supervisor in self.draining.items():
+            supervisor.join(STOP_TIMEOUT)
+        if self.shared.evidence_store:
+            self.shared.evidence_store.close()
+        if self.shared.plate_lists:
+            self.shared.plate_lists.stop()
+        if self.shared.occupancy:
+            self.shared.occupancy.close()
+        self.shared.pool.closeall()
+        print(f"{Fore.GREEN}[CLEANUP] Database connections closed{Style.RESET_ALL}")
+        logger.info("Database connections closed")
+        cv2.destroyAllWindows()
+        print(f"{Fore.GREEN}[CLEANUP] Application terminated{Style.RESET_ALL}")
+
+
+# Entry point for the single-lane launchers (car_entry.py / car_exit.py)
+def run_single_lane(config):
+    orchestrator = start_site({config['name']: config})
+    if orchestrator:
+        orchestrator.run(reload=False)
+
+
+# ---------------------------------------------------------------------------
+# Startup / memory benchmark
+# ---------------------------------------------------------------------------
+
+# Resident set size of this process in MB (peak when psutil is missing)
+def rss_mb():
+    if psutil is not None:
+        return psutil.Process().memory_info().rss / 2 ** 20
+    if resource is not None:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return float('nan')
+
+
+# What one legacy car_entry/car_exit process pays before its first frame
+def _legacy_lane_process(result_queue):
+    start = time.perf_counter()
+    model, recognizer = load_models(warm_up=False)
+    model(np.zeros(WARMUP_FRAME, dtype=np.uint8), verbose=False)
+    result_queue.put((time.perf_counter() - start, rss_mb()))
+
+
+def benchmark(lane_counts):
+    import multiprocessing
+
+    context = multiprocessing.get_context('spawn')
+    print(f"{'lanes':>5} {'layout':<16} {'startup s':>10} {'RSS MB':>9}")
+    for lanes in lane_counts:
+        # One process per lane, as with separate car_entry.py / car_exit.py
+        queue = context.Queue()
+        start = time.perf_counter()
+        workers = [context.Process(target=_legacy_lane_process, args=(queue,)) for _ in range(lanes)]
+        for worker in workers:
+            worker.start()
+        results = [queue.get() for _ in workers]
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - start
+        print(f"{lanes:>5} {'process-per-lane':<16} {elapsed:>10.2f} {sum(r[1] for r in results):>9.0f}")
+
+        # One orchestrator process sharing the model across lane threads
+        queue = context.Queue()
+        start = time.perf_counter()
+        worker = context.Process(target=_shared_lanes_process, args=(queue, lanes))
+        worker.start()
+        _, rss = queue.get()
+        worker.join()
+        print(f"{lanes:>5} {'orchestrator':<16} {time.perf_counter() - start:>10.2f} {rss:>9.0f}")
+
+
+def _shared_lanes_process(result_queue, lanes):
+    start = time.perf_counter()
+    model, recognizer = load_models()
+    shared = SharedResources(None, model=model, recognizer=recognizer)
+    frame = np.zeros(WARMUP_FRAME, dtype=np.uint8)
+    threads = [threading.Thread(target=shared.detect, args=(frame,)) for _ in range(lanes)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    result_queue.put((time.perf_counter() - start, rss_mb()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run every configured lane in one process")
+    parser.add_argument('--config', default=LANES_CONFIG)
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.add_parser('run', help="start the lanes in --config and follow edits to it (default)")
+    bench = subparsers.add_parser('bench', help="startup time and RSS: process-per-lane vs shared")
+    bench.add_argument('--lanes', default='2,4', help="comma-separated lane counts")
+    args = parser.parse_args()
+
+    if args.command == 'bench':
+        benchmark([int(n) for n in args.lanes.split(',')])
+        return
+
+    try:
+        lanes = load_lane_config(args.config)
+    except (ValueError, OSError) as e:
+        print(f"{Fore.RED}[ERROR] {e}{Style.RESET_ALL}")
+        logger.error(str(e))
+        return
+    orchestrator = start_site(lanes, args.config)
+    if orchestrator:
+        orchestrator.run()
+
+
+if __name__ == '__main__':
+    main()
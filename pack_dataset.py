@@ -0,0 +1,181 @@
+import argparse
+import json
+import os
+import random
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from arrange_dataset import IMAGE_EXTENSIONS, dataset_dir, dataset_yaml, write_yaml
+
+# Configuration
+PACK_IMGSZ = 640            # longest side, as the detector trains and validates
+PACK_SUFFIX = '.pack'       # <split>/images.pack next to <split>/images
+INDEX_SUFFIX = '.pack.json'
+SPLITS = ('train', 'val')
+
+
+def pack_paths(image_dir):
+    image_dir = os.path.normpath(image_dir)
+    return image_dir + PACK_SUFFIX, image_dir + INDEX_SUFFIX
+
+
+# Same resize the detector's loader does: longest side to imgsz, aspect kept
+def resize_for_training(image, imgsz):
+    h0, w0 = image.shape[:2]
+    r = imgsz / max(h0, w0)
+    if r != 1:
+        image = cv2.resize(image, (min(round(w0 * r), imgsz), min(round(h0 * r), imgsz)),
+                           interpolation=cv2.INTER_AREA if r < 1 else cv2.INTER_LINEAR)
+    return image
+
+
+def _decode(path, imgsz):
+    image = cv2.imread(path)
+    if image is None:
+        return None, None
+    return resize_for_training(image, imgsz), image.shape[:2]
+
+
+# Decoded, resized images of one split laid end to end in a flat uint8 file,
+# with a JSON index of byte offsets and shapes. Readers memory-map the file,
+# so an image is a slice of the page cache instead of a JPEG decode.
+class ImagePack:
+    def __init__(self, image_dir):
+        self.path, self.index_path = pack_paths(image_dir)
+        with open(self.index_path) as f:
+            index = json.load(f)
+        self.imgsz = index['imgsz']
+        self.entries = {entry['name']: entry for entry in index['images']}
+        self.data = None
+
+    @staticmethod
+    def exists(image_dir):
+        return all(os.path.exists(p) for p in pack_paths(image_dir))
+
+    # DataLoader workers pickle the dataset; each reopens the map itself
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state['data'] = None
+        return state
+
+    def __len__(self):
+        return len(self.entries)
+
+    # (image, original (h, w)) for an image file, or None when it is not in
+    # the pack or has changed since packing
+    def get(self, image_path):
+        entry = self.entries.get(os.path.basename(image_path))
+        if entry is None:
+            return None
+        try:
+            stat = os.stat(image_path)
+        except OSError:
+            stat = None
+        if stat is not None and (stat.st_size, stat.st_mtime_ns) != (entry['size'], entry['mtime']):
+            return None
+        if self.data is None:
+            self.data = np.memmap(self.path, dtype=np.uint8, mode='r')
+        h, w, c = entry['shape']
+        image = self.data[entry['offset']:entry['offset'] + h * w * c].reshape(h, w, c)
+        return image, tuple(entry['orig'])
+
+
+# Pack one split's images; returns (packed, skipped)
+def pack_split(image_dir, imgsz, workers):
+    pack_path, index_path = pack_paths(image_dir)
+    names = sorted(n for n in os.listdir(image_dir) if n.lower().endswith(IMAGE_EXTENSIONS))
+    paths = [os.path.join(image_dir, n) for n in names]
+
+    entries, offset, skipped = [], 0, 0
+    tmp_path = pack_path + '.tmp'
+    with open(tmp_path, 'wb') as f, ThreadPoolExecutor(max_workers=workers) as pool:
+        for name, path, (image, orig) in zip(names, paths, pool.map(lambda p: _decode(p, imgsz), paths)):
+            if image is None:
+                print(f"⚠️  Skipping unreadable {path}")
+                skipped += 1
+                continue
+            image = np.ascontiguousarray(image)
+            f.write(image.tobytes())
+            stat = os.stat(path)
+            entries.append({'name': name, 'offset': offset, 'shape': list(image.shape), 'orig': list(orig),
+                            'size': stat.st_size, 'mtime': stat.st_mtime_ns})
+            offset += image.nbytes
+    os.replace(tmp_path, pack_path)
+    with open(index_path + '.tmp', 'w') as f:
+        json.dump({'imgsz': imgsz, 'images': entries}, f)
+    os.replace(index_path + '.tmp', index_path)
+    return len(entries), skipped
+
+
+def pack(root, imgsz, workers, yaml_path):
+    start = time.time()
+    for split in SPLITS:
+        image_dir = os.path.join(root, split, 'images')
+        if not os.path.isdir(image_dir):
+            continue
+        packed, skipped = pack_split(image_dir, imgsz, workers)
+        size_mb = os.path.getsize(pack_paths(image_dir)[0]) / 1e6
+        print(f"📦 {split}: {packed} images packed at {imgsz}px ({size_mb:.1f} MB), {skipped} skipped")
+    if yaml_path:
+        write_yaml(yaml_path, root, yaml_path)
+        print(f"📝 Wrote {yaml_path}")
+    print(f"✅ Packed in {time.time() - start:.2f}s")
+
+
+# ---------------------------------------------------------------------------
+# Loader benchmark: JPEG decode + resize vs reading from the pack
+# ---------------------------------------------------------------------------
+
+def bench(root, epochs, seed):
+    rng = random.Random(seed)
+    for split in SPLITS:
+        image_dir = os.path.join(root, split, 'images')
+        if not ImagePack.exists(image_dir):
+            print(f"[BENCH] {split}: no pack, run 'pack' first")
+            continue
+        image_pack = ImagePack(image_dir)
+        paths = [os.path.join(image_dir, name) for name in image_pack.entries]
+        results = {}
+        for label, load in (('jpeg', lambda p: _decode(p, image_pack.imgsz)[0]),
+                            ('pack', lambda p: np.ascontiguousarray(image_pack.get(p)[0]))):
+            epoch_times = []
+            for _ in range(epochs):
+                order = paths[:]
+                rng.shuffle(order)
+                t = time.perf_counter()
+                for path in order:
+                    load(path)
+                epoch_times.append(time.perf_counter() - t)
+            results[label] = statistics.median(epoch_times)
+        n = len(paths)
+        print(f"[BENCH] {split}: {n} images at {image_pack.imgsz}px, median of {epochs} shuffled passes")
+        for label, seconds in results.items():
+            print(f"  {label}: {seconds:.3f}s per epoch ({seconds / n * 1000:.2f} ms per image)")
+        print(f"  speed-up: {results['jpeg'] / max(results['pack'], 1e-9):.1f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pack the detector dataset into memory-mapped image files")
+    parser.add_argument('--root', default=dataset_dir, help="dataset folder with train/ and val/")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    pack_parser = subparsers.add_parser('pack', help="decode, resize and pack every split")
+    pack_parser.add_argument('--imgsz', type=int, default=PACK_IMGSZ)
+    pack_parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    pack_parser.add_argument('--yaml', default=dataset_yaml, help="dataset YAML to (re)write with relative paths")
+    bench_parser = subparsers.add_parser('bench', help="time a data-loading epoch from JPEG vs from the pack")
+    bench_parser.add_argument('--epochs', type=int, default=3)
+    bench_parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    if args.command == 'pack':
+        pack(args.root, args.imgsz, args.workers, args.yaml)
+    else:
+        bench(args.root, args.epochs, args.seed)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,217 @@
+import argparse
+import atexit
+import copy
+import glob
+import gzip
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import shutil
+import time
+from datetime import datetime, timedelta
+
+# Configuration (overridable through the environment so production lanes can
+# run at INFO while a bench setup turns on DEBUG serial chatter)
+LOG_DIR = os.environ.get("PARKING_LOG_DIR", "logs")
+LOG_FILE = "parking.jsonl"
+LOG_LEVEL = os.environ.get("PARKING_LOG_LEVEL", "INFO").upper()
+MAX_BYTES = int(os.environ.get("PARKING_LOG_MAX_BYTES", 5 * 1024 * 1024))
+BACKUP_COUNT = int(os.environ.get("PARKING_LOG_BACKUPS", 30))
+ROOT_LOGGER = "parking"
+
+# Fields callers may attach with extra={...}; they become top-level JSON keys
+CONTEXT_FIELDS = ("plate", "event", "lane", "port", "path", "latency_ms")
+
+_listener = None
+
+
+# One JSON object per line, timestamps in local time like the old log
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created).isoformat(timespec="microseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for field in CONTEXT_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+# Rotates when the file exceeds MAX_BYTES or the day changes, gzipping old files
+class CompressingRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    def __init__(self, filename, max_bytes=MAX_BYTES, backup_count=BACKUP_COUNT):
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8")
+        self.namer = lambda name: name + ".gz"
+        self.rotator = self._compress
+        self.rollover_at = self._next_midnight()
+
+    @staticmethod
+    def _next_midnight():
+        tomorrow = datetime.now().date() + timedelta(days=1)
+        return datetime.combine(tomorrow, datetime.min.time()).timestamp()
+
+    @staticmethod
+    def _compress(source, dest):
+        with open(source, "rb") as src, gzip.open(dest, "wb") as dst:
+            shutil.copyfileobj(src, dst)
+        os.remove(source)
+
+    def shouldRollover(self, record):
+        if time.time() >= self.rollover_at and os.path.exists(self.baseFilename) \
+                and os.path.getsize(self.baseFilename) > 0:
+            return True
+        return super().shouldRollover(record)
+
+    def doRollover(self):
+        super().doRollover()
+        self.rollover_at = self._next_midnight()
+
+# The stock prepare() formats the record with a plain Formatter, which folds
+# the traceback into msg; keep msg as the message alone and carry the
+# traceback across the queue as exc_text for JsonFormatter
+class JsonQueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.message = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = JsonFormatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+# Install the queue handler once per process; the file is written by a
+# listener thread so a slow disk never stalls the frame loop
+def setup_logging(log_dir=LOG_DIR, level=LOG_LEVEL):
+    global _listener
+    root = logging.getLogger(ROOT_LOGGER)
+    if _listener is not None:
+        return root
+
+    os.makedirs(log_dir, exist_ok=True)
+    file_handler = CompressingRotatingFileHandler(os.path.join(log_dir, LOG_FILE))
+    file_handler.setFormatter(JsonFormatter())
+
+    log_queue = queue.SimpleQueue()
+    root.addHandler(JsonQueueHandler(log_queue))
+    root.setLevel(level)
+    root.propagate = False
+
+    _listener = logging.handlers.QueueListener(log_queue, file_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+    return root
+
+
+# Flush everything still queued and stop the listener thread
+def shutdown_logging():
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def get_logger(name):
+    setup_logging()
+    return logging.getLogger(f"{ROOT_LOGGER}.{name}")
+
+
+# ---------------------------------------------------------------------------
+# Query CLI
+# ---------------------------------------------------------------------------
+
+# Rotated files first (highest suffix is oldest), then the live file
+def log_files(log_dir=LOG_DIR):
+    base = os.path.join(log_dir, LOG_FILE)
+    rotated = glob.glob(base + ".*.gz")
+    rotated.sort(key=lambda p: int(p[len(base) + 1:-3]), reverse=True)
+    if os.path.exists(base):
+        rotated.append(base)
+    return rotated
+
+
+def iter_entries(log_dir=LOG_DIR):
+    for path in log_files(log_dir):
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(path, "rt", encoding="utf-8") as log_file:
+            for line in log_file:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+
+
+# Level names --level accepts, in severity order
+LEVEL_NAMES = sorted(logging._nameToLevel, key=logging._nameToLevel.get)
+
+
+def query_logs(plate=None, since=None, until=None, level=None, event=None, log_dir=LOG_DIR):
+    min_level = logging._nameToLevel.get(level.upper()) if level else 0
+    if min_level is None:
+        raise ValueError(f"Unknown log level: {level} (use one of {', '.join(LEVEL_NAMES)})")
+    since = since.isoformat() if since else None
+    until = until.isoformat() if until else None
+    for entry in iter_entries(log_dir):
+        ts = entry.get("ts", "")
+        if since and ts < since:
+            continue
+        if until and ts > until:
+            continue
+        if plate and entry.get("plate") != plate:
+            continue
+        if event and entry.get("event") != event:
+            continue
+        if min_level and logging._nameToLevel.get(entry.get("level"), logging.NOTSET) < min_level:
+            continue
+        yield entry
+
+
+def parse_time(value):
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid timestamp: {value} (use YYYY-MM-DD[ HH:MM[:SS]])")
+
+
+# A bare date as the end of a range means the whole of that day
+def parse_until(value):
+    until = parse_time(value)
+    if len(value.strip()) == 10:
+        until = datetime.combine(until.date(), datetime.max.time())
+    return until
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query the structured parking logs")
+    parser.add_argument("--plate", help="Only entries for this plate, e.g. RAB123C")
+    parser.add_argument("--since", type=parse_time, help="Start of time range (inclusive)")
+    parser.add_argument("--until", type=parse_until, help="End of time range (inclusive)")
+    parser.add_argument("--level", type=str.upper, choices=LEVEL_NAMES, help="Minimum level (DEBUG, INFO, WARNING, ERROR)")
+    parser.add_argument("--event", help="Only entries with this event type, e.g. Entry")
+    parser.add_argument("--log-dir", default=LOG_DIR)
+    parser.add_argument("--json", action="store_true", help="Print raw JSON lines")
+    args = parser.parse_args()
+
+    count = 0
+    for entry in query_logs(args.plate, args.since, args.until, args.level, args.event, args.log_dir):
+        count += 1
+        if args.json:
+            print(json.dumps(entry, ensure_ascii=False))
+        else:
+            plate = entry.get("plate", "-")
+            print(f"{entry['ts']} {entry['level']:<7} {entry['logger']:<24} {plate:<8} {entry['msg']}")
+    print(f"[INFO] {count} matching entries")
+
+
+if __name__ == "__main__":
+    main()
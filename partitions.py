@@ -0,0 +1,411 @@
+import argparse
+import gzip
+import os
+import random
+import string
+import time
+from datetime import datetime, timedelta
+
+import psycopg2
+
+from parking_logger import get_logger
+
+logger = get_logger("partitions")
+
+# Configuration
+DB_CONFIG = {
+    'host': 'localhost',
+    'user': 'postgres',
+    'password': '1234',
+    'dbname': 'parking_system'
+}
+PARTITION_MONTHS_AHEAD = 2      # always keep this many future months ready
+ARCHIVE_AFTER_MONTHS = 12       # partitions older than this are exported and dropped
+ACTIVE_WINDOW_DAYS = 90         # hot lookups search sessions this recent, plus any still open
+ARCHIVE_DIR = 'archive'
+INIT_LOCK_ID = 727001           # pg_advisory_xact_lock key shared by all lanes
+LOGS_NOTIFY_CHANNEL = 'logs_inserted'
+
+# table -> partition key
+PARTITIONED_TABLES = {
+    'parking_logs': 'entry_timestamp',
+    'logs': 'event_timestamp',
+}
+
+PARKING_LOGS_DDL = """
+    CREATE TABLE IF NOT EXISTS parking_logs (
+        id SERIAL,
+        plate_number VARCHAR(10) NOT NULL,
+        payment_status BOOLEAN NOT NULL DEFAULT FALSE,
+        entry_timestamp TIMESTAMP NOT NULL,
+        exit_timestamp TIMESTAMP,
+        amount NUMERIC(10, 2),
+        exited BOOLEAN NOT NULL DEFAULT FALSE,
+        PRIMARY KEY (id, entry_timestamp),
+        CONSTRAINT chk_plate CHECK (plate_number ~ '^[A-Z]{2,3}[0-9]{3}[A-Z]$')
+    ) PARTITION BY RANGE (entry_timestamp)
+"""
+
+EVENT_TYPE_DDL = """
+    DO $$ BEGIN
+        CREATE TYPE event_type AS ENUM ('Entry', 'Exit', 'Payment', 'Unauthorized Exit Attempt', 'Error');
+    EXCEPTION
+        WHEN duplicate_object THEN NULL;
+    END $$;
+"""
+
+LOGS_DDL = """
+    CREATE TABLE IF NOT EXISTS logs (
+        id SERIAL,
+        plate_number VARCHAR(10) NOT NULL,
+        event_type event_type NOT NULL,
+        event_timestamp TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        message VARCHAR(255) NOT NULL,
+        PRIMARY KEY (id, event_timestamp)
+    ) PARTITION BY RANGE (event_timestamp)
+"""
+
+INDEX_DDL = [
+    "CREATE INDEX IF NOT EXISTS idx_parking_logs_plate ON parking_logs (plate_number, entry_timestamp)",
+    "CREATE INDEX IF NOT EXISTS idx_logs_event_timestamp ON logs (event_timestamp)",
+    "CREATE INDEX IF NOT EXISTS idx_logs_plate ON logs (plate_number, event_timestamp)",
+    # superseded by open_sessions, and probed once per partition
+    "DROP INDEX IF EXISTS idx_parking_logs_open",
+]
+
+# Sessions that have not exited, whatever their age, kept in step with
+# parking_logs by a row trigger. It stays as small as the lot, so finding a
+# plate's oldest open session is one primary-key probe instead of a search
+# through every monthly partition.
+OPEN_SESSIONS_DDL = """
+    CREATE TABLE IF NOT EXISTS open_sessions (
+        plate_number VARCHAR(10) NOT NULL,
+        entry_timestamp TIMESTAMP NOT NULL,
+        id INTEGER NOT NULL,
+        PRIMARY KEY (plate_number, entry_timestamp, id)
+    );
+    CREATE OR REPLACE FUNCTION track_open_sessions() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP <> 'INSERT' AND NOT OLD.exited THEN
+            DELETE FROM open_sessions
+            WHERE plate_number = OLD.plate_number AND entry_timestamp = OLD.entry_timestamp AND id = OLD.id;
+        END IF;
+        IF TG_OP <> 'DELETE' AND NOT NEW.exited THEN
+            INSERT INTO open_sessions VALUES (NEW.plate_number, NEW.entry_timestamp, NEW.id)
+            ON CONFLICT DO NOTHING;
+        END IF;
+        RETURN NULL;
+    END $$ LANGUAGE plpgsql;
+"""
+
+OPEN_SESSIONS_TRIGGER_DDL = """
+    CREATE TRIGGER parking_logs_open AFTER INSERT OR DELETE OR UPDATE OF exited, plate_number
+    ON parking_logs FOR EACH ROW EXECUTE FUNCTION track_open_sessions()
+"""
+
+# Lower bound of a plate's hot-path lookup: the active window, reaching
+# back to the plate's oldest open session when it is older (LEAST ignores
+# the NULL of a plate with none). Parameters: window start, plate.
+SESSION_WINDOW = "LEAST(%s, (SELECT MIN(entry_timestamp) FROM open_sessions WHERE plate_number = %s))"
+
+# Each new logs row announces its id, so the dashboard knows when its cached
+# /logs response went stale without polling. Row triggers on the parent are
+# cloned onto every partition, including ones created later.
+LOGS_NOTIFY_DDL = f"""
+    CREATE OR REPLACE FUNCTION notify_logs_inserted() RETURNS trigger AS $$
+    BEGIN
+        PERFORM pg_notify('{LOGS_NOTIFY_CHANNEL}', NEW.id::text);
+        RETURN NULL;
+    END $$ LANGUAGE plpgsql;
+    DROP TRIGGER IF EXISTS logs_notify ON logs;
+    CREATE TRIGGER logs_notify AFTER INSERT ON logs FOR EACH ROW EXECUTE FUNCTION notify_logs_inserted();
+"""
+
+
+def month_start(value):
+    return datetime(value.year, value.month, 1)
+
+
+def add_months(value, months):
+    years, month = divmod(value.month - 1 + months, 12)
+    return datetime(value.year + years, month + 1, 1)
+
+
+def partition_name(table, start):
+    return f"{table}_{start.strftime('%Y%m')}"
+
+
+# Lower bound for hot-path session lookups; lets the planner prune old partitions
+def active_window_start(now=None):
+    return (now or datetime.now()) - timedelta(days=ACTIVE_WINDOW_DAYS)
+
+
+# Run a hot-path session lookup whose params start with the plate and whose
+# SQL ends in "entry_timestamp >= %s". That bound becomes SESSION_WINDOW, so
+# a car parked longer than ACTIVE_WINDOW_DAYS is still found by the same
+# single statement, which the executor prunes to the partitions in range.
+def fetch_session(cursor, sql, params):
+    head, tail = sql.rsplit("%s", 1)
+    cursor.execute(head + SESSION_WINDOW + tail, params + (active_window_start(), params[0]))
+    return cursor.fetchone()
+
+
+def _relkind(cursor, name):
+    cursor.execute(
+        "SELECT c.relkind FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace "
+        "WHERE c.relname = %s AND n.nspname = current_schema()",
+        (name,)
+    )
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def list_partitions(cursor, table):
+    cursor.execute("""
+        SELECT c.relname FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        JOIN pg_class p ON p.oid = i.inhparent
+        JOIN pg_namespace n ON n.oid = p.relnamespace
+        WHERE p.relname = %s AND n.nspname = current_schema()
+        ORDER BY c.relname
+    """, (table,))
+    return [row[0] for row in cursor.fetchall()]
+
+
+# Create one monthly partition; rows that already landed in the default
+# partition for that month are moved into it first
+def _create_partition(cursor, table, start):
+    name = partition_name(table, start)
+    if _relkind(cursor, name):
+        return False
+    end = add_months(start, 1)
+    column = PARTITIONED_TABLES[table]
+    cursor.execute(
+        f"SELECT EXISTS (SELECT 1 FROM {table}_default WHERE {column} >= %s AND {column} < %s)",
+        (start, end)
+    )
+    if cursor.fetchone()[0]:
+        cursor.execute(f"CREATE TABLE {name} (LIKE {table} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)")
+        cursor.execute(
+            f"WITH moved AS (DELETE FROM {table}_default WHERE {column} >= %s AND {column} < %s RETURNING *) "
+            f"INSERT INTO {name} SELECT * FROM moved",
+            (start, end)
+        )
+        cursor.execute(f"ALTER TABLE {table} ATTACH PARTITION {name} FOR VALUES FROM (%s) TO (%s)", (start, end))
+        if table == 'parking_logs' and _relkind(cursor, 'open_sessions'):
+            # the DELETE above untracked the moved open sessions
+            cursor.execute(f"INSERT INTO open_sessions SELECT plate_number, entry_timestamp, id FROM {name} "
+                           f"WHERE exited = FALSE ON CONFLICT DO NOTHING")
+    else:
+        cursor.execute(f"CREATE TABLE {name} PARTITION OF {table} FOR VALUES FROM (%s) TO (%s)", (start, end))
+    logger.info(f"Created partition {name}")
+    return True
+
+
+# Make sure the current month and the next few exist for both tables
+def ensure_partitions(conn, months_ahead=PARTITION_MONTHS_AHEAD, now=None):
+    cursor = conn.cursor()
+    first = month_start(now or datetime.now())
+    created = 0
+    for table in PARTITIONED_TABLES:
+        for offset in range(months_ahead + 1):
+            created += _create_partition(cursor, table, add_months(first, offset))
+    conn.commit()
+    cursor.close()
+    return created
+
+
+# Convert a pre-partitioning table in place: rename, recreate, copy, drop
+def _migrate_table(cursor, table, ddl):
+    column = PARTITIONED_TABLES[table]
+    legacy = f"{table}_legacy"
+    print(f"[MIGRATE] Converting {table} to a partitioned table")
+    logger.info(f"Migrating {table} to monthly partitions")
+    cursor.execute(f"ALTER TABLE {table} RENAME TO {legacy}")
+    cursor.execute(ddl)
+    cursor.execute(f"CREATE TABLE IF NOT EXISTS {table}_default PARTITION OF {table} DEFAULT")
+    cursor.execute(f"SELECT MIN({column}), MAX({column}), MAX(id) FROM {legacy}")
+    oldest, newest, max_id = cursor.fetchone()
+    if oldest:
+        month = month_start(oldest)
+        while month <= newest:
+            _create_partition(cursor, table, month)
+            month = add_months(month, 1)
+    cursor.execute(f"INSERT INTO {table} SELECT * FROM {legacy}")
+    cursor.execute(f"DROP TABLE {legacy}")
+    if max_id:
+        cursor.execute(f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), %s)", (max_id,))
+
+
+# Create open_sessions and its trigger; the first time, fill it from the
+# sessions already open
+def _track_open_sessions(cursor):
+    cursor.execute(OPEN_SESSIONS_DDL)
+    cursor.execute("SELECT EXISTS (SELECT 1 FROM pg_trigger WHERE tgname = 'parking_logs_open' "
+                   "AND tgrelid = 'parking_logs'::regclass)")
+    if cursor.fetchone()[0]:
+        return
+    cursor.execute(OPEN_SESSIONS_TRIGGER_DDL)
+    cursor.execute("INSERT INTO open_sessions SELECT plate_number, entry_timestamp, id FROM parking_logs "
+                   "WHERE exited = FALSE ON CONFLICT DO NOTHING")
+    logger.info(f"Tracking {cursor.rowcount} open sessions")
+
+
+# Create (or migrate) the partitioned tables; safe to call from every lane
+def initialize_partitioned_tables(conn):
+    cursor = conn.cursor()
+    cursor.execute("SELECT pg_advisory_xact_lock(%s)", (INIT_LOCK_ID,))
+    cursor.execute(EVENT_TYPE_DDL)
+    for table, ddl in (('parking_logs', PARKING_LOGS_DDL), ('logs', LOGS_DDL)):
+        kind = _relkind(cursor, table)
+        if kind == 'r':
+            _migrate_table(cursor, table, ddl)
+        else:
+            cursor.execute(ddl)
+            cursor.execute(f"CREATE TABLE IF NOT EXISTS {table}_default PARTITION OF {table} DEFAULT")
+    for statement in INDEX_DDL:
+        cursor.execute(statement)
+    _track_open_sessions(cursor)
+    cursor.execute(LOGS_NOTIFY_DDL)
+    conn.commit()
+    cursor.close()
+    ensure_partitions(conn)
+
+
+# Export partitions older than the cutoff to gzipped CSV, then drop them.
+# parking_logs partitions that still hold open sessions are kept.
+def archive_partitions(conn, older_than_months=ARCHIVE_AFTER_MONTHS, out_dir=ARCHIVE_DIR, now=None):
+    cutoff = add_months(month_start(now or datetime.now()), -older_than_months)
+    os.makedirs(out_dir, exist_ok=True)
+    cursor = conn.cursor()
+    archived = []
+    for table in PARTITIONED_TABLES:
+        for name in list_partitions(cursor, table):
+            suffix = name[len(table) + 1:]
+            if not suffix.isdigit() or datetime.strptime(suffix, '%Y%m') >= cutoff:
+                continue
+            if table == 'parking_logs':
+                cursor.execute(f"SELECT EXISTS (SELECT 1 FROM {name} WHERE exited = FALSE)")
+                if cursor.fetchone()[0]:
+                    print(f"[ARCHIVE] Skipping {name}: open sessions remain")
+                    logger.warning(f"Not archiving {name}: open sessions remain")
+                    continue
+
+            path = os.path.join(out_dir, f"{name}.csv.gz")
+            tmp_path = path + ".tmp"
+            with gzip.open(tmp_path, "wt", encoding="utf-8") as archive_file:
+                cursor.copy_expert(f"COPY {name} TO STDOUT WITH CSV HEADER", archive_file)
+            os.replace(tmp_path, path)
+
+            cursor.execute(f"ALTER TABLE {table} DETACH PARTITION {name}")
+            cursor.execute(f"DROP TABLE {name}")
+            conn.commit()
+            archived.append(path)
+            print(f"[ARCHIVE] {name} -> {path}")
+            logger.info(f"Archived partition {name} to {path}", extra={"path": path})
+    cursor.close()
+    return archived
+
+
+# ---------------------------------------------------------------------------
+# Benchmark: active-session lookup latency as history grows
+# ---------------------------------------------------------------------------
+
+def _random_plate():
+    return "RA" + random.choice(string.ascii_uppercase) + f"{random.randint(0, 999):03d}" + random.choice(string.ascii_uppercase)
+
+
+def benchmark(conn, months=24, rows_per_month=50000, lookups=500):
+    cursor = conn.cursor()
+    cursor.execute("DROP SCHEMA IF EXISTS bench_partitions CASCADE")
+    cursor.execute("CREATE SCHEMA bench_partitions")
+    cursor.execute("SET search_path TO bench_partitions, public")
+    cursor.execute(PARKING_LOGS_DDL)
+    cursor.execute("CREATE TABLE parking_logs_default PARTITION OF parking_logs DEFAULT")
+    cursor.execute(PARKING_LOGS_DDL.replace("parking_logs", "flat_logs")
+                   .replace(") PARTITION BY RANGE (entry_timestamp)", ")"))
+    cursor.execute(INDEX_DDL[0])
+    cursor.execute("CREATE INDEX ON flat_logs (plate_number, entry_timestamp)")
+    _track_open_sessions(cursor)
+    conn.commit()
+
+    plates = [_random_plate() for _ in range(5000)]
+    # plates never seen: the usual case at an entry gate
+    unknown = list({_random_plate() for _ in range(lookups * 2)} - set(plates))
+    now = month_start(datetime.now())
+    print(f"{'months':>7} {'rows':>10} {'flat hit ms':>12} {'flat miss ms':>13} "
+          f"{'part. hit ms':>13} {'part. miss ms':>14}")
+    for month_index in range(months):
+        start = add_months(now, -(months - 1) + month_index)
+        _create_partition(cursor, 'parking_logs', start)
+        is_recent = month_index >= months - 3
+        for table in ('parking_logs', 'flat_logs'):
+            cursor.execute(f"""
+                INSERT INTO {table} (plate_number, payment_status, entry_timestamp, exit_timestamp, exited)
+                SELECT (%s::text[])[1 + (g %% %s)], %s OR g %% 10 <> 0,
+                       %s + (g %% 2592000) * interval '1 second', NULL, NOT %s OR g %% 10 <> 0
+                FROM generate_series(1, %s) g
+            """, (plates, len(plates), not is_recent, start, is_recent, rows_per_month))
+        conn.commit()
+        if (month_index + 1) % 6 == 0 or month_index == months - 1:
+            cursor.execute("ANALYZE parking_logs; ANALYZE flat_logs; ANALYZE open_sessions")
+            timings = [_time_lookups(cursor, sample, table, lookups)
+                       for table in ('flat_logs', 'parking_logs') for sample in (plates, unknown)]
+            print(f"{month_index + 1:>7} {(month_index + 1) * rows_per_month:>10} {timings[0]:>12.3f} "
+                  f"{timings[1]:>13.3f} {timings[2]:>13.3f} {timings[3]:>14.3f}")
+    cursor.execute("DROP SCHEMA bench_partitions CASCADE")
+    conn.commit()
+    cursor.close()
+
+
+# Mean ms per has_active_entry-style lookup. The partitioned table goes
+# through fetch_session, exactly as the lanes and payment scripts run it.
+def _time_lookups(cursor, plates, table, lookups):
+    query = (f"SELECT COUNT(*) FROM {table} WHERE plate_number = %s "
+             f"AND (payment_status = FALSE OR (payment_status = TRUE AND exited = FALSE))")
+    start = time.perf_counter()
+    for plate in random.sample(plates, min(lookups, len(plates))):
+        if table == 'parking_logs':
+            fetch_session(cursor, query + " AND entry_timestamp >= %s", (plate,))
+        else:
+            cursor.execute(query, (plate,))
+            cursor.fetchone()
+    return (time.perf_counter() - start) / min(lookups, len(plates)) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Partition maintenance for parking_logs and logs")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("init", help="Create or migrate the partitioned tables")
+    ensure = sub.add_parser("ensure", help="Create upcoming monthly partitions")
+    ensure.add_argument("--months-ahead", type=int, default=PARTITION_MONTHS_AHEAD)
+    archive = sub.add_parser("archive", help="Export and drop old partitions")
+    archive.add_argument("--older-than", type=int, default=ARCHIVE_AFTER_MONTHS, help="months")
+    archive.add_argument("--out-dir", default=ARCHIVE_DIR)
+    sub.add_parser("maintain", help="ensure + archive, for a daily cron job")
+    bench = sub.add_parser("bench", help="Active-session lookup latency vs history size")
+    bench.add_argument("--months", type=int, default=24)
+    bench.add_argument("--rows-per-month", type=int, default=50000)
+    bench.add_argument("--lookups", type=int, default=500)
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(**DB_CONFIG)
+    try:
+        if args.command == "init":
+            initialize_partitioned_tables(conn)
+            print("[INIT] Partitioned tables ready")
+        elif args.command == "ensure":
+            print(f"[INFO] Created {ensure_partitions(conn, args.months_ahead)} partitions")
+        elif args.command == "archive":
+            archive_partitions(conn, args.older_than, args.out_dir)
+        elif args.command == "maintain":
+            ensure_partitions(conn)
+            archive_partitions(conn)
+        elif args.command == "bench":
+            benchmark(conn, args.months, args.rows_per_month, args.lookups)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
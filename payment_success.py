@@ -2,6 +2,8 @@ import datetime
 
 import psycopg2
 import re
+from partitions import fetch_session
+from local_store import publish_exit_authorization
 
 # Configuration
 PLATE_PATTERN = r'^[A-Z]{2,3}[0-9]{3}[A-Z]$'
@@ -39,11 +41,11 @@ def mark_payment_success(plate_number):
     conn = get_db_connection()
     try:
         cursor = conn.cursor()
-        cursor.execute(
-            "SELECT id FROM parking_logs WHERE plate_number = %s AND payment_status = FALSE",
+        result = fetch_session(
+            cursor,
+            "SELECT id, entry_timestamp FROM parking_logs WHERE plate_number = %s AND payment_status = FALSE AND entry_timestamp >= %s",
             (plate_number,)
         )
-        result = cursor.fetchone()
         if not result:
             print(f"[INFO] No unpaid record found for {plate_number}")
             log_event(plate_number, "Payment", f"No unpaid record for {plate_number}", conn)
@@ -52,10 +54,11 @@ def mark_payment_success(plate_number):
             return
 
         cursor.execute(
-            "UPDATE parking_logs SET payment_status = TRUE WHERE id = %s",
-            (result[0],)
+            "UPDATE parking_logs SET payment_status = TRUE WHERE id = %s AND entry_timestamp = %s",
+            (result[0], result[1])
         )
         conn.commit()
+        publish_exit_authorization(plate_number, result[0], result[1])
         log_event(plate_number, "Payment", f"Manually marked as paid for {plate_number}", conn)
         print(f"[UPDATED] Payment status set to TRUE for {plate_number}")
     except psycopg2.Error as e:
@@ -0,0 +1,137 @@
+import math
+import os
+
+# Configuration
+# Grammar slots: 'L' any letter, 'D' any digit, anything else is a literal
+PLATE_GRAMMAR = ['R', 'A', 'L', 'D', 'D', 'D', 'L']
+# Geometric-mean per-character probability to accept, on the backend's own
+# confidence scale; replay_harness.py --calibrate suggests a value from saved crops
+MIN_CONFIDENCE = float(os.environ.get('PLATE_MIN_CONFIDENCE', '0.35'))
+CONFUSION_WEIGHT = 0.6      # probability multiplier when a confusable substitute is used
+SKIP_PENALTY = math.log(0.15)  # cost of dropping a spurious character inside or after the plate
+UNSCORED_CHAR_PROB = 1e-6   # a reading with no confidence at all ranks below any scored one
+
+# Characters OCR commonly swaps between the letter and digit classes
+CONFUSABLE_TO_LETTER = {'0': 'O', '1': 'I', '2': 'Z', '5': 'S', '6': 'G', '7': 'T', '8': 'B'}
+CONFUSABLE_TO_DIGIT = {'O': '0', 'D': '0', 'Q': '0', 'U': '0', 'I': '1', 'L': '1', 'J': '1', 'T': '7',
+                       'Z': '2', 'S': '5', 'G': '6', 'B': '8'}
+
+
+class DecodedPlate:
+    def __init__(self, text, confidence, substitutions, skipped):
+        self.text = text
+        self.confidence = confidence
+        self.substitutions = substitutions
+        self.skipped = skipped
+
+    def __repr__(self):
+        return f"DecodedPlate({self.text!r}, {self.confidence:.2f}, subs={self.substitutions}, skipped={self.skipped})"
+
+
+# Best (char, probability, substituted) a single OCR position can offer for a slot
+def _emit(alternatives, slot):
+    best = (None, 0.0, False)
+    for char, prob in alternatives:
+        if slot == 'L':
+            if char.isalpha():
+                candidate = (char, prob, False)
+            elif char in CONFUSABLE_TO_LETTER:
+                candidate = (CONFUSABLE_TO_LETTER[char], prob * CONFUSION_WEIGHT, True)
+            else:
+                continue
+        elif slot == 'D':
+            if char.isdigit():
+                candidate = (char, prob, False)
+            elif char in CONFUSABLE_TO_DIGIT:
+                candidate = (CONFUSABLE_TO_DIGIT[char], prob * CONFUSION_WEIGHT, True)
+            else:
+                continue
+        elif char == slot:
+            candidate = (char, prob, False)
+        elif CONFUSABLE_TO_LETTER.get(char) == slot or CONFUSABLE_TO_DIGIT.get(char) == slot:
+            candidate = (slot, prob * CONFUSION_WEIGHT, True)
+        else:
+            continue
+        if candidate[1] > best[1]:
+            best = candidate
+    return best
+
+
+# Per-position alternatives for a Reading; falls back to its flat text. Text
+# without any confidence still decodes (substitutions and skips rank the
+# same), but only a caller passing min_confidence=0 accepts it.
+def reading_positions(reading):
+    if reading.chars:
+        return reading.chars
+    prob = reading.confidence if reading.confidence > 0 else UNSCORED_CHAR_PROB
+    return [[(char, prob)] for char in reading.text.upper() if char.isalnum()]
+
+
+# Most likely grammar-conforming string: every slot is matched to one OCR
+# position in order; leading positions are free to drop, spurious positions
+# inside or after the plate cost SKIP_PENALTY each. The penalties count
+# towards the confidence, so a read with characters left over never decodes
+# as confidently as a clean one.
+def decode_positions(positions, grammar=PLATE_GRAMMAR, min_confidence=MIN_CONFIDENCE):
+    n, m = len(positions), len(grammar)
+    if n < m:
+        return None
+    neg_inf = float('-inf')
+    # score[j][i]: best log-prob with slots[:j] placed and slot j-1 at position i-1
+    score = [[neg_inf] * (n + 1) for _ in range(m + 1)]
+    back = [[None] * (n + 1) for _ in range(m + 1)]
+    emissions = [[_emit(positions[i], slot) for i in range(n)] for slot in grammar]
+
+    for i in range(n + 1):
+        score[0][i] = 0.0
+    for j in range(1, m + 1):
+        for i in range(j, n - (m - j) + 1):
+            char, prob, _ = emissions[j - 1][i - 1]
+            if not char:
+                continue
+            log_p = math.log(prob)
+            if j == 1:
+                score[j][i] = log_p
+                back[j][i] = (0, None)
+                continue
+            best, best_prev = neg_inf, None
+            for prev in range(j - 1, i):
+                candidate = score[j - 1][prev] + (i - 1 - prev) * SKIP_PENALTY
+                if candidate > best:
+                    best, best_prev = candidate, prev
+            if best_prev is not None:
+                score[j][i] = best + log_p
+                back[j][i] = (best_prev,)
+
+    end = max(range(n + 1), key=lambda i: score[m][i] + (n - i) * SKIP_PENALTY)
+    if score[m][end] == neg_inf:
+        return None
+
+    chars, subs, skipped, log_total = [], 0, 0, 0.0
+    i = end
+    for j in range(m, 0, -1):
+        char, prob, substituted = emissions[j - 1][i - 1]
+        chars.append(char)
+        subs += substituted
+        log_total += math.log(prob)
+        prev = back[j][i][0]
+        if j > 1:
+            skipped += i - 1 - prev
+        i = prev
+    skipped += n - end
+    confidence = math.exp((log_total + skipped * SKIP_PENALTY) / m)
+    if confidence < min_confidence:
+        return None
+    return DecodedPlate(''.join(reversed(chars)), confidence, subs, skipped)
+
+
+def decode_plate(reading, grammar=PLATE_GRAMMAR, min_confidence=MIN_CONFIDENCE):
+    return decode_positions(reading_positions(reading), grammar, min_confidence)
+
+
+# What the lanes did before: find "RA" and slice seven characters
+def legacy_slice(text):
+    if "RA" not in text:
+        return None
+    start_idx = text.find("RA")
+    return text[start_idx:start_idx + 7]
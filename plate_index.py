@@ -0,0 +1,240 @@
+import argparse
+import random
+import statistics
+import sys
+import threading
+import time
+
+import psycopg2
+
+from parking_logger import get_logger
+from plate_decoder import CONFUSABLE_TO_DIGIT, CONFUSABLE_TO_LETTER
+
+logger = get_logger("plate_index")
+
+# Configuration
+CONFUSABLE_COST = 1         # O<->0, B<->8, ...: what OCR most often gets wrong
+SUBSTITUTION_COST = 2
+INDEL_COST = 2
+MATCH_MAX_DISTANCE = 2      # two confusable swaps, or one other substitution/indel
+RESOLVE_MARGIN = SUBSTITUTION_COST  # a runner-up within one edit of the best match makes a read ambiguous
+
+CONFUSABLE_PAIRS = frozenset(
+    frozenset(pair) for mapping in (CONFUSABLE_TO_LETTER, CONFUSABLE_TO_DIGIT) for pair in mapping.items()
+)
+
+
+# Every character mapped to one representative of its confusable group, so
+# plates that differ only by confusable swaps share a canonical form
+def _confusable_classes():
+    parent = {}
+
+    def find(c):
+        while parent.setdefault(c, c) != c:
+            c = parent[c]
+        return c
+
+    for a, b in (tuple(pair) for pair in CONFUSABLE_PAIRS):
+        parent[find(a)] = find(b)
+    return {c: find(c) for c in parent}
+
+
+CANONICAL = str.maketrans(_confusable_classes())
+CONFUSABLE_ORDERED = frozenset(pair for pairs in CONFUSABLE_PAIRS for pair in (tuple(pairs), tuple(pairs)[::-1]))
+
+
+# Levenshtein distance with cheaper substitutions between confusable
+# characters. With a limit, gives up (returning limit + 1) as soon as every
+# cell of a row is over it.
+def plate_distance(a, b, limit=None):
+    if a == b:
+        return 0
+    if limit is not None and limit < INDEL_COST + CONFUSABLE_COST:
+        return _near_distance(a, b, limit)
+    previous = [j * INDEL_COST for j in range(len(b) + 1)]
+    for i, ca in enumerate(a, 1):
+        current = [i * INDEL_COST]
+        for j, cb in enumerate(b, 1):
+            if ca == cb:
+                cost = 0
+            elif (ca, cb) in CONFUSABLE_ORDERED:
+                cost = CONFUSABLE_COST
+            else:
+                cost = SUBSTITUTION_COST
+            current.append(min(previous[j] + INDEL_COST, current[j - 1] + INDEL_COST, previous[j - 1] + cost))
+        if limit is not None and min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+# plate_distance for limits below an indel plus any substitution: within
+# such a limit two plates differ either by substitutions alone (same length)
+# or by one indel and nothing else, so no table is needed
+def _near_distance(a, b, limit):
+    if len(a) == len(b):
+        total = 0
+        for ca, cb in zip(a, b):
+            if ca != cb:
+                total += CONFUSABLE_COST if (ca, cb) in CONFUSABLE_ORDERED else SUBSTITUTION_COST
+                if total > limit:
+                    return limit + 1
+        return total
+    if INDEL_COST <= limit and abs(len(a) - len(b)) == 1:
+        short, long = (a, b) if len(a) < len(b) else (b, a)
+        if any(long[:i] + long[i + 1:] == short for i in range(len(long))):
+            return INDEL_COST
+    return limit + 1
+
+
+# Canonical form plus every single-deletion of it. Two plates within
+# MATCH_MAX_DISTANCE always share a key: confusable swaps vanish in the
+# canonical form, and one other substitution or indel leaves a common deletion.
+def plate_keys(plate):
+    canonical = plate.translate(CANONICAL)
+    return {canonical} | {canonical[:i] + canonical[i + 1:] for i in range(len(canonical))}
+
+
+# Plates with an open session, for resolving near-miss OCR reads at the
+# exit. A deletion-neighbourhood index: lookups touch len(plate) + 1 dict
+# buckets and only score the handful of plates found there.
+class PlateIndex:
+    def __init__(self, plates=()):
+        self.lock = threading.Lock()
+        self.plates = set()
+        self.buckets = {}
+        self.refreshed_at = 0.0
+        for plate in plates:
+            self._add(plate)
+
+    def __len__(self):
+        return len(self.plates)
+
+    def __contains__(self, plate):
+        return plate in self.plates
+
+    def _add(self, plate):
+        if plate in self.plates:
+            return
+        self.plates.add(plate)
+        for key in plate_keys(plate):
+            self.buckets.setdefault(key, set()).add(plate)
+
+    def add(self, plate):
+        with self.lock:
+            self._add(plate)
+
+    def remove(self, plate):
+        with self.lock:
+            if plate not in self.plates:
+                return
+            self.plates.discard(plate)
+            for key in plate_keys(plate):
+                bucket = self.buckets.get(key)
+                if bucket is not None:
+                    bucket.discard(plate)
+                    if not bucket:
+                        del self.buckets[key]
+
+    # Open sessions of any age, i.e. cars that may still be inside
+    def refresh(self, conn):
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT DISTINCT plate_number FROM open_sessions")
+            plates = [row[0] for row in cursor.fetchall()]
+            cursor.close()
+            conn.commit()
+        except psycopg2.Error as e:
+            conn.rollback()
+            logger.warning(f"Open-session refresh failed: {e}")
+            return False
+        fresh = PlateIndex(plates)
+        with self.lock:
+            self.plates, self.buckets = fresh.plates, fresh.buckets
+            self.refreshed_at = time.time()
+        return True
+
+    # (distance, plate) for every open session within max_distance, nearest first
+    def nearest(self, plate, max_distance=MATCH_MAX_DISTANCE):
+        with self.lock:
+            candidates = set()
+            for key in plate_keys(plate):
+                candidates |= self.buckets.get(key, set())
+        matches = [(plate_distance(plate, candidate, max_distance), candidate) for candidate in candidates]
+        return sorted(m for m in matches if m[0] <= max_distance)
+
+    # The open-session plate this reading is, or None unless exactly one
+    # session is that close: a runner-up within RESOLVE_MARGIN of the best
+    # match (an exact one included) means a wrong gate could open
+    def resolve(self, plate, max_distance=MATCH_MAX_DISTANCE, margin=RESOLVE_MARGIN):
+        matches = self.nearest(plate, max_distance)
+        if not matches or (len(matches) > 1 and matches[1][0] - matches[0][0] <= margin):
+            return None
+        return matches[0][1]
+
+
+# ---------------------------------------------------------------------------
+# Latency benchmark
+# ---------------------------------------------------------------------------
+
+def random_plate(rng):
+    letters = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+    return 'RA' + rng.choice(letters) + ''.join(rng.choice('0123456789') for _ in range(3)) + rng.choice(letters)
+
+
+# One OCR-style error: a confusable swap most of the time, else any substitution
+def corrupt(plate, rng):
+    i = rng.randrange(2, len(plate))
+    char = plate[i]
+    swaps = [c for pair in CONFUSABLE_PAIRS if char in pair for c in pair if c != char]
+    if swaps and rng.random() < 0.8:
+        return plate[:i] + rng.choice(swaps) + plate[i + 1:]
+    return plate[:i] + rng.choice('ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789'.replace(char, '')) + plate[i + 1:]
+
+
+def bench(sessions, queries, seed):
+    rng = random.Random(seed)
+    plates = set()
+    while len(plates) < sessions:
+        plates.add(random_plate(rng))
+    start = time.perf_counter()
+    index = PlateIndex(plates)
+    print(f"[BENCH] Built index of {len(index)} open sessions in {(time.perf_counter() - start) * 1000:.0f} ms")
+
+    sample = rng.sample(sorted(plates), min(queries, len(plates)))
+    timings, resolved, correct, ambiguous = [], 0, 0, 0
+    for truth in sample:
+        reading = corrupt(truth, rng)
+        t = time.perf_counter()
+        match = index.resolve(reading)
+        timings.append((time.perf_counter() - t) * 1000)
+        if match:
+            resolved += 1
+            correct += match == truth
+        elif index.nearest(reading):
+            ambiguous += 1
+    timings.sort()
+    n = len(sample)
+    wrong = resolved - correct
+    print(f"[BENCH] {n} one-error reads: resolved {resolved / n:.1%}, correct {correct / n:.1%}, "
+          f"wrong {wrong / n:.2%}, ambiguous {ambiguous / n:.1%}")
+    print(f"[BENCH] resolve latency: p50 {statistics.median(timings):.3f} ms, "
+          f"p99 {timings[int(n * 0.99)]:.3f} ms, max {timings[-1]:.3f} ms")
+    return wrong
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fuzzy plate index over open parking sessions")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    bench_parser = subparsers.add_parser('bench', help="resolve latency and accuracy on synthetic sessions")
+    bench_parser.add_argument('--sessions', type=int, default=10000)
+    bench_parser.add_argument('--queries', type=int, default=2000)
+    bench_parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+    if bench(args.sessions, args.queries, args.seed):
+        print("[FAIL] Reads resolved to another car's session")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
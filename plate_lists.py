@@ -0,0 +1,443 @@
+import argparse
+import csv
+import io
+import random
+import re
+import select
+import statistics
+import threading
+import time
+from datetime import datetime
+
+import psycopg2
+
+from parking_logger import get_logger
+
+logger = get_logger("plate_lists")
+
+# Configuration
+DB_CONFIG = {
+    'host': 'localhost',
+    'user': 'postgres',
+    'password': '1234',
+    'dbname': 'parking_system'
+}
+PLATE_PATTERN = r'^[A-Z]{2,3}[0-9]{3}[A-Z]$'
+POLICIES = ('deny', 'alert', 'free')   # strongest first: a plate on several lists gets the strongest
+NOTIFY_CHANNEL = 'plate_lists_changed'
+RELOAD_DEBOUNCE = 1.0       # seconds to let a burst of changes settle before reloading
+RECONNECT_BACKOFF = 5
+LOAD_FETCH_SIZE = 50000
+INIT_LOCK_ID = 727002       # pg_advisory_xact_lock key, next to the partitions one
+
+PLATE_LISTS_DDL = """
+    CREATE TABLE IF NOT EXISTS plate_lists (
+        id SERIAL PRIMARY KEY,
+        name VARCHAR(64) NOT NULL UNIQUE,
+        policy VARCHAR(8) NOT NULL CHECK (policy IN ('deny', 'alert', 'free')),
+        description TEXT
+    )
+"""
+
+PLATE_LIST_ENTRIES_DDL = """
+    CREATE TABLE IF NOT EXISTS plate_list_entries (
+        list_id INTEGER NOT NULL REFERENCES plate_lists (id) ON DELETE CASCADE,
+        plate_number VARCHAR(10) NOT NULL,
+        valid_until TIMESTAMP,
+        note TEXT,
+        PRIMARY KEY (list_id, plate_number)
+    )
+"""
+
+# One notification per statement, so a million-row import reloads once
+NOTIFY_DDL = f"""
+    CREATE OR REPLACE FUNCTION notify_plate_lists() RETURNS trigger AS $$
+    BEGIN
+        PERFORM pg_notify('{NOTIFY_CHANNEL}', TG_TABLE_NAME);
+        RETURN NULL;
+    END $$ LANGUAGE plpgsql;
+    DROP TRIGGER IF EXISTS plate_lists_notify ON plate_lists;
+    CREATE TRIGGER plate_lists_notify AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON plate_lists
+        FOR EACH STATEMENT EXECUTE FUNCTION notify_plate_lists();
+    DROP TRIGGER IF EXISTS plate_list_entries_notify ON plate_list_entries;
+    CREATE TRIGGER plate_list_entries_notify AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON plate_list_entries
+        FOR EACH STATEMENT EXECUTE FUNCTION notify_plate_lists();
+"""
+
+
+def initialize_plate_lists(conn):
+    cursor = conn.cursor()
+    cursor.execute("SELECT pg_advisory_xact_lock(%s)", (INIT_LOCK_ID,))
+    cursor.execute(PLATE_LISTS_DDL)
+    cursor.execute(PLATE_LIST_ENTRIES_DDL)
+    cursor.execute(NOTIFY_DDL)
+    conn.commit()
+    cursor.close()
+
+
+def normalize_plate(text):
+    return re.sub(r'[\s-]', '', text).upper()
+
+
+# ---------------------------------------------------------------------------
+# Bulk import
+# ---------------------------------------------------------------------------
+
+def ensure_list(cursor, name, policy=None, description=None):
+    if policy is None:
+        cursor.execute("SELECT id FROM plate_lists WHERE name = %s", (name,))
+        row = cursor.fetchone()
+        if not row:
+            raise ValueError(f"List {name} does not exist; give --policy to create it")
+        return row[0]
+    if policy not in POLICIES:
+        raise ValueError(f"Policy must be one of {POLICIES}")
+    cursor.execute(
+        "INSERT INTO plate_lists (name, policy, description) VALUES (%s, %s, %s) "
+        "ON CONFLICT (name) DO UPDATE SET policy = EXCLUDED.policy, "
+        "description = COALESCE(EXCLUDED.description, plate_lists.description) RETURNING id",
+        (name, policy, description)
+    )
+    return cursor.fetchone()[0]
+
+
+# Clean CSV rows (plate[,valid_until[,note]], optional header) into the CSV
+# COPY reads; returns (buffer, rows kept, rejected rows)
+def prepare_rows(rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    kept, rejected = 0, []
+    for line_no, row in enumerate(rows, 1):
+        if not row or not row[0].strip():
+            continue
+        plate = normalize_plate(row[0])
+        if line_no == 1 and plate in ('PLATE', 'PLATENUMBER', 'PLATE_NUMBER'):
+            continue
+        if not re.match(PLATE_PATTERN, plate):
+            rejected.append((line_no, row[0]))
+            continue
+        valid_until = row[1].strip() if len(row) > 1 and row[1].strip() else None
+        note = row[2].strip() if len(row) > 2 and row[2].strip() else None
+        writer.writerow((plate, valid_until, note))
+        kept += 1
+    buffer.seek(0)
+    return buffer, kept, rejected
+
+
+# COPY the file into a staging table and merge it into the list in one
+# transaction; with replace, plates missing from the file leave the list
+def import_plates(conn, list_name, rows, policy=None, replace=False, description=None):
+    start = time.perf_counter()
+    buffer, kept, rejected = prepare_rows(rows)
+    cursor = conn.cursor()
+    try:
+        list_id = ensure_list(cursor, list_name, policy, description)
+        cursor.execute("CREATE TEMP TABLE plate_import (plate_number VARCHAR(10), valid_until TIMESTAMP, note TEXT) "
+                       "ON COMMIT DROP")
+        cursor.copy_expert("COPY plate_import FROM STDIN WITH (FORMAT csv)", buffer)
+        removed = 0
+        if replace:
+            cursor.execute(
+                "DELETE FROM plate_list_entries e WHERE e.list_id = %s "
+                "AND NOT EXISTS (SELECT 1 FROM plate_import i WHERE i.plate_number = e.plate_number)",
+                (list_id,)
+            )
+            removed = cursor.rowcount
+        cursor.execute(
+            "INSERT INTO plate_list_entries (list_id, plate_number, valid_until, note) "
+            "SELECT DISTINCT ON (plate_number) %s, plate_number, valid_until, note FROM plate_import "
+            "ORDER BY plate_number "
+            "ON CONFLICT (list_id, plate_number) DO UPDATE SET valid_until = EXCLUDED.valid_until, note = EXCLUDED.note",
+            (list_id,)
+        )
+        upserted = cursor.rowcount
+        conn.commit()
+    except psycopg2.Error:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+    elapsed = time.perf_counter() - start
+    logger.info(f"Imported {upserted} plates into list {list_name} ({removed} removed, {len(rejected)} rejected) "
+                f"in {elapsed:.2f}s", extra={"latency_ms": round(elapsed * 1000)})
+    return upserted, removed, rejected
+
+
+# ---------------------------------------------------------------------------
+# In-memory lookup
+# ---------------------------------------------------------------------------
+
+class ListMatch:
+    def __init__(self, policy, list_name, valid_until=None):
+        self.policy = policy
+        self.list_name = list_name
+        self.valid_until = valid_until
+
+    def __repr__(self):
+        return f"ListMatch({self.policy!r}, {self.list_name!r})"
+
+
+# Every listed plate in a dict, for an O(1) check before a lane touches the
+# session table. A listener thread LISTENs for changes and swaps in a fresh
+# dict, so lookups never lock and never see a half-loaded set.
+class PlateLists:
+    def __init__(self, connect=None):
+        self.connect = connect or (lambda: psycopg2.connect(**DB_CONFIG))
+        self.entries = {}
+        self.loaded_at = None
+        self.stopping = threading.Event()
+        self.thread = None
+
+    def __len__(self):
+        return len(self.entries)
+
+    def lookup(self, plate, now=None):
+        match = self.entries.get(plate)
+        if match is not None and match.valid_until is not None and match.valid_until < (now or datetime.now()):
+            return None
+        return match
+
+    def load(self, conn):
+        start = time.perf_counter()
+        rank = {policy: i for i, policy in enumerate(POLICIES)}
+        shared = {}     # one ListMatch per list for the common no-expiry case
+        entries = {}
+        cursor = conn.cursor(name='plate_lists_load')
+        cursor.itersize = LOAD_FETCH_SIZE
+        cursor.execute(
+            "SELECT e.plate_number, l.policy, l.name, e.valid_until FROM plate_list_entries e "
+            "JOIN plate_lists l ON l.id = e.list_id WHERE e.valid_until IS NULL OR e.valid_until > now()"
+        )
+        for plate, policy, name, valid_until in cursor:
+            if valid_until is None:
+                match = shared.get(name)
+                if match is None:
+                    match = shared[name] = ListMatch(policy, name)
+            else:
+                match = ListMatch(policy, name, valid_until)
+            current = entries.get(plate)
+            if current is None or rank[policy] < rank[current.policy]:
+                entries[plate] = match
+        cursor.close()
+        conn.commit()
+        self.entries = entries
+        self.loaded_at = time.time()
+        elapsed = time.perf_counter() - start
+        logger.info(f"Loaded {len(entries)} listed plates in {elapsed:.2f}s", extra={"latency_ms": round(elapsed * 1000)})
+        return len(entries)
+
+    def reload(self):
+        conn = self.connect()
+        try:
+            return self.load(conn)
+        finally:
+            conn.close()
+
+    def start(self):
+        self.reload()
+        self.thread = threading.Thread(target=self._listen, name="plate-lists", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopping.set()
+        if self.thread:
+            self.thread.join(2)
+
+    # Reload on NOTIFY; after a lost connection, reload anyway since
+    # notifications sent meanwhile are gone
+    def _listen(self):
+        reconnecting = False
+        while not self.stopping.is_set():
+            conn = None
+            try:
+                conn = self.connect()
+                conn.set_session(autocommit=True)
+                conn.cursor().execute(f"LISTEN {NOTIFY_CHANNEL}")
+                if reconnecting:
+                    self.reload()
+                reconnecting = True
+                while not self.stopping.is_set():
+                    if select.select([conn], [], [], 1.0)[0] == []:
+                        continue
+                    conn.poll()
+                    if not conn.notifies:
+                        continue
+                    # Let the rest of a burst arrive, then reload once
+                    self.stopping.wait(RELOAD_DEBOUNCE)
+                    conn.poll()
+                    conn.notifies.clear()
+                    self.reload()
+            except psycopg2.Error as e:
+                logger.warning(f"Plate list listener: {e}; reconnecting in {RECONNECT_BACKOFF}s")
+                self.stopping.wait(RECONNECT_BACKOFF)
+            finally:
+                if conn is not None:
+                    conn.close()
+
+
+# ---------------------------------------------------------------------------
+# Benchmark: COPY import, load and lookup at 10^6 plates
+# ---------------------------------------------------------------------------
+
+def _random_plates(count, rng):
+    letters = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+    plates = set()
+    while len(plates) < count:
+        plates.add('R' + rng.choice(letters) + rng.choice(letters)
+                   + f"{rng.randrange(1000):03d}" + rng.choice(letters))
+    return sorted(plates)
+
+
+def _time_lookups(lists, queries):
+    timings = []
+    for plate in queries:
+        t = time.perf_counter()
+        lists.lookup(plate)
+        timings.append((time.perf_counter() - t) * 1e6)
+    timings.sort()
+    return statistics.median(timings), timings[int(len(timings) * 0.99)]
+
+
+def bench(count, lookups, db, seed):
+    import tracemalloc
+
+    rng = random.Random(seed)
+    plates = _random_plates(count, rng)
+    queries = [rng.choice(plates) if rng.random() < 0.5 else 'RZZ' + f"{rng.randrange(1000):03d}" + 'Z'
+               for _ in range(lookups)]
+
+    if db:
+        conn = psycopg2.connect(**DB_CONFIG)
+        cursor = conn.cursor()
+        cursor.execute("DROP SCHEMA IF EXISTS bench_plate_lists CASCADE")
+        cursor.execute("CREATE SCHEMA bench_plate_lists")
+        cursor.execute("SET search_path TO bench_plate_lists, public")
+        cursor.execute(PLATE_LISTS_DDL)
+        cursor.execute(PLATE_LIST_ENTRIES_DDL)
+        conn.commit()
+        start = time.perf_counter()
+        upserted, _, _ = import_plates(conn, 'bench', ([p] for p in plates), policy='free')
+        print(f"[BENCH] COPY import of {upserted} plates: {time.perf_counter() - start:.2f}s")
+        start = time.perf_counter()
+        upserted, _, _ = import_plates(conn, 'bench', ([p] for p in plates), replace=True)
+        print(f"[BENCH] re-import (replace, all unchanged): {time.perf_counter() - start:.2f}s")
+        lists = PlateLists(lambda: conn)
+        start = time.perf_counter()
+        lists.load(conn)
+        print(f"[BENCH] load into memory: {time.perf_counter() - start:.2f}s")
+        cursor.execute("DROP SCHEMA bench_plate_lists CASCADE")
+        conn.commit()
+        conn.close()
+    else:
+        tracemalloc.start()
+        start = time.perf_counter()
+        lists = PlateLists()
+        match = ListMatch('free', 'bench')
+        lists.entries = {plate: match for plate in plates}
+        print(f"[BENCH] built in-memory set of {len(lists)} plates in {time.perf_counter() - start:.2f}s, "
+              f"{tracemalloc.get_traced_memory()[0] / 2 ** 20:.0f} MB on top of the plate strings")
+        tracemalloc.stop()
+
+    p50, p99 = _time_lookups(lists, queries)
+    print(f"[BENCH] {lookups} lookups (half listed): p50 {p50:.2f} us, p99 {p99:.2f} us")
+
+
+# A free-listed car must be able to come back: enter, leave free, enter
+# again, against the lanes' own queries in a scratch schema
+def check_sessions():
+    from lanes import close_free_session, has_active_entry
+    from partitions import LOGS_DDL, PARKING_LOGS_DDL
+
+    plate = 'RAA001A'
+    conn = psycopg2.connect(**DB_CONFIG)
+    cursor = conn.cursor()
+    cursor.execute("DROP SCHEMA IF EXISTS check_plate_lists CASCADE")
+    cursor.execute("CREATE SCHEMA check_plate_lists")
+    cursor.execute("SET search_path TO check_plate_lists, public")
+    cursor.execute(PARKING_LOGS_DDL)
+    cursor.execute("CREATE TABLE parking_logs_default PARTITION OF parking_logs DEFAULT")
+    cursor.execute(LOGS_DDL)        # so the check's log rows stay in the scratch schema
+    cursor.execute("CREATE TABLE logs_default PARTITION OF logs DEFAULT")
+    conn.commit()
+    failures = []
+    try:
+        for visit in (1, 2):
+            if has_active_entry(plate, conn):
+                failures.append(f"visit {visit}: entry refused as a duplicate")
+                break
+            cursor.execute("INSERT INTO parking_logs (plate_number, payment_status, entry_timestamp, exited) "
+                           "VALUES (%s, FALSE, %s, FALSE)", (plate, datetime.now()))
+            conn.commit()
+            if not close_free_session(plate, conn):
+                failures.append(f"visit {visit}: free exit found no open session")
+        cursor.execute("SELECT COUNT(*) FROM parking_logs WHERE exited = FALSE")
+        if cursor.fetchone()[0]:
+            failures.append("sessions left open after free exits")
+    finally:
+        conn.rollback()
+        cursor.execute("DROP SCHEMA check_plate_lists CASCADE")
+        conn.commit()
+        conn.close()
+    for failure in failures:
+        print(f"[FAIL] {failure}")
+    print(f"[CHECK] enter -> free exit -> enter: {'ok' if not failures else 'FAILED'}")
+    return not failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Whitelists, blacklists and season tickets for the lanes")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('init', help="create the plate list tables and change notifications")
+    import_parser = subparsers.add_parser('import', help="bulk-load plates from CSV (plate[,valid_until[,note]])")
+    import_parser.add_argument('list')
+    import_parser.add_argument('csv')
+    import_parser.add_argument('--policy', choices=POLICIES, help="create the list / change its policy")
+    import_parser.add_argument('--description')
+    import_parser.add_argument('--replace', action='store_true', help="remove plates not in the file")
+    subparsers.add_parser('show', help="lists with their policy and size")
+    check_parser = subparsers.add_parser('check', help="what the lanes would do for a plate")
+    check_parser.add_argument('plate')
+    subparsers.add_parser('check-sessions', help="free-listed plates can enter, leave free and enter again")
+    bench_parser = subparsers.add_parser('bench', help="lookup latency (and COPY import / load with --db)")
+    bench_parser.add_argument('--plates', type=int, default=1000000)
+    bench_parser.add_argument('--lookups', type=int, default=200000)
+    bench_parser.add_argument('--db', action='store_true')
+    bench_parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    if args.command == 'bench':
+        bench(args.plates, args.lookups, args.db, args.seed)
+        return
+    if args.command == 'check-sessions':
+        raise SystemExit(0 if check_sessions() else 1)
+    conn = psycopg2.connect(**DB_CONFIG)
+    try:
+        if args.command == 'init':
+            initialize_plate_lists(conn)
+            print("[INIT] Plate list tables ready")
+        elif args.command == 'import':
+            with open(args.csv, newline='') as f:
+                upserted, removed, rejected = import_plates(conn, args.list, csv.reader(f), args.policy,
+                                                            args.replace, args.description)
+            for line_no, text in rejected[:20]:
+                print(f"[WARNING] line {line_no}: not a plate: {text!r}")
+            print(f"[INFO] {upserted} plates imported into {args.list}, {removed} removed, {len(rejected)} rejected")
+        elif args.command == 'show':
+            cursor = conn.cursor()
+            cursor.execute("SELECT l.name, l.policy, COUNT(e.plate_number), l.description FROM plate_lists l "
+                           "LEFT JOIN plate_list_entries e ON e.list_id = l.id GROUP BY l.id ORDER BY l.name")
+            for name, policy, count, description in cursor.fetchall():
+                print(f"{name:<24} {policy:<6} {count:>9}  {description or ''}")
+        elif args.command == 'check':
+            lists = PlateLists(lambda: conn)
+            lists.load(conn)
+            match = lists.lookup(normalize_plate(args.plate))
+            print(f"{normalize_plate(args.plate)}: {match.policy} (list {match.list_name})" if match
+                  else f"{normalize_plate(args.plate)}: not listed")
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
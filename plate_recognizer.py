@@ -0,0 +1,200 @@
+import argparse
+import csv
+import os
+import re
+import statistics
+import time
+
+import cv2
+import numpy as np
+
+# Configuration
+ALPHABET = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789'
+TESSERACT_CONFIG = '--psm 8 --oem 3 -c tessedit_char_whitelist=' + ALPHABET
+TESSERACT_HOCR_CONFIG = TESSERACT_CONFIG + ' -c hocr_char_boxes=1'
+ONNX_MODEL = os.environ.get('PLATE_OCR_MODEL', 'plate_crnn.onnx')
+DEFAULT_BACKEND = os.environ.get('PLATE_OCR_BACKEND', 'tesseract')
+INPUT_HEIGHT = 32
+INPUT_WIDTH = 128
+TOP_K = 3                   # alternatives kept per character position
+CROP_NAME = re.compile(r'^(?P<plate>[A-Z]{2,3}[0-9]{3}[A-Z])_\d{8}_\d{6}')
+HOCR_CHAR = re.compile(r"<span class='ocrx_cinfo'[^>]*title='[^']*x_conf ([\d.]+)[^']*'[^>]*>([^<])</span>")
+
+
+# One OCR result. chars holds per-position alternatives as
+# [[(char, prob), ...], ...] when the backend can provide them.
+class Reading:
+    def __init__(self, text, confidence, processed, chars=None):
+        self.text = text
+        self.confidence = confidence
+        self.processed = processed
+        self.chars = chars
+
+    def __repr__(self):
+        return f"Reading({self.text!r}, {self.confidence:.2f})"
+
+
+# Same grayscale -> blur -> Otsu pipeline the lanes always used
+def preprocess_plate(plate_img):
+    gray = cv2.cvtColor(plate_img, cv2.COLOR_BGR2GRAY) if plate_img.ndim == 3 else plate_img
+    blur = cv2.GaussianBlur(gray, (5, 5), 0)
+    return cv2.threshold(blur, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)[1]
+
+
+class TesseractRecognizer:
+    name = 'tesseract'
+
+    # Imported here so processes that only use the ONNX backend (or just
+    # Reading) never load it
+    def __init__(self):
+        try:
+            import pytesseract
+        except ImportError:
+            raise RuntimeError("pytesseract is not installed (pip install pytesseract)")
+        self.pytesseract = pytesseract
+
+    # hOCR with character boxes gives one x_conf per recognised character,
+    # which the plate decoder uses to weigh alternatives
+    def read(self, plate_img):
+        thresh = preprocess_plate(plate_img)
+        hocr = self.pytesseract.image_to_pdf_or_hocr(thresh, extension='hocr', config=TESSERACT_HOCR_CONFIG)
+        chars = [[(char, float(conf) / 100.0)] for conf, char in HOCR_CHAR.findall(hocr.decode('utf-8'))]
+        if not chars:
+            return Reading('', 0.0, thresh, [])
+        text = ''.join(c[0][0] for c in chars)
+        confidence = min(c[0][1] for c in chars)
+        return Reading(text, confidence, thresh, chars)
+
+    def read_batch(self, plate_imgs):
+        return [self.read(img) for img in plate_imgs]
+
+
+# Small CRNN exported by train_recognizer.py; output is (N, T, len(ALPHABET) + 1)
+# softmax probabilities with the CTC blank at index 0
+class OnnxRecognizer:
+    name = 'onnx'
+
+    def __init__(self, model_path=ONNX_MODEL, threads=1):
+        try:
+            import onnxruntime as ort
+        except ImportError:
+            raise RuntimeError("onnxruntime is not installed (pip install onnxruntime)")
+        if not os.path.isfile(model_path):
+            raise FileNotFoundError(f"OCR model not found: {model_path}")
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = threads
+        options.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(model_path, options, providers=['CPUExecutionProvider'])
+        self.input_name = self.session.get_inputs()[0].name
+
+    @staticmethod
+    def prepare(plate_img):
+        gray = cv2.cvtColor(plate_img, cv2.COLOR_BGR2GRAY) if plate_img.ndim == 3 else plate_img
+        resized = cv2.resize(gray, (INPUT_WIDTH, INPUT_HEIGHT), interpolation=cv2.INTER_AREA)
+        return resized
+
+    def read(self, plate_img):
+        return self.read_batch([plate_img])[0]
+
+    def read_batch(self, plate_imgs):
+        if not plate_imgs:
+            return []
+        prepared = [self.prepare(img) for img in plate_imgs]
+        batch = np.stack(prepared).astype(np.float32)[:, None, :, :] / 255.0
+        probs = self.session.run(None, {self.input_name: batch})[0]
+        return [ctc_decode(p, img) for p, img in zip(probs, prepared)]
+
+
+# Greedy CTC decode keeping the top-k alternatives at each emitted position
+def ctc_decode(probs, processed=None):
+    best = probs.argmax(axis=1)
+    chars, text, confidence = [], [], 1.0
+    previous = 0
+    for t, index in enumerate(best):
+        if index != 0 and index != previous:
+            top = np.argsort(probs[t])[::-1]
+            alternatives = [(ALPHABET[i - 1], float(probs[t, i])) for i in top if i != 0][:TOP_K]
+            chars.append(alternatives)
+            text.append(ALPHABET[index - 1])
+            confidence *= float(probs[t, index])
+        previous = index
+    return Reading(''.join(text), confidence if text else 0.0, processed, chars)
+
+
+def get_recognizer(backend=None, **kwargs):
+    backend = backend or DEFAULT_BACKEND
+    if backend == 'tesseract':
+        return TesseractRecognizer()
+    if backend == 'onnx':
+        return OnnxRecognizer(**kwargs)
+    raise ValueError(f"Unknown OCR backend: {backend}")
+
+
+# ---------------------------------------------------------------------------
+# Accuracy / latency comparison on saved crops
+# ---------------------------------------------------------------------------
+
+# (path, plate) pairs from a corpus labels.tsv or from crop filenames
+def load_labelled_crops(crop_dir, labels=None, limit=None):
+    samples = []
+    if labels:
+        base = os.path.dirname(labels)
+        with open(labels, newline='') as f:
+            for row in csv.reader(f, delimiter='\t'):
+                samples.append((os.path.join(base, row[0]), row[1]))
+    else:
+        for dirpath, _, filenames in os.walk(crop_dir):
+            for filename in sorted(filenames):
+                match = CROP_NAME.match(filename)
+                if match and '_frame_' not in filename:
+                    samples.append((os.path.join(dirpath, filename), match['plate']))
+    return samples[:limit] if limit else samples
+
+
+def compare(backends, samples, batch_size):
+    images = [(cv2.imread(path), plate) for path, plate in samples]
+    images = [(img, plate) for img, plate in images if img is not None]
+    print(f"[COMPARE] {len(images)} labelled crops")
+    print(f"{'backend':<10} {'exact':>7} {'char':>7} {'p50 ms':>8} {'p95 ms':>8} {'mean ms':>8}")
+    for recognizer in backends:
+        latencies, exact, char_hits, char_total = [], 0, 0, 0
+        for i in range(0, len(images), batch_size):
+            chunk = images[i:i + batch_size]
+            start = time.perf_counter()
+            readings = recognizer.read_batch([img for img, _ in chunk])
+            per_plate = (time.perf_counter() - start) * 1000 / len(chunk)
+            latencies.extend([per_plate] * len(chunk))
+            for reading, (_, plate) in zip(readings, chunk):
+                text = reading.text
+                start_idx = text.find("RA")
+                candidate = text[start_idx:start_idx + 7] if start_idx >= 0 else text[:7]
+                exact += candidate == plate
+                char_hits += sum(a == b for a, b in zip(candidate, plate))
+                char_total += len(plate)
+        latencies.sort()
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+        print(f"{recognizer.name:<10} {exact / len(images):>7.1%} {char_hits / char_total:>7.1%} "
+              f"{statistics.median(latencies):>8.2f} {p95:>8.2f} {statistics.mean(latencies):>8.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare plate OCR backends on saved crops")
+    parser.add_argument('--dir', default='plates', help="crops named <PLATE>_<timestamp>.jpg")
+    parser.add_argument('--labels', help="corpus labels.tsv to use instead of file names")
+    parser.add_argument('--backends', default='tesseract,onnx')
+    parser.add_argument('--model', default=ONNX_MODEL)
+    parser.add_argument('--batch-size', type=int, default=16)
+    parser.add_argument('--limit', type=int)
+    args = parser.parse_args()
+
+    backends = []
+    for name in args.backends.split(','):
+        try:
+            backends.append(get_recognizer(name, model_path=args.model) if name == 'onnx' else get_recognizer(name))
+        except (RuntimeError, FileNotFoundError) as e:
+            print(f"[WARNING] Skipping {name}: {e}")
+    compare(backends, load_labelled_crops(args.dir, args.labels, args.limit), args.batch_size)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,332 @@
+import hashlib
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timedelta
+
+import cv2
+import psycopg2
+
+from parking_logger import get_logger
+
+logger = get_logger("plate_store")
+
+# Configuration
+STORE_DIR = 'plates'
+JPEG_QUALITY = 90
+PHASH_MAX_DISTANCE = 6          # bits out of 64; below this two crops are "the same picture"
+RECENT_HASHES_PER_PLATE = 8
+MAX_STORE_BYTES = 2 * 1024 ** 3  # 2 GB
+RETENTION_DAYS = 90
+RETENTION_CHECK_INTERVAL = 600   # seconds between retention sweeps
+QUEUE_SIZE = 64
+
+
+# 64-bit difference hash: robust to JPEG noise and small exposure changes
+def perceptual_hash(img):
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if img.ndim == 3 else img
+    small = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    value = 0
+    for bit in bits:
+        value = (value << 1) | int(bit)
+    return value
+
+
+def hamming_distance(a, b):
+    return bin(a ^ b).count("1")
+
+
+# Postgres BIGINT is signed; store the hash as its two's complement
+def to_signed64(value):
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+
+def to_unsigned64(value):
+    return value + (1 << 64) if value < 0 else value
+
+
+# Sharpness (variance of Laplacian) weighted by crop area
+def crop_quality(img):
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if img.ndim == 3 else img
+    return float(cv2.Laplacian(gray, cv2.CV_64F).var()) * (gray.shape[0] * gray.shape[1]) ** 0.5
+
+
+# Create the evidence table
+def initialize_store_table(conn):
+    cursor = conn.cursor()
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS plate_images (
+            id SERIAL PRIMARY KEY,
+            parking_log_id INTEGER,
+            plate_number VARCHAR(10) NOT NULL,
+            sha256 CHAR(64) NOT NULL,
+            phash BIGINT NOT NULL,
+            path VARCHAR(255) NOT NULL,
+            frame_path VARCHAR(255),
+            box INTEGER[],
+            bytes INTEGER NOT NULL,
+            quality REAL,
+            agreement REAL,
+            created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    # share of the lane's vote that agreed with plate_number
+    cursor.execute("ALTER TABLE plate_images ADD COLUMN IF NOT EXISTS agreement REAL")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_plate_images_log ON plate_images (parking_log_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_plate_images_created ON plate_images (created_at)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_plate_images_sha ON plate_images (sha256)")
+    conn.commit()
+    cursor.close()
+
+
+# Best crop seen for each plate candidate during one vehicle session
+class PlateSession:
+    def __init__(self):
+        self.best = {}
+
+    def offer(self, plate, crop, frame=None, box=None):
+        quality = crop_quality(crop)
+        current = self.best.get(plate)
+        if current is None or quality > current[0]:
+            self.best[plate] = (
+                quality,
+                crop.copy(),
+                frame.copy() if frame is not None else None,
+                tuple(int(v) for v in box) if box is not None else None,
+            )
+
+    def pop(self, plate):
+        entry = self.best.get(plate)
+        self.best.clear()
+        return entry
+
+    def clear(self):
+        self.best.clear()
+
+
+# Writes one deduplicated crop per vehicle session on a background thread
+class EvidenceStore:
+    def __init__(self, connect, root=STORE_DIR, max_bytes=MAX_STORE_BYTES, retention_days=RETENTION_DAYS):
+        self.connect = connect
+        self.root = root
+        self.max_bytes = max_bytes
+        self.retention_days = retention_days
+        self.queue = queue.Queue(maxsize=QUEUE_SIZE)
+        self.recent = {}
+        self.thread = None
+        self.conn = None
+        self.last_retention = 0
+
+    def start(self):
+        self.conn = self.connect()
+        initialize_store_table(self.conn)
+        self.thread = threading.Thread(target=self._run, name="evidence-store", daemon=True)
+        self.thread.start()
+        return self
+
+    # Hand a session's best crop to the writer; never blocks the frame loop
+    def submit(self, parking_log_id, plate, session_entry, agreement=None):
+        if session_entry is None:
+            return False
+        quality, crop, frame, box = session_entry
+        try:
+            self.queue.put_nowait((parking_log_id, plate, quality, crop, frame, box, agreement, datetime.now()))
+            return True
+        except queue.Full:
+            logger.warning("Evidence queue full, dropping crop", extra={"plate": plate})
+            return False
+
+    def close(self, timeout=10):
+        if self.thread:
+            self.queue.put(None)
+            self.thread.join(timeout)
+            self.thread = None
+        if self.conn and not self.conn.closed:
+            self.conn.close()
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            if self.conn is None or self.conn.closed:
+                self._reconnect()
+                if self.conn is None:
+                    logger.error("Database unavailable, dropping crop", extra={"plate": item[1]})
+                    continue
+            try:
+                self._store(*item)
+            except (OSError, psycopg2.Error, cv2.error) as e:
+                logger.error(f"Failed to store evidence: {e}", extra={"plate": item[1]})
+                self._recover(e)
+            if time.time() - self.last_retention > RETENTION_CHECK_INTERVAL:
+                try:
+                    self.enforce_retention()
+                except (OSError, psycopg2.Error) as e:
+                    logger.error(f"Retention sweep failed: {e}")
+                    self._recover(e)
+
+    # Roll back after a failed write; a broken connection (or a rollback
+    # that fails) is replaced instead
+    def _recover(self, error):
+        if not isinstance(error, (psycopg2.OperationalError, psycopg2.InterfaceError)) and not self.conn.closed:
+            try:
+                self.conn.rollback()
+                return
+            except psycopg2.Error as e:
+                logger.warning(f"Evidence store rollback failed: {e}")
+        self._reconnect()
+
+    # Leaves conn None while the database is unreachable; the next crop
+    # tries again
+    def _reconnect(self):
+        if self.conn is not None and not self.conn.closed:
+            try:
+                self.conn.close()
+            except psycopg2.Error:
+                pass
+        self.conn = None
+        try:
+            self.conn = self.connect()
+        except Exception as e:
+            logger.error(f"Evidence store cannot reconnect to the database: {e}")
+            return
+        logger.info("Evidence store reconnected to the database")
+
+    def _shard_dir(self, when):
+        path = os.path.join(self.root, when.strftime('%Y'), when.strftime('%m'), when.strftime('%d'))
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def _write_jpeg(self, directory, name, img):
+        ok, encoded = cv2.imencode('.jpg', img, [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY])
+        if not ok:
+            raise OSError(f"JPEG encoding failed for {name}")
+        data = encoded.tobytes()
+        digest = hashlib.sha256(data).hexdigest()
+        path = os.path.join(directory, f"{name}_{digest[:12]}.jpg")
+        created = not os.path.exists(path)
+        if created:
+            tmp_path = path + ".tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        return path, digest, len(data), created
+
+    # Reuse a recent file when the new crop is a near-duplicate of it
+    def _find_duplicate(self, plate, phash):
+        for known_hash, known in self.recent.get(plate, []):
+            if hamming_distance(known_hash, phash) <= PHASH_MAX_DISTANCE:
+                return known
+        return None
+
+    def _store(self, parking_log_id, plate, quality, crop, frame, box, agreement, when):
+        phash = perceptual_hash(crop)
+        duplicate = self._find_duplicate(plate, phash)
+        written = []
+        try:
+            if duplicate:
+                path, frame_path, digest, size = duplicate
+                logger.debug(f"Near-duplicate crop for {plate}, linking {path}", extra={"plate": plate, "path": path})
+            else:
+                directory = self._shard_dir(when)
+                name = f"{plate}_{when.strftime('%Y%m%d_%H%M%S')}"
+                path, digest, size, created = self._write_jpeg(directory, name, crop)
+                if created:
+                    written.append(path)
+                frame_path = None
+                if frame is not None:
+                    frame_path, _, frame_size, created = self._write_jpeg(directory, name + "_frame", frame)
+                    size += frame_size
+                    if created:
+                        written.append(frame_path)
+
+            cursor = self.conn.cursor()
+            cursor.execute(
+                "INSERT INTO plate_images (parking_log_id, plate_number, sha256, phash, path, frame_path, box, bytes, quality, agreement, created_at) "
+                "VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)",
+                (parking_log_id, plate, digest, to_signed64(phash), path, frame_path,
+                 list(box) if box else None, 0 if duplicate else size, quality, agreement, when)
+            )
+            self.conn.commit()
+            cursor.close()
+        except (OSError, psycopg2.Error, cv2.error):
+            # no row refers to the files this crop wrote
+            for written_path in written:
+                try:
+                    os.remove(written_path)
+                except FileNotFoundError:
+                    pass
+            raise
+        if not duplicate:
+            recent = self.recent.setdefault(plate, [])
+            recent.append((phash, (path, frame_path, digest, size)))
+            del recent[:-RECENT_HASHES_PER_PLATE]
+            logger.info(f"Evidence saved: {path}", extra={"plate": plate, "path": path})
+
+    # A near-duplicate row shares its original's files and records 0 bytes.
+    # When a row that paid for files goes while a duplicate of it stays, the
+    # size moves to the newest remaining row, so SUM(bytes) keeps matching
+    # what is on disk.
+    def _recharge(self, cursor, removed):
+        for path, _, size in removed:
+            if size:
+                cursor.execute(
+                    "UPDATE plate_images SET bytes = %s WHERE id = "
+                    "(SELECT id FROM plate_images WHERE path = %s ORDER BY created_at DESC, id DESC LIMIT 1)",
+                    (size, path)
+                )
+
+    # Drop images past the retention age, then oldest-first until at or
+    # under budget
+    def enforce_retention(self):
+        self.last_retention = time.time()
+        cursor = self.conn.cursor()
+        cutoff = datetime.now() - timedelta(days=self.retention_days)
+        cursor.execute("DELETE FROM plate_images WHERE created_at < %s RETURNING path, frame_path, bytes", (cutoff,))
+        removed = cursor.fetchall()
+        self._recharge(cursor, removed)
+
+        # Recharged bytes land on newer rows, so repeat until the total fits
+        while True:
+            cursor.execute("SELECT COALESCE(SUM(bytes), 0) FROM plate_images")
+            total = cursor.fetchone()[0]
+            if total <= self.max_bytes:
+                break
+            # every row that starts before the excess is used up, including
+            # the one that crosses it
+            cursor.execute("""
+                DELETE FROM plate_images WHERE id IN (
+                    SELECT id FROM (
+                        SELECT id, bytes, SUM(bytes) OVER (ORDER BY created_at, id) AS running FROM plate_images
+                    ) oldest WHERE running - bytes < %s
+                ) RETURNING path, frame_path, bytes
+            """, (total - self.max_bytes,))
+            deleted = cursor.fetchall()
+            if not deleted:
+                break
+            removed += deleted
+            self._recharge(cursor, deleted)
+        self.conn.commit()
+
+        # A deduplicated file may still be referenced by a newer row
+        paths = {p for path, frame_path, _ in removed for p in (path, frame_path) if p}
+        if paths:
+            cursor.execute(
+                "SELECT path FROM plate_images WHERE path = ANY(%s) UNION SELECT frame_path FROM plate_images WHERE frame_path = ANY(%s)",
+                (list(paths), list(paths))
+            )
+            paths -= {row[0] for row in cursor.fetchall()}
+        cursor.close()
+
+        for path in paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        for plate, recent in self.recent.items():
+            recent[:] = [item for item in recent if item[1][0] not in paths]
+        if paths:
+            logger.info(f"Retention removed {len(paths)} evidence files")
@@ -5,9 +5,15 @@ import serial.tools.list_ports
 import platform
 from datetime import datetime
 import re
-import math
+from parking_logger import get_logger
+from partitions import fetch_session
+from local_store import publish_exit_authorization
+from tariff import current_tariff
 
-RATE_PER_HOUR = 500
+logger = get_logger("process_payment")
+
+SERIAL_READY_MARKER = "==== PAYMENT MODE RFID ===="  # banner printed at the end of setup()
+SERIAL_READY_TIMEOUT = 6
 PLATE_PATTERN = r'^RA[A-Z][0-9]{3}[A-Z]$'
 DB_CONFIG = {
     'host': 'localhost',
@@ -25,9 +31,7 @@ def get_db_connection():
         return psycopg2.connect(**DB_CONFIG)
     except psycopg2.Error as e:
         print(f"[ERROR] Database connection failed: {e}")
-        with open("serial_log.txt", "a") as log_file:
-            log_file.write(f"{datetime.now()}: Database connection failed: {e}\n")
-            log_file.flush()
+        logger.error(f"Database connection failed: {e}")
         exit()
 
 def log_event(plate, event_type, message, conn):
@@ -38,40 +42,30 @@ def log_event(plate, event_type, message, conn):
     )
     conn.commit()
     cursor.close()
-    with open("serial_log.txt", "a") as log_file:
-        log_file.write(f"{datetime.now()}: Logged event: {event_type} for {plate} - {message}\n")
-        log_file.flush()
+    logger.info(f"Logged event: {event_type} for {plate} - {message}", extra={"plate": plate, "event": event_type})
 
 def detect_arduino_port():
     ports = list(serial.tools.list_ports.comports())
     print(f"[DEBUG] Available ports: {[port.device + ' (' + port.description + ')' for port in ports]}")
-    with open("serial_log.txt", "a") as log_file:
-        log_file.write(f"{datetime.now()}: Available ports: {[port.device + ' (' + port.description + ')' for port in ports]}\n")
-        log_file.flush()
+    logger.debug(f"Available ports: {[port.device + ' (' + port.description + ')' for port in ports]}")
     for port in ports:
         if port.device == "COM4":  # Explicitly select COM4 for payment
             print(f"[INFO] Selected payment Arduino port: {port.device} ({port.description})")
             return port.device
     print("[ERROR] COM4 not found for payment")
-    with open("serial_log.txt", "a") as log_file:
-        log_file.write(f"{datetime.now()}: COM4 not found for payment\n")
-        log_file.flush()
+    logger.warning("COM4 not found for payment")
     return None
 
 def parse_arduino_data(line):
     print(f"[DEBUG] Raw input: '{line}'")
-    with open("serial_log.txt", "a") as log_file:
-        log_file.write(f"{datetime.now()}: Raw input: {line}\n")
-        log_file.flush()
+    logger.debug(f"Raw input: {line}")
     if "[TIMEOUT]" in line:
         print(f"[INFO] Arduino timed out, ignoring: {line}")
         return None, None
     try:
         parts = line.strip().split(',')
         print(f"[DEBUG] Parsed parts: {parts}")
-        with open("serial_log.txt", "a") as log_file:
-            log_file.write(f"{datetime.now()}: Parsed parts: {parts}\n")
-            log_file.flush()
+        logger.debug(f"Parsed parts: {parts}")
         if len(parts) != 2:
             print(f"[ERROR] Invalid data format: {line}")
             return None, None
@@ -96,28 +90,22 @@ def trigger_buzzer(ser):
             ser.write(b'2')
             ser.flush()
             print(f"[BUZZER] Buzzer activated")
-            with open("serial_log.txt", "a") as log_file:
-                log_file.write(f"{datetime.now()}: Buzzer activated\n")
-                log_file.flush()
+            logger.info("Buzzer activated")
             time.sleep(1.5)  # Match Arduino's 3x(250ms on + 250ms off)
             print(f"[BUZZER] Buzzer deactivated")
-            with open("serial_log.txt", "a") as log_file:
-                log_file.write(f"{datetime.now()}: Buzzer deactivated\n")
-                log_file.flush()
+            logger.info("Buzzer deactivated")
     except serial.SerialException as e:
         print(f"[ERROR] Failed to trigger buzzer: {e}")
-        with open("serial_log.txt", "a") as log_file:
-            log_file.write(f"{datetime.now()}: Failed to trigger buzzer: {e}\n")
-            log_file.flush()
+        logger.error(f"Failed to trigger buzzer: {e}")
 
 def process_payment(plate, balance, ser, conn):
     try:
         cursor = conn.cursor()
-        cursor.execute(
-            "SELECT id, entry_timestamp FROM parking_logs WHERE plate_number = %s AND payment_status = FALSE",
+        result = fetch_session(
+            cursor,
+            "SELECT id, entry_timestamp FROM parking_logs WHERE plate_number = %s AND payment_status = FALSE AND entry_timestamp >= %s",
             (plate,)
         )
-        result = cursor.fetchone()
         if not result:
             print(f"[PAYMENT] Plate {plate} not found or already paid")
             log_event(plate, "Payment", f"Payment attempt for {plate} failed: no unpaid entry", conn)
@@ -126,18 +114,14 @@ def process_payment(plate, balance, ser, conn):
 
         entry_id, entry_time = result
         exit_time = datetime.now()
-        hours_spent = (exit_time - entry_time).total_seconds() / 3600  # Convert to hours
-        hours_charged = math.ceil(hours_spent)  # Round up to next hour
-        amount_due = hours_charged * RATE_PER_HOUR
+        amount_due = current_tariff().fee(entry_time, exit_time)  # tariff.json: bands, grace, daily cap
 
         if balance < amount_due:
             print(f"[PAYMENT] Insufficient balance: {balance} < {amount_due}")
             ser.write(b'I\n')
             ser.flush()
             log_event(plate, "Payment", f"Cannot process payment: {balance} < {amount_due} for {plate}", conn)
-            with open("serial_log.txt", "a") as log_file:
-                log_file.write(f"{datetime.now()}: Sent: I\n")
-                log_file.flush()
+            logger.info("Sent: I", extra={"plate": plate})
             trigger_buzzer(ser)
             cursor.close()
             return
@@ -151,17 +135,13 @@ def process_payment(plate, balance, ser, conn):
             if ser.in_waiting:
                 arduino_response = ser.readline().decode().strip()
                 print(f"[ARDUINO] Received: {arduino_response}")
-                with open("serial_log.txt", "a") as log_file:
-                    log_file.write(f"{datetime.now()}: Received: {arduino_response}\n")
-                    log_file.flush()
+                logger.debug(f"Received: {arduino_response}")
                 if arduino_response == "READY":
                     break
             if time.time() - start_time > 10:
                 print(f"[ERROR] Timeout waiting for Arduino READY")
                 log_event(plate, "Error", f"Payment timeout for {plate}: Arduino not ready", conn)
-                with open("serial_log.txt", "a") as log_file:
-                    log_file.write(f"{datetime.now()}: Timeout waiting for READY\n")
-                    log_file.flush()
+                logger.warning("Timeout waiting for READY", extra={"plate": plate})
                 trigger_buzzer(ser)
                 cursor.close()
                 return
@@ -170,9 +150,7 @@ def process_payment(plate, balance, ser, conn):
         ser.write(f"{new_balance}\r\n".encode())
         ser.flush()
         print(f"[PAYMENT] Sent new balance: {new_balance}")
-        with open("serial_log.txt", "a") as log_file:
-            log_file.write(f"{datetime.now()}: Sent new balance: {new_balance}\n")
-            log_file.flush()
+        logger.info(f"Sent new balance: {new_balance}", extra={"plate": plate})
 
         start_time = time.time()
         print("[INFO] Waiting for Arduino confirmation...")
@@ -180,30 +158,25 @@ def process_payment(plate, balance, ser, conn):
             if ser.in_waiting:
                 confirm = ser.readline().decode().strip()
                 print(f"[ARDUINO] {confirm}")
-                with open("serial_log.txt", "a") as log_file:
-                    log_file.write(f"{datetime.now()}: Received: {confirm}\n")
-                    log_file.flush()
+                logger.debug(f"Received: {confirm}")
                 if "DONE" in confirm:
                     print("[INFO] Write confirmed")
                     cursor.execute(
-                        "UPDATE parking_logs SET payment_status = TRUE, exit_timestamp = %s, amount = %s WHERE id = %s",
-                        (exit_time, amount_due, entry_id)
+                        "UPDATE parking_logs SET payment_status = TRUE, exit_timestamp = %s, amount = %s WHERE id = %s AND entry_timestamp = %s",
+                        (exit_time, amount_due, entry_id, entry_time)
                     )
                     conn.commit()
+                    publish_exit_authorization(plate, entry_id, entry_time)
                     log_event(plate, "Payment", f"Payment of {amount_due} successful for {plate}", conn)
                     cursor.close()
                     print(f"[PAYMENT] Successfully processed for {plate}, Amount: {amount_due}")
                     print("[EXIT] Payment completed, stopping application")
-                    with open("serial_log.txt", "a") as log_file:
-                        log_file.write(f"{datetime.now()}: Payment completed, stopping application\n")
-                        log_file.flush()
+                    logger.info("Payment completed, stopping application", extra={"plate": plate})
                     raise PaymentComplete(f"Payment completed for {plate}")
             if time.time() - start_time > 10:
                 print(f"[ERROR] Timeout waiting for Arduino confirmation")
                 log_event(plate, "Error", f"Payment confirmation timeout for {plate}", conn)
-                with open("serial_log.txt", "a") as log_file:
-                    log_file.write(f"{datetime.now()}: Timeout waiting for confirmation\n")
-                    log_file.flush()
+                logger.warning("Timeout waiting for confirmation", extra={"plate": plate})
                 trigger_buzzer(ser)
                 cursor.close()
                 return
@@ -218,46 +191,48 @@ def process_payment(plate, balance, ser, conn):
         print(f"[ERROR] Unexpected error in payment processing: {e}")
         log_event(plate, "Payment", f"Unexpected payment error for {plate}: {str(e)}", conn)
 
+# Wait for the reader's banner after the reset that opening the port causes,
+# instead of always sleeping the worst case
+def wait_for_reader(ser, timeout=SERIAL_READY_TIMEOUT):
+    start = time.time()
+    while time.time() - start < timeout:
+        line = ser.readline().decode(errors='ignore').strip()
+        if SERIAL_READY_MARKER in line:
+            return True
+    return False
+
 def connect_serial():
     retry_attempts = 5
     for attempt in range(retry_attempts):
         port = detect_arduino_port()
         if not port:
             print(f"[ERROR] Arduino not found, retrying ({attempt + 1}/{retry_attempts})...")
-            with open("serial_log.txt", "a") as log_file:
-                log_file.write(f"{datetime.now()}: Arduino not found, retrying ({attempt + 1}/{retry_attempts})\n")
-                log_file.flush()
+            logger.warning(f"Arduino not found, retrying ({attempt + 1}/{retry_attempts})")
             time.sleep(1)
             continue
         try:
-            ser = serial.Serial(port, 9600, timeout=3)
-            time.sleep(6)  # Allow Arduino reset
+            ser = serial.Serial(port, 9600, timeout=1)
+            if not wait_for_reader(ser):
+                logger.warning(f"No banner from reader within {SERIAL_READY_TIMEOUT}s", extra={"port": port})
+            ser.timeout = 3
             ser.reset_input_buffer()
             ser.reset_output_buffer()
             print(f"[CONNECTED] Listening on {port}")
-            with open("serial_log.txt", "a") as log_file:
-                log_file.write(f"{datetime.now()}: Connected to {port}\n")
-                log_file.flush()
+            logger.info(f"Connected to {port}", extra={"port": port})
             return ser
         except serial.SerialException as e:
             print(f"[ERROR] Serial connection failed on {port}: {e}")
-            with open("serial_log.txt", "a") as log_file:
-                log_file.write(f"{datetime.now()}: Serial connection failed on {port}: {e}\n")
-                log_file.flush()
+            logger.error(f"Serial connection failed on {port}: {e}", extra={"port": port})
             time.sleep(1)
     print(f"[ERROR] Failed to connect to Arduino after {retry_attempts} attempts")
-    with open("serial_log.txt", "a") as log_file:
-        log_file.write(f"{datetime.now()}: Failed to connect to Arduino after {retry_attempts} attempts\n")
-        log_file.flush()
+    logger.error(f"Failed to connect to Arduino after {retry_attempts} attempts")
     return None
 
 def main():
     conn = get_db_connection()
     ser = None
     payment_completed = False  # Flag to stop serial processing after payment
-    with open("serial_log.txt", "a") as log_file:
-        log_file.write(f"{datetime.now()}: Program started\n")
-        log_file.flush()
+    logger.info("Program started")
     try:
         while True:
             try:
@@ -270,9 +245,7 @@ def main():
                         continue
                 if ser.in_waiting:
                     line = ser.readline().decode().strip()
-                    with open("serial_log.txt", "a") as log_file:
-                        log_file.write(f"{datetime.now()}: Received: {line}\n")
-                        log_file.flush()
+                    logger.debug(f"Received: {line}")
                     print(f"[SERIAL] Received: {line}")
                     plate, balance = parse_arduino_data(line)
                     if plate and balance is not None:
@@ -280,46 +253,32 @@ def main():
                 time.sleep(0.1)
             except serial.SerialException as e:
                 print(f"[ERROR] Serial error: {e}")
-                with open("serial_log.txt", "a") as log_file:
-                    log_file.write(f"{datetime.now()}: Serial error: {e}\n")
-                    log_file.flush()
+                logger.error(f"Serial error: {e}")
                 if ser and ser.is_open:
                     ser.close()
                 ser = None
                 time.sleep(1)
             except PaymentComplete as e:
                 print(f"[EXIT] {e}")
-                with open("serial_log.txt", "a") as log_file:
-                    log_file.write(f"{datetime.now()}: {e}\n")
-                    log_file.flush()
+                logger.info(str(e))
                 payment_completed = True
                 break
             except KeyboardInterrupt:
                 print(f"[EXIT] Program terminated by user")
-                with open("serial_log.txt", "a") as log_file:
-                    log_file.write(f"{datetime.now()}: Program terminated by user\n")
-                    log_file.flush()
+                logger.info("Program terminated by user")
                 break
             except Exception as e:
                 print(f"[ERROR] Unexpected error in main loop: {e}")
-                with open("serial_log.txt", "a") as log_file:
-                    log_file.write(f"{datetime.now()}: Unexpected error in main loop: {e}\n")
-                    log_file.flush()
+                logger.error(f"Unexpected error in main loop: {e}")
                 time.sleep(1)
     finally:
         if ser and ser.is_open:
             ser.close()
-            with open("serial_log.txt", "a") as log_file:
-                log_file.write(f"{datetime.now()}: Serial port closed\n")
-                log_file.flush()
+            logger.info("Serial port closed")
         conn.close()
-        with open("serial_log.txt", "a") as log_file:
-            log_file.write(f"{datetime.now()}: Database connection closed\n")
-            log_file.flush()
+        logger.info("Database connection closed")
         print("[CLEANUP] Application terminated")
-        with open("serial_log.txt", "a") as log_file:
-            log_file.write(f"{datetime.now()}: Application terminated\n")
-            log_file.flush()
+        logger.info("Application terminated")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
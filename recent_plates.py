@@ -0,0 +1,139 @@
+import argparse
+import heapq
+import random
+import time
+
+# Configuration
+ENTRY_COOLDOWN = 300            # 5 minutes before the same plate may enter again
+DUPLICATE_LOG_WINDOW = 60       # repeated attempts inside this window become one log row
+
+
+# Plates admitted in the last ENTRY_COOLDOWN seconds, for any number of cars
+# at once. Expiry is a min-heap of (expires_at, plate); re-admitting a plate
+# leaves its old heap entry behind, which is dropped when it surfaces because
+# it no longer matches the map. Duplicate attempts are counted per plate and
+# handed back once per window, so a car idling in front of the camera costs
+# one log row a minute instead of one per read.
+class RecentPlates:
+    def __init__(self, ttl=ENTRY_COOLDOWN, window=DUPLICATE_LOG_WINDOW):
+        self.ttl = ttl
+        self.window = window
+        self.expires = {}
+        self.heap = []
+        self.attempts = {}      # plate -> [window closes at, count, reason]
+        self.windows = []
+
+    def __len__(self):
+        return len(self.expires)
+
+    def expire(self, now):
+        while self.heap and self.heap[0][0] <= now:
+            expires_at, plate = heapq.heappop(self.heap)
+            if self.expires.get(plate) == expires_at:
+                del self.expires[plate]
+
+    def seen(self, plate, now=None):
+        now = time.time() if now is None else now
+        self.expire(now)
+        return plate in self.expires
+
+    def admit(self, plate, now=None):
+        now = time.time() if now is None else now
+        self.expire(now)
+        expires_at = now + self.ttl
+        self.expires[plate] = expires_at
+        heapq.heappush(self.heap, (expires_at, plate))
+
+    # Count a suppressed attempt; the first one opens the plate's log window
+    def duplicate(self, plate, reason, now=None):
+        now = time.time() if now is None else now
+        pending = self.attempts.get(plate)
+        if pending is None:
+            closes_at = now + self.window
+            self.attempts[plate] = [closes_at, 1, reason]
+            heapq.heappush(self.windows, (closes_at, plate))
+        else:
+            pending[1] += 1
+
+    # (plate, count, reason) for every window that has closed
+    def due(self, now=None):
+        now = time.time() if now is None else now
+        closed = []
+        while self.windows and self.windows[0][0] <= now:
+            _, plate = heapq.heappop(self.windows)
+            _, count, reason = self.attempts.pop(plate)
+            closed.append((plate, count, reason))
+        return closed
+
+    # Everything still counting, for shutdown
+    def drain(self):
+        closed = [(plate, count, reason) for plate, (_, count, reason) in self.attempts.items()]
+        self.attempts.clear()
+        self.windows.clear()
+        return closed
+
+
+# ---------------------------------------------------------------------------
+# Congestion benchmark
+# ---------------------------------------------------------------------------
+
+# A queue of cars at an entry gate, each read `reads` times after it is let
+# in (lingering under the camera, or coming round again). Compares the old
+# single last_saved_plate cooldown with RecentPlates on re-inserted sessions
+# and logs rows written.
+def bench(cars, reads, fps, seed):
+    rng = random.Random(seed)
+    plates = [f"RA{chr(65 + i % 26)}{i % 1000:03d}{chr(65 + i // 1000 % 26)}" for i in range(cars)]
+    events = []
+    now = 0.0
+    for plate in plates:
+        now += rng.uniform(5, 20)
+        for k in range(reads):
+            events.append((now + k / fps + rng.uniform(0, 30) * (k > 0), plate))
+    events.sort()
+
+    last_plate, last_time = None, 0.0
+    old_inserts = old_logs = 0
+    for at, plate in events:
+        if plate != last_plate or at - last_time > ENTRY_COOLDOWN:
+            old_inserts += 1
+            old_logs += 1
+            last_plate, last_time = plate, at
+        else:
+            old_logs += 1
+
+    recent = RecentPlates()
+    new_inserts = new_logs = 0
+    start = time.perf_counter()
+    for at, plate in events:
+        new_logs += len(recent.due(at))
+        if recent.seen(plate, at):
+            recent.duplicate(plate, "cooldown", at)
+        else:
+            recent.admit(plate, at)
+            new_inserts += 1
+            new_logs += 1
+    new_logs += len(recent.drain())
+    elapsed = time.perf_counter() - start
+
+    print(f"[BENCH] {cars} cars, {len(events)} reads")
+    print(f"[BENCH] last_saved_plate: {old_inserts} entries ({old_inserts - cars} duplicate sessions), "
+          f"{old_logs} log rows")
+    print(f"[BENCH] RecentPlates:     {new_inserts} entries ({new_inserts - cars} duplicate sessions), "
+          f"{new_logs} log rows, {elapsed / len(events) * 1e6:.2f} us per read")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time-windowed duplicate suppression for entry lanes")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    bench_parser = subparsers.add_parser('bench', help="duplicate sessions and log rows under congestion")
+    bench_parser.add_argument('--cars', type=int, default=500)
+    bench_parser.add_argument('--reads', type=int, default=20)
+    bench_parser.add_argument('--fps', type=float, default=10)
+    bench_parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+    bench(args.cars, args.reads, args.fps, args.seed)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,221 @@
+import argparse
+import re
+import statistics
+import time
+from collections import Counter
+from datetime import datetime
+
+import cv2
+
+from frame_quality import MIN_QUALITY, SELECT_TOP_K, score_crop
+from harvest_crops import iter_crops, group_passes
+from plate_decoder import MIN_CONFIDENCE, decode_plate, legacy_slice
+from plate_recognizer import Reading, get_recognizer, ONNX_MODEL
+from plate_store import STORE_DIR
+
+# Configuration (mirrors the lanes' voting rule)
+VOTE_READINGS = 3
+VOTE_MIN_AGREEMENT = 2
+SELECT_WINDOW_CROPS = 4     # saved crops carry second-resolution times, so windows are counted in crops
+PLATE_PATTERN = r'^[A-Z]{2,3}[0-9]{3}[A-Z]$'
+# OCR strings the decoder has got wrong before, with the plate (or None) it
+# must produce; replayed before the saved crops
+TEXT_CASES = [
+    ('RAB123C', 'RAB123C'),
+    ('XRAB123C', 'RAB123C'),
+    ('RAB1Z3C', 'RAB123C'),
+    ('RAB1234C', 'RAB123C'),     # a spurious digit, not a '4' read as the final letter
+    ('RAB1234', None),
+    ('RAB123', None),
+]
+TEXT_CASE_CONFIDENCE = 0.84
+CALIBRATION_PRECISION = 0.99    # share of accepted single reads that must be the right plate
+
+
+# Saved crops grouped into lane passes; truth is the pass's majority label
+def load_passes(src, since=None, until=None, limit=None):
+    samples = [{'path': path, 'plate': plate, 'taken': taken} for path, plate, taken in iter_crops(src, since, until)]
+    passes = []
+    for lane_pass in group_passes(samples):
+        truth = Counter(s['plate'] for s in lane_pass).most_common(1)[0][0]
+        passes.append((truth, lane_pass))
+        if limit and len(passes) >= limit:
+            break
+    return passes
+
+
+def legacy_candidate(reading):
+    return legacy_slice(reading.text)
+
+
+def decoder_candidate(reading):
+    decoded = decode_plate(reading)
+    return decoded.text if decoded else None
+
+
+STRATEGIES = {
+    'legacy-slice': legacy_candidate,
+    'constrained': decoder_candidate,
+}
+
+
+# Feed one pass through a strategy exactly like the lane loop does: valid
+# candidates accumulate, a decision needs VOTE_READINGS reads with a
+# VOTE_MIN_AGREEMENT majority
+def simulate(readings, extract, is_valid):
+    buffer = []
+    for frames, reading in enumerate(readings, 1):
+        candidate = extract(reading)
+        if not candidate or not is_valid(candidate):
+            continue
+        buffer.append(candidate)
+        if len(buffer) >= VOTE_READINGS:
+            plate, count = Counter(buffer).most_common(1)[0]
+            if count >= VOTE_MIN_AGREEMENT:
+                return plate, frames
+    return None, len(readings)
+
+
+# Which crops of a pass reach OCR, in order: every crop, or the best top_k
+# of each window of consecutive crops as CropSelector does in the lanes
+def select_crops(scores, selection, window, top_k):
+    if selection == 'all':
+        return list(range(len(scores)))
+    order = []
+    for start in range(0, len(scores), window):
+        chunk = range(start, min(start + window, len(scores)))
+        best = sorted((i for i in chunk if scores[i] >= MIN_QUALITY), key=lambda i: -scores[i])[:top_k]
+        order.extend(best)
+    return order
+
+
+# Known OCR strings through the constrained decoder; returns the mismatches.
+# The same strings without a confidence must never be accepted.
+def check_text_cases(cases=TEXT_CASES, confidence=TEXT_CASE_CONFIDENCE):
+    mismatches = 0
+    for text, expected in cases:
+        decoded = decode_plate(Reading(text, confidence, None))
+        got = decoded.text if decoded else None
+        if got != expected:
+            mismatches += 1
+            print(f"[REPLAY] {text!r}: decoded {got!r} ({decoded.confidence:.2f}), expected {expected!r}"
+                  if decoded else f"[REPLAY] {text!r}: no decode, expected {expected!r}")
+        if decode_plate(Reading(text, 0.0, None)):
+            mismatches += 1
+            print(f"[REPLAY] {text!r}: accepted without any OCR confidence")
+    print(f"[REPLAY] {len(cases)} text cases, {mismatches} mismatches")
+    return mismatches
+
+
+# Where MIN_CONFIDENCE belongs on this backend's confidence scale: every
+# read is decoded with the threshold off, and the suggestion is the lowest
+# threshold at which CALIBRATION_PRECISION of the accepted reads are the
+# pass's plate
+def calibrate(pass_readings, backend, precision=CALIBRATION_PRECISION):
+    scored = []
+    for truth, readings, _ in pass_readings:
+        for reading in readings:
+            decoded = decode_plate(reading, min_confidence=0.0)
+            if decoded:
+                scored.append((decoded.confidence, decoded.text == truth))
+    if not scored:
+        print(f"[CALIBRATE] {backend}: no decodable reads")
+        return None
+    scored.sort(key=lambda s: -s[0])
+    suggestion, accepted, right = None, 0, 0
+    for k, (confidence, correct) in enumerate(scored, 1):
+        right += correct
+        if right / k >= precision:
+            suggestion, accepted = confidence, k
+    for label, values in (('right', [c for c, ok in scored if ok]), ('wrong', [c for c, ok in scored if not ok])):
+        if values:
+            values.sort()
+            print(f"[CALIBRATE] {backend} {label} reads: {len(values)}, confidence p10 "
+                  f"{values[len(values) // 10]:.2f}, p50 {statistics.median(values):.2f}, "
+                  f"p90 {values[len(values) * 9 // 10]:.2f}")
+    if suggestion is None:
+        print(f"[CALIBRATE] {backend}: no threshold reaches {precision:.0%} precision")
+        return None
+    current = sum(1 for c, _ in scored if c >= MIN_CONFIDENCE)
+    print(f"[CALIBRATE] {backend}: PLATE_MIN_CONFIDENCE={suggestion:.2f} accepts {accepted / len(scored):.1%} "
+          f"of decodable reads at {precision:.0%} precision (current {MIN_CONFIDENCE:.2f} accepts "
+          f"{current / len(scored):.1%})")
+    return suggestion
+
+
+def run(passes, recognizer, strategies, selections=('all',), window=SELECT_WINDOW_CROPS, top_k=SELECT_TOP_K,
+        calibration=False):
+    pattern = re.compile(PLATE_PATTERN)
+
+    def is_valid(plate):
+        return bool(pattern.match(plate))
+
+    ocr_ms, pass_readings = [], []
+    for truth, lane_pass in passes:
+        readings, scores = [], []
+        for sample in lane_pass:
+            img = cv2.imread(sample['path'])
+            if img is None:
+                continue
+            scores.append(score_crop(img).score)
+            start = time.perf_counter()
+            readings.append(recognizer.read(img))
+            ocr_ms.append((time.perf_counter() - start) * 1000)
+        pass_readings.append((truth, readings, scores))
+
+    if calibration:
+        calibrate(pass_readings, recognizer.name)
+    total_frames = sum(len(r) for _, r, _ in pass_readings)
+    print(f"[REPLAY] {len(pass_readings)} passes, {total_frames} crops, backend {recognizer.name}, "
+          f"OCR p50 {statistics.median(ocr_ms) if ocr_ms else 0:.1f} ms")
+    print(f"{'selection':<10} {'strategy':<14} {'decided':>8} {'correct':>8} {'OCR/plate':>10} "
+          f"{'first read':>11} {'valid reads':>12}")
+    results = {}
+    for selection in selections:
+        for name in strategies:
+            extract = STRATEGIES[name]
+            decided, correct, ocr_calls, first_right, valid_reads, read_total = 0, 0, [], 0, 0, 0
+            for truth, readings, scores in pass_readings:
+                chosen = [readings[i] for i in select_crops(scores, selection, window, top_k)]
+                read_total += len(chosen)
+                valid_reads += sum(1 for r in chosen if (c := extract(r)) and is_valid(c))
+                first_right += bool(chosen) and extract(chosen[0]) == truth
+                plate, frames = simulate(chosen, extract, is_valid)
+                ocr_calls.append(frames)
+                if plate:
+                    decided += 1
+                    correct += plate == truth
+            n = max(len(pass_readings), 1)
+            label = selection if selection == 'all' else f"top{top_k}/{window}"
+            print(f"{label:<10} {name:<14} {decided / n:>8.1%} {correct / n:>8.1%} "
+                  f"{statistics.mean(ocr_calls) if ocr_calls else 0:>10.2f} {first_right / n:>11.1%} "
+                  f"{valid_reads / max(read_total, 1):>12.1%}")
+            results[(selection, name)] = {'decided': decided, 'correct': correct,
+                                          'ocr_per_plate': statistics.mean(ocr_calls) if ocr_calls else 0}
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay saved plate crops through the lane decision logic")
+    parser.add_argument('--src', default=STORE_DIR)
+    parser.add_argument('--backend', help="tesseract or onnx (default: PLATE_OCR_BACKEND)")
+    parser.add_argument('--model', default=ONNX_MODEL)
+    parser.add_argument('--strategies', default=','.join(STRATEGIES))
+    parser.add_argument('--since', type=datetime.fromisoformat)
+    parser.add_argument('--until', type=datetime.fromisoformat)
+    parser.add_argument('--limit', type=int, help="maximum number of passes")
+    parser.add_argument('--selections', default='all,top-k', help="crop selection: all, top-k")
+    parser.add_argument('--window', type=int, default=SELECT_WINDOW_CROPS, help="crops per selection window")
+    parser.add_argument('--top-k', type=int, default=SELECT_TOP_K)
+    parser.add_argument('--calibrate', action='store_true', help="suggest MIN_CONFIDENCE for this backend")
+    args = parser.parse_args()
+
+    check_text_cases()
+    recognizer = get_recognizer(args.backend, model_path=args.model) if args.backend == 'onnx' \
+        else get_recognizer(args.backend)
+    run(load_passes(args.src, args.since, args.until, args.limit), recognizer, args.strategies.split(','),
+        args.selections.split(','), args.window, args.top_k, args.calibrate)
+
+
+if __name__ == '__main__':
+    main()
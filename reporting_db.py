@@ -0,0 +1,292 @@
+import argparse
+import json
+import os
+import random
+import statistics
+import threading
+import time
+from datetime import datetime
+
+import psycopg2
+import psycopg2.errors
+import psycopg2.pool
+
+from parking_logger import get_logger
+
+logger = get_logger("reporting_db")
+
+# Configuration
+DB_CONFIG = {
+    'host': 'localhost',
+    'user': 'postgres',
+    'password': '1234',
+    'dbname': 'parking_system'
+}
+# libpq connection string of a streaming replica; unset, reports run on the
+# primary under the same guards
+REPORTING_DSN = os.environ.get('PARKING_REPORTING_DSN')
+# Schemas searched ahead of public, e.g. "rollup" once summary tables exist
+REPORTING_SCHEMA = os.environ.get('PARKING_REPORTING_SCHEMA')
+STATEMENT_TIMEOUT_MS = int(os.environ.get('PARKING_REPORT_TIMEOUT_MS', '2000'))
+LOCK_TIMEOUT_MS = 500       # never queue behind partition DDL, which lane writes would then queue behind
+MAX_QUERY_COST = float(os.environ.get('PARKING_REPORT_MAX_COST', '50000'))   # planner cost units
+COST_CACHE_SECONDS = 60     # an EXPLAIN per distinct statement per minute, not per request
+REPORT_POOL_MAX = 2         # report connections the primary will ever see from one process
+APPLICATION_NAME = 'parking-report'
+REPLICA_RETRY_SECONDS = 30
+
+
+class QueryRejected(Exception):
+    pass
+
+
+def session_options(schema=REPORTING_SCHEMA, timeout_ms=STATEMENT_TIMEOUT_MS):
+    options = [f"-c statement_timeout={timeout_ms}", f"-c lock_timeout={LOCK_TIMEOUT_MS}",
+               "-c default_transaction_read_only=on"]
+    if schema:
+        options.append(f"-c search_path={schema.replace(' ', '')},public")
+    return ' '.join(options)
+
+
+# One read-only session for batch reports that stream with a server-side
+# cursor: the replica when configured, else the primary
+def reporting_connection(timeout_ms=STATEMENT_TIMEOUT_MS, schema=REPORTING_SCHEMA):
+    options = session_options(schema, timeout_ms)
+    if REPORTING_DSN:
+        try:
+            return psycopg2.connect(REPORTING_DSN, options=options, application_name=APPLICATION_NAME)
+        except psycopg2.OperationalError as e:
+            logger.warning(f"Reporting replica unreachable, using the primary: {e}")
+    return psycopg2.connect(**DB_CONFIG, options=options, application_name=APPLICATION_NAME)
+
+
+# Read-only access for the dashboard and reports, kept off the lanes' decision
+# path: queries go to the replica when one is configured (falling back to the
+# primary while it is unreachable), every session is read-only with a
+# statement and lock timeout, a small pool caps how many report queries the
+# primary runs at once, and a query whose planned cost is over the limit is
+# refused before it runs.
+class ReportingDB:
+    def __init__(self, dsn=REPORTING_DSN, schema=REPORTING_SCHEMA, timeout_ms=STATEMENT_TIMEOUT_MS,
+                 max_cost=MAX_QUERY_COST, max_connections=REPORT_POOL_MAX):
+        self.dsn = dsn
+        self.options = session_options(schema, timeout_ms)
+        self.max_cost = max_cost
+        self.max_connections = max_connections
+        self.lock = threading.Lock()
+        self.slots = threading.BoundedSemaphore(max_connections)
+        self.pools = {}
+        self.replica_down_until = 0
+        self.costs = {}
+
+    def _pool(self, target):
+        with self.lock:
+            pool = self.pools.get(target)
+            if pool is None:
+                kwargs = dict(options=self.options, application_name=APPLICATION_NAME)
+                if target == 'replica':
+                    pool = psycopg2.pool.ThreadedConnectionPool(0, self.max_connections, self.dsn, **kwargs)
+                else:
+                    pool = psycopg2.pool.ThreadedConnectionPool(0, self.max_connections, **DB_CONFIG, **kwargs)
+                self.pools[target] = pool
+            return pool
+
+    # ('replica' | 'primary', pool, connection)
+    def _connect(self):
+        if self.dsn and time.time() >= self.replica_down_until:
+            pool = self._pool('replica')
+            try:
+                return 'replica', pool, pool.getconn()
+            except psycopg2.OperationalError as e:
+                self.replica_down_until = time.time() + REPLICA_RETRY_SECONDS
+                logger.warning(f"Reporting replica unreachable, using the primary for {REPLICA_RETRY_SECONDS}s: {e}")
+        pool = self._pool('primary')
+        return 'primary', pool, pool.getconn()
+
+    def _check_cost(self, cursor, sql, params, max_cost):
+        cached = self.costs.get(sql)
+        if cached and time.time() - cached[1] < COST_CACHE_SECONDS:
+            cost = cached[0]
+        else:
+            cursor.execute("EXPLAIN (FORMAT JSON) " + sql, params)
+            plan = cursor.fetchone()[0]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            cost = plan[0]['Plan']['Total Cost']
+            self.costs[sql] = (cost, time.time())
+        if cost > max_cost:
+            raise QueryRejected(f"planned cost {cost:.0f} is over the report limit of {max_cost:.0f}")
+        return cost
+
+    # All rows of a read-only query. Raises QueryRejected when it is refused
+    # up front or cancelled by the statement timeout.
+    def query(self, sql, params=(), max_cost=None):
+        max_cost = self.max_cost if max_cost is None else max_cost
+        with self.slots:
+            target, pool, conn = self._connect()
+            broken = False
+            try:
+                cursor = conn.cursor()
+                if max_cost:
+                    self._check_cost(cursor, sql, params, max_cost)
+                cursor.execute(sql, params)
+                rows = cursor.fetchall()
+                cursor.close()
+                conn.rollback()
+                return rows
+            except QueryRejected as e:
+                conn.rollback()
+                logger.warning(f"Report query refused on {target}: {e}")
+                raise
+            except psycopg2.errors.QueryCanceled as e:
+                conn.rollback()
+                logger.warning(f"Report query cancelled on {target} after {STATEMENT_TIMEOUT_MS} ms")
+                raise QueryRejected(f"cancelled by the {STATEMENT_TIMEOUT_MS} ms statement timeout") from e
+            except psycopg2.errors.LockNotAvailable as e:
+                conn.rollback()
+                raise QueryRejected("table locked for maintenance, try again") from e
+            except (psycopg2.OperationalError, psycopg2.InterfaceError):
+                broken = True
+                raise
+            except psycopg2.Error:
+                conn.rollback()
+                raise
+            finally:
+                pool.putconn(conn, close=broken or bool(conn.closed))
+
+    def close(self):
+        with self.lock:
+            for pool in self.pools.values():
+                pool.closeall()
+            self.pools.clear()
+
+
+# ---------------------------------------------------------------------------
+# Lane latency under report load
+# ---------------------------------------------------------------------------
+
+REPORT_QUERIES = [
+    "SELECT * FROM logs WHERE event_timestamp >= %s ORDER BY event_timestamp DESC LIMIT 100",
+    "SELECT plate_number, COUNT(*), SUM(amount) FROM parking_logs WHERE entry_timestamp >= %s "
+    "GROUP BY plate_number ORDER BY 2 DESC",
+    "SELECT date_trunc('hour', event_timestamp), event_type, COUNT(*) FROM logs WHERE event_timestamp >= %s "
+    "GROUP BY 1, 2 ORDER BY 1",
+    # what someone eventually writes by accident: the guard should refuse it
+    "SELECT a.plate_number, COUNT(*) FROM logs a JOIN logs b ON a.plate_number = b.plate_number "
+    "WHERE a.event_timestamp >= %s GROUP BY 1",
+]
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+# What a lane does per decision: the active-entry check, then a logs insert
+# (rolled back here so the benchmark leaves nothing behind)
+def lane_load(stop, timings, plates):
+    from lanes import has_active_entry
+
+    conn = psycopg2.connect(**DB_CONFIG)
+    try:
+        while not stop.is_set():
+            plate = random.choice(plates)
+            t = time.perf_counter()
+            has_active_entry(plate, conn)
+            cursor = conn.cursor()
+            cursor.execute("INSERT INTO logs (plate_number, event_type, event_timestamp, message) "
+                           "VALUES (%s, 'Entry', %s, 'bench')", (plate, datetime.now()))
+            cursor.close()
+            conn.rollback()
+            timings.append((time.perf_counter() - t) * 1000)
+            time.sleep(0.01)
+    finally:
+        conn.close()
+
+
+def report_load(stop, counts, run_query):
+    since = datetime(2000, 1, 1)
+    while not stop.is_set():
+        sql = random.choice(REPORT_QUERIES)
+        try:
+            run_query(sql, (since,))
+            counts['ok'] += 1
+        except QueryRejected:
+            counts['refused'] += 1
+        except psycopg2.Error:
+            counts['failed'] += 1
+
+
+# Unguarded: what the dashboard did before, a fresh primary connection per request
+def direct_query(sql, params):
+    conn = psycopg2.connect(**DB_CONFIG)
+    try:
+        cursor = conn.cursor()
+        cursor.execute(sql, params)
+        cursor.fetchall()
+        cursor.close()
+    finally:
+        conn.close()
+
+
+def bench(seconds, reporters, lanes):
+    conn = psycopg2.connect(**DB_CONFIG)
+    cursor = conn.cursor()
+    cursor.execute("SELECT DISTINCT plate_number FROM parking_logs LIMIT 1000")
+    plates = [row[0] for row in cursor.fetchall()] or ['RAA000A']
+    conn.close()
+
+    reporting = ReportingDB()
+    phases = [('no reports', None), ('reports on primary, unguarded', direct_query),
+              (f"reports via ReportingDB ({'replica' if REPORTING_DSN else 'primary'})", reporting.query)]
+    for label, run_query in phases:
+        stop = threading.Event()
+        timings = []
+        counts = {'ok': 0, 'refused': 0, 'failed': 0}
+        threads = [threading.Thread(target=lane_load, args=(stop, timings, plates), daemon=True)
+                   for _ in range(lanes)]
+        if run_query:
+            threads += [threading.Thread(target=report_load, args=(stop, counts, run_query), daemon=True)
+                        for _ in range(reporters)]
+        for thread in threads:
+            thread.start()
+        time.sleep(seconds)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        print(f"[BENCH] {label}: {len(timings)} lane decisions, p50 {statistics.median(timings):.1f} ms, "
+              f"p99 {percentile(timings, 0.99):.1f} ms, max {max(timings):.1f} ms"
+              + (f"; reports ok {counts['ok']}, refused {counts['refused']}, failed {counts['failed']}"
+                 if run_query else ""))
+    reporting.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Guarded read-only database access for the dashboard and reports")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    explain = subparsers.add_parser('cost', help="planned cost of a query against the report limit")
+    explain.add_argument('sql')
+    bench_parser = subparsers.add_parser('bench', help="lane DB latency while a report load runs")
+    bench_parser.add_argument('--seconds', type=int, default=20, help="per phase")
+    bench_parser.add_argument('--reporters', type=int, default=4)
+    bench_parser.add_argument('--lanes', type=int, default=2)
+    args = parser.parse_args()
+
+    if args.command == 'bench':
+        bench(args.seconds, args.reporters, args.lanes)
+        return
+    reporting = ReportingDB(max_cost=0)
+    target, pool, conn = reporting._connect()
+    try:
+        cursor = conn.cursor()
+        cost = reporting._check_cost(cursor, args.sql, (), float('inf'))
+        print(f"[COST] {cost:.0f} on {target} (limit {MAX_QUERY_COST:.0f}): "
+              f"{'refused' if cost > MAX_QUERY_COST else 'allowed'}")
+    finally:
+        conn.rollback()
+        pool.putconn(conn)
+        reporting.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,322 @@
+import argparse
+import csv
+import json
+import os
+import random
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+
+from parking_logger import get_logger
+
+logger = get_logger("tariff")
+
+# Configuration
+TARIFF_PATH = os.environ.get('PARKING_TARIFF', 'tariff.json')
+DAY_MINUTES = 24 * 60
+WEEK_MINUTES = 7 * DAY_MINUTES
+REPRICE_FETCH_SIZE = 10000
+DAY_SETS = {
+    'all': range(7),
+    'weekday': range(5),
+    'weekend': (5, 6),
+}
+
+
+def parse_clock(text):
+    hours, minutes = text.split(':')
+    minute = int(hours) * 60 + int(minutes)
+    if not 0 <= minute <= DAY_MINUTES:
+        raise ValueError(f"Time out of range: {text}")
+    return minute
+
+
+def parse_days(days):
+    if isinstance(days, str):
+        if days not in DAY_SETS:
+            raise ValueError(f"days must be a list of weekday numbers or one of {sorted(DAY_SETS)}")
+        return set(DAY_SETS[days])
+    if not all(isinstance(d, int) and 0 <= d <= 6 for d in days):
+        raise ValueError("weekday numbers run from 0 (Monday) to 6 (Sunday)")
+    return set(days)
+
+
+# tariff.json, checked. Each started unit of unit_minutes costs the rate of
+# the band in force when the unit starts (later bands override earlier ones,
+# a band may run past midnight); stays within grace_minutes are free; the
+# units starting on one calendar day cost at most daily_cap (0: no cap).
+def parse_config(config):
+    unit = config.get('unit_minutes', 60)
+    if not isinstance(unit, int) or unit <= 0 or DAY_MINUTES % unit:
+        raise ValueError("unit_minutes must divide a day evenly")
+    if config.get('rate', 0) < 0 or config.get('grace_minutes', 0) < 0 or config.get('daily_cap', 0) < 0:
+        raise ValueError("rate, grace_minutes and daily_cap cannot be negative")
+    bands = []
+    for band in config.get('bands', []):
+        start, end = parse_clock(band['start']), parse_clock(band['end'])
+        if band['rate'] < 0:
+            raise ValueError("band rates cannot be negative")
+        bands.append({'days': parse_days(band.get('days', 'all')), 'start': start, 'end': end,
+                      'rate': band['rate']})
+    return {'unit_minutes': unit, 'rate': config.get('rate', 0), 'grace_minutes': config.get('grace_minutes', 0),
+            'daily_cap': config.get('daily_cap', 0), 'bands': bands}
+
+
+def load_config(path=TARIFF_PATH):
+    with open(path) as f:
+        return parse_config(json.load(f))
+
+
+def band_covers(band, weekday, minute):
+    if weekday not in band['days']:
+        return False
+    if band['start'] <= band['end']:
+        return band['start'] <= minute < band['end']
+    return minute >= band['start'] or minute < band['end']
+
+
+# Straight from the rules, one unit at a time: what tests/test_tariff.py and
+# `check` hold Tariff to
+def reference_fee(config, entry, exit_time):
+    if (exit_time - entry).total_seconds() <= config['grace_minutes'] * 60:
+        return 0
+    per_day = {}
+    start = entry
+    while start < exit_time:
+        rate = config['rate']
+        for band in config['bands']:
+            if band_covers(band, start.weekday(), start.hour * 60 + start.minute):
+                rate = band['rate']
+        per_day[start.date()] = per_day.get(start.date(), 0) + rate
+        start += timedelta(minutes=config['unit_minutes'])
+    cap = config['daily_cap']
+    return sum(min(total, cap) if cap else total for total in per_day.values())
+
+
+# The tariff compiled into prefix sums over one week, so a fee is a handful
+# of array lookups however long the stay. Units start at the entry minute
+# plus whole units, so within the week they sit on one of unit_minutes
+# phases; for each phase, cum[k] is the price of the first k units of the
+# week and day_cum[d] the capped price of the first d days. A stay is its
+# first and last (capped) days plus whole days in between, and whole weeks
+# repeat.
+class Tariff:
+    def __init__(self, config):
+        self.config = config
+        self.unit = config['unit_minutes']
+        self.unit_delta = timedelta(minutes=self.unit)
+        self.grace = timedelta(minutes=config['grace_minutes'])
+        self.cap = config['daily_cap']
+        self.units_per_day = DAY_MINUTES // self.unit
+        self.units_per_week = WEEK_MINUTES // self.unit
+
+        minute_rates = [config['rate']] * WEEK_MINUTES
+        for band in config['bands']:
+            for weekday in band['days']:
+                for minute in range(DAY_MINUTES):
+                    if band_covers(band, weekday, minute):
+                        minute_rates[weekday * DAY_MINUTES + minute] = band['rate']
+
+        self.cum = []
+        self.day_cum = []
+        for phase in range(self.unit):
+            cum = [0]
+            for k in range(self.units_per_week):
+                cum.append(cum[-1] + minute_rates[phase + k * self.unit])
+            day_cum = [0]
+            for day in range(7):
+                total = cum[(day + 1) * self.units_per_day] - cum[day * self.units_per_day]
+                day_cum.append(day_cum[-1] + self.capped(total))
+            self.cum.append(cum)
+            self.day_cum.append(day_cum)
+
+    @classmethod
+    def load(cls, path=TARIFF_PATH):
+        return cls(load_config(path))
+
+    def capped(self, total):
+        return min(total, self.cap) if self.cap else total
+
+    # Price of units [0, k) of a phase, counting from the start of the week
+    def _units(self, cum, k):
+        weeks, k = divmod(k, self.units_per_week)
+        return weeks * cum[-1] + cum[k]
+
+    def _days(self, day_cum, d):
+        weeks, d = divmod(d, 7)
+        return weeks * day_cum[-1] + day_cum[d]
+
+    def fee(self, entry, exit_time):
+        stay = exit_time - entry
+        if stay <= self.grace:
+            return 0
+        units = -(-stay // self.unit_delta)
+        week_minute = entry.weekday() * DAY_MINUTES + entry.hour * 60 + entry.minute
+        phase, first = week_minute % self.unit, week_minute // self.unit
+        cum, day_cum = self.cum[phase], self.day_cum[phase]
+        last = first + units - 1
+        first_day, last_day = first // self.units_per_day, last // self.units_per_day
+        if first_day == last_day:
+            return self.capped(self._units(cum, last + 1) - self._units(cum, first))
+        head = self._units(cum, (first_day + 1) * self.units_per_day) - self._units(cum, first)
+        tail = self._units(cum, last + 1) - self._units(cum, last_day * self.units_per_day)
+        middle = self._days(day_cum, last_day) - self._days(day_cum, first_day + 1)
+        return self.capped(head) + middle + self.capped(tail)
+
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+# The tariff every payment path charges with, recompiled only when the
+# file changes so a price update needs no restart
+def current_tariff(path=TARIFF_PATH):
+    mtime = os.path.getmtime(path)
+    with _cache_lock:
+        cached = _cache.get(path)
+        if cached is None or cached[0] != mtime:
+            cached = _cache[path] = (mtime, Tariff.load(path))
+            logger.info(f"Tariff loaded from {path}")
+        return cached[1]
+
+
+# ---------------------------------------------------------------------------
+# Checks against the reference, and re-pricing
+# ---------------------------------------------------------------------------
+
+# Random tariffs and stays, plus stays ending right on unit, grace and
+# midnight boundaries, priced both ways
+def random_config(rng):
+    unit = rng.choice([15, 30, 60, 120])
+    bands = []
+    for _ in range(rng.randrange(4)):
+        start = rng.randrange(0, DAY_MINUTES, 30)
+        bands.append({'days': rng.choice(['all', 'weekday', 'weekend', sorted(rng.sample(range(7), 3))]),
+                      'start': f"{start // 60:02d}:{start % 60:02d}",
+                      'end': rng.choice(['24:00', f"{rng.randrange(24):02d}:{rng.choice([0, 30]):02d}"]),
+                      'rate': rng.randrange(0, 1000, 50)})
+    return {'unit_minutes': unit, 'rate': rng.randrange(50, 1000, 50), 'grace_minutes': rng.choice([0, 10, 15, 30]),
+            'daily_cap': rng.choice([0, 0, 2000, 5000]), 'bands': bands}
+
+
+def random_stay(rng, config):
+    entry = datetime(2025, 1, 1) + timedelta(minutes=rng.randrange(366 * DAY_MINUTES), seconds=rng.randrange(60))
+    kind = rng.random()
+    if kind < 0.2:
+        stay = timedelta(minutes=config['unit_minutes'] * rng.randrange(1, 30))
+    elif kind < 0.3:
+        stay = timedelta(minutes=config['grace_minutes'], seconds=rng.choice([-1, 0, 1]))
+    elif kind < 0.4:
+        midnight = datetime.combine(entry.date() + timedelta(days=rng.randrange(1, 4)), datetime.min.time())
+        stay = midnight - entry + timedelta(seconds=rng.choice([-1, 0, 1]))
+    elif kind < 0.8:
+        stay = timedelta(minutes=rng.randrange(1, 12 * 60))
+    else:
+        stay = timedelta(minutes=rng.randrange(1, 30 * DAY_MINUTES))
+    return entry, entry + stay
+
+
+def check(tariffs, stays, seed, path):
+    rng = random.Random(seed)
+    configs = [load_config(path)] if os.path.exists(path) else []
+    configs += [parse_config(random_config(rng)) for _ in range(tariffs)]
+    failures = checked = 0
+    compiled_seconds = reference_seconds = 0.0
+    for config in configs:
+        tariff = Tariff(config)
+        for _ in range(stays):
+            entry, exit_time = random_stay(rng, config)
+            t = time.perf_counter()
+            got = tariff.fee(entry, exit_time)
+            compiled_seconds += time.perf_counter() - t
+            t = time.perf_counter()
+            want = reference_fee(config, entry, exit_time)
+            reference_seconds += time.perf_counter() - t
+            checked += 1
+            if got != want:
+                failures += 1
+                if failures <= 10:
+                    print(f"[MISMATCH] {entry} -> {exit_time}: compiled {got}, reference {want} with {config}")
+    print(f"[CHECK] {checked} stays over {len(configs)} tariffs: {failures} mismatches")
+    print(f"[CHECK] compiled {compiled_seconds / checked * 1e6:.2f} us per fee, "
+          f"reference {reference_seconds / checked * 1e6:.2f} us")
+    return failures == 0
+
+
+# Price closed sessions from parking_logs under a tariff file, e.g. to see
+# what a proposed tariff would have earned, next to what was charged. Runs
+# on the reporting replica when there is one; a long scan has no statement
+# timeout, but is read-only and never waits on a lock.
+def reprice(path, since, until, out):
+    from reporting_db import reporting_connection
+
+    tariff = Tariff.load(path)
+    conn = reporting_connection(timeout_ms=0)
+    cursor = conn.cursor(name='reprice')
+    cursor.itersize = REPRICE_FETCH_SIZE
+    cursor.execute(
+        "SELECT id, plate_number, entry_timestamp, exit_timestamp, amount FROM parking_logs "
+        "WHERE entry_timestamp >= %s AND entry_timestamp < %s AND exit_timestamp IS NOT NULL",
+        (since, until)
+    )
+    writer = None
+    handle = None
+    if out:
+        handle = open(out, 'w', newline='')
+        writer = csv.writer(handle)
+        writer.writerow(['id', 'plate_number', 'entry_timestamp', 'exit_timestamp', 'charged', 'repriced'])
+    sessions = changed = 0
+    charged_total = repriced_total = 0
+    start = time.perf_counter()
+    try:
+        for entry_id, plate, entry, exit_time, amount in cursor:
+            fee = tariff.fee(entry, exit_time)
+            charged = int(amount) if amount is not None else 0
+            sessions += 1
+            changed += fee != charged
+            charged_total += charged
+            repriced_total += fee
+            if writer:
+                writer.writerow([entry_id, plate, entry.isoformat(), exit_time.isoformat(), charged, fee])
+    finally:
+        cursor.close()
+        conn.close()
+        if handle:
+            handle.close()
+    elapsed = time.perf_counter() - start
+    print(f"[REPRICE] {sessions} sessions from {since:%Y-%m-%d} to {until:%Y-%m-%d} in {elapsed:.2f}s")
+    print(f"[REPRICE] charged {charged_total}, under {path}: {repriced_total} "
+          f"({repriced_total - charged_total:+d}); {changed} sessions priced differently")
+    if out:
+        print(f"[REPRICE] Wrote {out}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parking tariff: quote, check against the reference, re-price")
+    parser.add_argument('--tariff', default=TARIFF_PATH)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    quote_parser = subparsers.add_parser('quote', help="fee for one stay")
+    quote_parser.add_argument('entry', help="YYYY-MM-DDTHH:MM")
+    quote_parser.add_argument('exit', help="YYYY-MM-DDTHH:MM")
+    check_parser = subparsers.add_parser('check', help="compare the compiled tariff with the reference on random stays")
+    check_parser.add_argument('--tariffs', type=int, default=200, help="random tariffs besides the configured one")
+    check_parser.add_argument('--stays', type=int, default=500, help="stays per tariff")
+    check_parser.add_argument('--seed', type=int, default=42)
+    reprice_parser = subparsers.add_parser('reprice', help="price historic sessions under a tariff file")
+    reprice_parser.add_argument('--since', type=datetime.fromisoformat, required=True)
+    reprice_parser.add_argument('--until', type=datetime.fromisoformat, default=datetime.now())
+    reprice_parser.add_argument('--out', help="per-session CSV")
+    args = parser.parse_args()
+
+    if args.command == 'quote':
+        entry, exit_time = datetime.fromisoformat(args.entry), datetime.fromisoformat(args.exit)
+        print(f"[QUOTE] {entry} -> {exit_time}: {Tariff.load(args.tariff).fee(entry, exit_time)}")
+    elif args.command == 'check':
+        sys.exit(0 if check(args.tariffs, args.stays, args.seed, args.tariff) else 1)
+    else:
+        reprice(args.tariff, args.since, args.until, args.out)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+import cv2
+import numpy as np
+import pytest
+
+pytest.importorskip("psycopg2")
+pytest.importorskip("serial")
+pytest.importorskip("colorama")
+
+import lanes
+import orchestrator
+from lanes import EntryLane, SharedResources
+
+
+# A gate with nothing in front of it, so frames are read but never detected on
+class IdleGate:
+    is_open = False
+
+    def distance(self):
+        return 1000
+
+    def close(self):
+        pass
+
+
+def test_image_dir_lane_ends_without_restart(tmp_path, monkeypatch):
+    for i in range(3):
+        cv2.imwrite(str(tmp_path / f"frame_{i:03d}.png"), np.zeros((48, 64, 3), np.uint8))
+    events, buzzes = [], []
+    monkeypatch.setattr(lanes, "log_event", lambda plate, event, message, conn: events.append((event, message)))
+    monkeypatch.setattr(lanes, "trigger_buzzer", lambda gate: buzzes.append(gate))
+    monkeypatch.setattr(EntryLane, "_open_db", lambda lane: None)
+    monkeypatch.setattr(EntryLane, "_open_serial", lambda lane: setattr(lane, "gate", IdleGate()))
+    monkeypatch.setattr(orchestrator, "RESTART_BACKOFF", 0)
+
+    shared = SharedResources(pool=None, model=lambda *args, **kwargs: [], recognizer=object())
+    supervisor = orchestrator.LaneSupervisor(
+        {'name': 'replay', 'direction': 'entry', 'camera': str(tmp_path), 'preview': False}, shared)
+    supervisor.start()
+    supervisor.join(10)
+
+    assert not supervisor.is_alive()
+    assert supervisor.restarts == 0
+    assert supervisor.lane.finished
+    assert not [message for event, message in events if event == "Error"]
+    assert not buzzes
@@ -0,0 +1,34 @@
+import json
+import os
+import random
+
+import pytest
+
+from tariff import current_tariff, load_config, random_config, random_stay, reference_fee
+
+TARIFFS = 20
+STAYS = 500
+REPO_TARIFF = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'tariff.json')
+
+
+def assert_matches_reference(path, rng):
+    tariff = current_tariff(path)
+    config = load_config(path)
+    for _ in range(STAYS):
+        entry, exit_time = random_stay(rng, config)
+        assert tariff.fee(entry, exit_time) == reference_fee(config, entry, exit_time), \
+            f"{entry} -> {exit_time} with {config}"
+
+
+def test_shipped_tariff_matches_reference():
+    assert_matches_reference(REPO_TARIFF, random.Random(0))
+
+
+# Random bands, grace periods, caps and unit lengths, with stays ending on
+# unit, grace and midnight boundaries
+@pytest.mark.parametrize('seed', range(TARIFFS))
+def test_random_tariff_matches_reference(seed, tmp_path):
+    rng = random.Random(seed)
+    path = tmp_path / 'tariff.json'
+    path.write_text(json.dumps(random_config(rng)))
+    assert_matches_reference(str(path), rng)
@@ -0,0 +1,147 @@
+import argparse
+import os
+import tempfile
+
+import cv2
+import yaml
+
+from arrange_dataset import dataset_yaml
+from pack_dataset import ImagePack
+
+# Configuration
+BASE_MODEL = 'yolov8n.pt'
+EPOCHS = 100
+IMGSZ = 640
+BATCH_SIZE = 16
+DEVICE = 'cpu'
+
+
+# Ultralytics resolves a relative dataset path against its own datasets
+# folder, so hand it a copy of the YAML with the path made absolute
+def resolve_data_yaml(path):
+    with open(path) as f:
+        data = yaml.safe_load(f)
+    root = data.get('path') or '.'
+    if not os.path.isabs(root):
+        data['path'] = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(path)), root))
+    handle, resolved = tempfile.mkstemp(suffix='.yaml', prefix='data_')
+    with os.fdopen(handle, 'w') as f:
+        yaml.safe_dump(data, f, sort_keys=False)
+    return resolved
+
+
+# Serves a dataset's images from the split's pack; anything missing or
+# changed since packing is decoded from its JPEG as usual. Mirrors
+# BaseDataset.load_image, including the mosaic buffer bookkeeping. A class
+# rather than a closure so DataLoader workers can pickle it.
+class PackedImages:
+    def __init__(self, dataset, image_pack, imgsz):
+        self.dataset = dataset
+        self.image_pack = image_pack
+        self.imgsz = imgsz
+
+    def __call__(self, i, rect_mode=True):
+        dataset = self.dataset
+        if dataset.ims[i] is not None:
+            return dataset.ims[i], dataset.im_hw0[i], dataset.im_hw[i]
+        packed = self.image_pack.get(dataset.im_files[i])
+        if packed is None:
+            return type(dataset).load_image(dataset, i, rect_mode)
+        image, hw0 = packed
+        image = image.copy()        # augmentations write in place; the map is read-only
+        if not rect_mode:
+            image = cv2.resize(image, (self.imgsz, self.imgsz), interpolation=cv2.INTER_LINEAR)
+        if dataset.augment:
+            dataset.ims[i], dataset.im_hw0[i], dataset.im_hw[i] = image, hw0, image.shape[:2]
+            dataset.buffer.append(i)
+            if 1 < len(dataset.buffer) >= dataset.max_buffer_length:
+                j = dataset.buffer.pop(0)
+                if dataset.cache != 'ram':
+                    dataset.ims[j], dataset.im_hw0[j], dataset.im_hw[j] = None, None, None
+        return image, hw0, image.shape[:2]
+
+
+# Point a dataset at its split's pack when there is one at the training size
+def attach_pack(dataset, img_path, imgsz):
+    image_dir = img_path[0] if isinstance(img_path, list) else img_path
+    if not ImagePack.exists(image_dir):
+        print(f"[WARNING] No pack for {image_dir}; run pack_dataset.py pack to skip JPEG decoding")
+        return dataset
+    image_pack = ImagePack(image_dir)
+    if image_pack.imgsz != imgsz:
+        print(f"[WARNING] {image_dir} packed at {image_pack.imgsz}px, training at {imgsz}px; decoding JPEGs")
+        return dataset
+    dataset.load_image = PackedImages(dataset, image_pack, imgsz)
+    print(f"[INFO] Reading {len(image_pack)} images from {image_pack.path}")
+    return dataset
+
+
+def packed_trainer():
+    from ultralytics.models.yolo.detect import DetectionTrainer
+
+    class PackedDetectionTrainer(DetectionTrainer):
+        def build_dataset(self, img_path, mode='train', batch=None):
+            return attach_pack(super().build_dataset(img_path, mode, batch), img_path, self.args.imgsz)
+
+    return PackedDetectionTrainer
+
+
+def packed_validator():
+    from ultralytics.models.yolo.detect import DetectionValidator
+
+    class PackedDetectionValidator(DetectionValidator):
+        def build_dataset(self, img_path, mode='val', batch=None):
+            return attach_pack(super().build_dataset(img_path, mode, batch), img_path, self.args.imgsz)
+
+    return PackedDetectionValidator
+
+
+def train(args):
+    from ultralytics import YOLO
+
+    data = resolve_data_yaml(args.data)
+    try:
+        model = YOLO(args.model)
+        model.train(data=data, epochs=args.epochs, imgsz=args.imgsz, batch=args.batch, device=args.device,
+                    workers=args.workers, trainer=None if args.no_pack else packed_trainer())
+    finally:
+        os.remove(data)
+
+
+def validate(args):
+    from ultralytics import YOLO
+
+    data = resolve_data_yaml(args.data)
+    try:
+        model = YOLO(args.weights)
+        metrics = model.val(data=data, imgsz=args.imgsz, batch=args.batch, device=args.device,
+                            workers=args.workers, validator=None if args.no_pack else packed_validator())
+        print(f"[VAL] mAP50 {metrics.box.map50:.3f}  mAP50-95 {metrics.box.map:.3f}")
+    finally:
+        os.remove(data)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train / validate the plate detector from the packed dataset")
+    parser.add_argument('--data', default=dataset_yaml)
+    parser.add_argument('--imgsz', type=int, default=IMGSZ)
+    parser.add_argument('--batch', type=int, default=BATCH_SIZE)
+    parser.add_argument('--device', default=DEVICE)
+    parser.add_argument('--workers', type=int, default=min(8, os.cpu_count() or 1))
+    parser.add_argument('--no-pack', action='store_true', help="decode JPEGs as before, for comparison")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    train_parser = subparsers.add_parser('train')
+    train_parser.add_argument('--model', default=BASE_MODEL)
+    train_parser.add_argument('--epochs', type=int, default=EPOCHS)
+    val_parser = subparsers.add_parser('val')
+    val_parser.add_argument('--weights', default='best.pt')
+    args = parser.parse_args()
+
+    if args.command == 'train':
+        train(args)
+    else:
+        validate(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,161 @@
+import argparse
+import random
+import time
+
+import cv2
+import numpy as np
+import torch
+import torch.nn as nn
+
+from plate_recognizer import ALPHABET, INPUT_HEIGHT, INPUT_WIDTH, ONNX_MODEL, OnnxRecognizer, load_labelled_crops
+
+# Configuration
+EPOCHS = 40
+BATCH_SIZE = 64
+LEARNING_RATE = 1e-3
+VAL_RATIO = 0.1
+SEED = 42
+
+
+# Conv feature extractor -> bidirectional GRU over 32 horizontal steps -> CTC
+class PlateCRNN(nn.Module):
+    def __init__(self, n_classes=len(ALPHABET) + 1):
+        super().__init__()
+
+        def block(c_in, c_out, pool):
+            return nn.Sequential(nn.Conv2d(c_in, c_out, 3, padding=1, bias=False),
+                                 nn.BatchNorm2d(c_out), nn.ReLU(inplace=True), nn.MaxPool2d(pool))
+
+        self.features = nn.Sequential(
+            block(1, 32, (2, 2)),     # 16 x 64
+            block(32, 64, (2, 2)),    # 8 x 32
+            block(64, 128, (2, 1)),   # 4 x 32
+            block(128, 128, (4, 1)),  # 1 x 32
+        )
+        self.rnn = nn.GRU(128, 64, bidirectional=True, batch_first=True)
+        self.fc = nn.Linear(128, n_classes)
+
+    def forward(self, x):
+        x = self.features(x).squeeze(2).permute(0, 2, 1)   # N, T, C
+        x, _ = self.rnn(x)
+        return self.fc(x)                                    # logits N, T, classes
+
+
+# Exported graph returns softmax probabilities, as OnnxRecognizer expects
+class ExportWrapper(nn.Module):
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, x):
+        return torch.softmax(self.model(x), dim=2)
+
+
+def load_images(samples):
+    images, labels = [], []
+    for path, plate in samples:
+        img = cv2.imread(path)
+        if img is None:
+            continue
+        images.append(OnnxRecognizer.prepare(img))
+        labels.append(plate)
+    return images, labels
+
+
+# Cheap photometric/geometric jitter so the model doesn't memorise crops
+def augment(img):
+    alpha = random.uniform(0.7, 1.3)
+    beta = random.uniform(-30, 30)
+    out = cv2.convertScaleAbs(img, alpha=alpha, beta=beta)
+    dx, dy = random.randint(-4, 4), random.randint(-2, 2)
+    matrix = np.float32([[1, 0, dx], [0, 1, dy]])
+    return cv2.warpAffine(out, matrix, (INPUT_WIDTH, INPUT_HEIGHT), borderMode=cv2.BORDER_REPLICATE)
+
+
+def to_batch(images, labels, train):
+    arr = np.stack([augment(img) if train else img for img in images]).astype(np.float32)[:, None] / 255.0
+    targets = torch.tensor([ALPHABET.index(c) + 1 for label in labels for c in label], dtype=torch.long)
+    lengths = torch.tensor([len(label) for label in labels], dtype=torch.long)
+    return torch.from_numpy(arr), targets, lengths
+
+
+def greedy_decode(logits):
+    best = logits.argmax(dim=2).cpu().numpy()
+    texts = []
+    for row in best:
+        chars, previous = [], 0
+        for index in row:
+            if index != 0 and index != previous:
+                chars.append(ALPHABET[index - 1])
+            previous = index
+        texts.append(''.join(chars))
+    return texts
+
+
+def train(samples, epochs, batch_size, out_path, threads):
+    torch.set_num_threads(threads)
+    random.seed(SEED)
+    torch.manual_seed(SEED)
+    images, labels = load_images(samples)
+    order = list(range(len(images)))
+    random.shuffle(order)
+    n_val = max(1, int(len(order) * VAL_RATIO))
+    val_idx, train_idx = order[:n_val], order[n_val:]
+    print(f"[TRAIN] {len(train_idx)} train / {len(val_idx)} val crops")
+
+    model = PlateCRNN()
+    optimizer = torch.optim.Adam(model.parameters(), lr=LEARNING_RATE)
+    scheduler = torch.optim.lr_scheduler.CosineAnnealingLR(optimizer, epochs)
+    ctc = nn.CTCLoss(blank=0, zero_infinity=True)
+    best_acc = -1.0
+
+    for epoch in range(epochs):
+        model.train()
+        random.shuffle(train_idx)
+        start, total_loss = time.time(), 0.0
+        for i in range(0, len(train_idx), batch_size):
+            idx = train_idx[i:i + batch_size]
+            x, targets, target_lengths = to_batch([images[j] for j in idx], [labels[j] for j in idx], True)
+            log_probs = model(x).log_softmax(2).permute(1, 0, 2)     # T, N, C
+            input_lengths = torch.full((x.shape[0],), log_probs.shape[0], dtype=torch.long)
+            loss = ctc(log_probs, targets, input_lengths, target_lengths)
+            optimizer.zero_grad()
+            loss.backward()
+            optimizer.step()
+            total_loss += loss.item() * len(idx)
+        scheduler.step()
+
+        model.eval()
+        with torch.no_grad():
+            x, _, _ = to_batch([images[j] for j in val_idx], [labels[j] for j in val_idx], False)
+            predictions = greedy_decode(model(x))
+        acc = sum(p == labels[j] for p, j in zip(predictions, val_idx)) / len(val_idx)
+        print(f"[EPOCH {epoch + 1}/{epochs}] loss {total_loss / len(train_idx):.4f} "
+              f"val exact {acc:.1%} ({time.time() - start:.1f}s)")
+        if acc > best_acc:
+            best_acc = acc
+            export(model, out_path)
+    print(f"[DONE] Best val exact match {best_acc:.1%}, model at {out_path}")
+
+
+def export(model, out_path):
+    model.eval()
+    dummy = torch.zeros(1, 1, INPUT_HEIGHT, INPUT_WIDTH)
+    torch.onnx.export(ExportWrapper(model), dummy, out_path, input_names=['image'], output_names=['probs'],
+                      dynamic_axes={'image': {0: 'batch'}, 'probs': {0: 'batch'}}, opset_version=13)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the CRNN plate recognizer and export it to ONNX")
+    parser.add_argument('--dir', default='plates', help="crops named <PLATE>_<timestamp>.jpg")
+    parser.add_argument('--labels', help="corpus labels.tsv from harvest_crops.py (preferred)")
+    parser.add_argument('--epochs', type=int, default=EPOCHS)
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--out', default=ONNX_MODEL)
+    args = parser.parse_args()
+    train(load_labelled_crops(args.dir, args.labels), args.epochs, args.batch_size, args.out, args.threads)
+
+
+if __name__ == '__main__':
+    main()
@@ -2,6 +2,7 @@ import serial
 import time
 import csv
 from datetime import datetime
+from tariff import current_tariff
 # Configure the serial port (adjust 'COM14' to your Arduino's port)
 ser = serial.Serial('COM10', 9600, timeout=1)
 time.sleep(2)  # Wait for serial to initialize
@@ -83,16 +84,14 @@ try:
                     print_boxed_message("Warning: No Unpaid Entry Found", "!")
                     print(f"[{get_timestamp()}] No unpaid entry for plate {plate}. Assuming 0 hours.\n")
                     hours = 0
+                    charge = 0
                 else:
                     entry_time = datetime.strptime(last_entry['Timestamp'], "%Y-%m-%d %H:%M:%S")
                     current_time = datetime.now()
                     time_diff = current_time - entry_time
                     hours = time_diff.total_seconds() / 3600  # Convert to hours
-                # Calculate charge (100 units per 30 min after first 30 min)
-                minutes = hours * 60
-                charge = 0
-                if minutes > 30:
-                    charge = ((minutes - 30 + 29) // 30) * 100
+                    # Same tariff as the database payment path (tariff.json)
+                    charge = current_tariff().fee(entry_time, current_time)
                 if charge > cash:
                     print_boxed_message("Error: Charge Exceeds Balance", "!")
                     print(f"[{get_timestamp()}] Charge ({charge} units) exceeds balance ({cash} units).\n")